@@ -1,19 +1,28 @@
 import streamlit as st
-import pandas as pd
 import folium
 from streamlit_folium import st_folium
 import os
+import sys
 
 st.set_page_config(page_title="UrbanMoveFR", layout="wide")
 st.title("🚲 UrbanMoveFR – Dashboard Vélib")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR   = os.path.join(BASE_DIR, "data")
-OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
-
-# KPIs
-heures = pd.read_csv(os.path.join(OUTPUT_DIR, "kpi_heures_de_pointe.csv"))
-saturation = pd.read_csv(os.path.join(OUTPUT_DIR, "kpi_saturation_arrondissement.csv"))
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+import dashboard_artifacts
+
+# Artefacts précalculés (dashboard_artifacts.py) : chargés une fois par version
+# et partagés par toutes les sessions du processus (pas de copie par session).
+@st.cache_resource(max_entries=2)
+def load_artifacts(version):
+    return dashboard_artifacts.load(version)
+
+version = dashboard_artifacts.current_version()
+if version is None:
+    st.error("Aucun artefact publié : lance `python scripts/dashboard_artifacts.py`.")
+    st.stop()
+arts = load_artifacts(version)
+heures, saturation, stations = arts["heures"], arts["arrondissements"], arts["stations"]
 
 # Graphiques
 col1, col2 = st.columns(2)
@@ -26,13 +35,8 @@ with col2:
 
 # Carte
 st.subheader("Carte des stations (50 affichées)")
-df_map = pd.read_parquet(os.path.join(DATA_DIR, "historique_hourly.parquet"))
-df_map["empty_pct"] = (df_map["bikes_mean"] == 0) * 100
-map_df = df_map.groupby(["stationcode", "name", "lat", "lon", "arrdt"]).agg({"empty_pct": "mean"}).reset_index()
-
-arrondissement = st.selectbox("Choisis un arrondissement", ["Tous"] + sorted(map_df["arrdt"].unique()))
-if arrondissement != "Tous":
-    map_df = map_df[map_df["arrdt"] == arrondissement]
+arrondissement = st.selectbox("Choisis un arrondissement", ["Tous"] + sorted(saturation["arrdt"].unique()))
+map_df = stations if arrondissement == "Tous" else stations[stations["arrdt"] == arrondissement]
 
 m = folium.Map(location=[48.8566, 2.3522], zoom_start=12)
 for _, r in map_df.head(50).iterrows():
@@ -45,4 +49,4 @@ for _, r in map_df.head(50).iterrows():
         popup=f"{r['name']} – {r['empty_pct']:.0f} % vide"
     ).add_to(m)
 
-st_folium(m, width=700, height=400)
\ No newline at end of file
+st_folium(m, width=700, height=400)
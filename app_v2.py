@@ -3,6 +3,7 @@ import pandas as pd
 import folium
 from streamlit_folium import st_folium
 import os
+import sys
 
 st.set_page_config(page_title="UrbanMoveFR", layout="wide")
 st.title("🚲 UrbanMoveFR – Dashboard Vélib")
@@ -11,6 +12,8 @@ st.title("🚲 UrbanMoveFR – Dashboard Vélib")
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
 DATA_DIR   = os.path.join(BASE_DIR, "data")
+sys.path.insert(0, os.path.join(BASE_DIR, "scripts"))
+from hourly_store import query_hourly
 
 # 📥 KPIs
 heures     = pd.read_csv(os.path.join(OUTPUT_DIR, "kpi_heures_de_pointe.csv"))
@@ -28,9 +31,10 @@ with col2:
 
 # 🗺️ Carte des stations
 st.subheader("Carte des stations les plus vides")
-df_map = pd.read_parquet(os.path.join(DATA_DIR, "historique_hourly.parquet"))
+df_map = query_hourly(columns=["stationcode", "name", "lat", "lon", "bikes_mean"],
+                      path=os.path.join(DATA_DIR, "historique_hourly.parquet"))
 df_map["empty_pct"] = (df_map["bikes_mean"] == 0) * 100
-map_df = df_map.groupby(["stationcode", "name", "lat", "lon"])["empty_pct"].mean().reset_index()
+map_df = df_map.groupby(["stationcode", "name", "lat", "lon"], observed=True)["empty_pct"].mean().reset_index()
 
 # Filtre arrondissement
 arrdts = sorted(map_df["arrondissement"].unique()) if "arrondissement" in map_df.columns else []
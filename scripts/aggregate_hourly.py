@@ -1,23 +1,185 @@
+"""Agrégation horaire de l'historique Vélib → CSV horaire (historique_hourly.csv).
+
+Trois modes :
+
+- complet (défaut) : relit tout l'historique de la plage et le ré-agrège
+- `--incremental` : ne relit que les snapshots postérieurs au watermark,
+  upsert les buckets dans le stockage horaire (data/hourly/), puis ne réécrit
+  que la fin du CSV consolidé (heures postérieures à l'ancien watermark) —
+  même contenu que le mode complet, trié par heure puis station comme
+  `--chunked`. Le stockage est reconstruit si des snapshots antérieurs au
+  watermark sont apparus (backfill) ou avec `--rebuild`
+- `--chunked` : mode complet en flux, mémoire bornée (CSV trié par heure)
+"""
+import argparse
+import os
 import pandas as pd
 
-# 1) Charger le fichier d’historique brut
-df = pd.read_csv("historique_velib.csv", parse_dates=["ts"])
+import history_store
+import hourly_store
+import instrument
+import schemas
+from sharding import run_sharded
+
+OUT_COLS = list(schemas.HOURLY)
+
+def aggregate(df, workers=1):
+    """Agréger par (station_id, heure), sur `workers` processus si demandé."""
+    if workers == 1:
+        return hourly_store.aggregate_snapshots(df)
+    return (run_sharded(df, "station_id", hourly_store.aggregate_snapshots, workers=workers)
+            .sort_values(["station_id", "ts_hour"], ignore_index=True))
+
+def present(agg):
+    """Jointure de présentation : attributs de la station valides à cette heure."""
+    agg = history_store.attach_stations(agg, on="ts_hour")
+    agg = agg.dropna(subset=["lat", "lon"])  # (option) retirer lignes sans coordonnées
+    return agg[OUT_COLS]
+
+def write_from_store(out_csv, wm, mark=None, root=hourly_store.HOURLY_DIR):
+    """Mettre à jour le CSV consolidé depuis le stockage horaire → (nb lignes écrites, repère).
+
+    Le CSV est trié par (heure, station) : les lignes des heures ≤ watermark ne
+    changent plus. Le repère ({path, after, offset, size}) donne la position de
+    la première ligne postérieure au watermark `after` ; au passage suivant,
+    seules les heures > `after` sont relues et la fin du fichier réécrite à
+    partir de là. Sans repère valide (premier passage, reconstruction, CSV
+    déplacé ou modifié) → réécriture complète, atomique.
+    """
+    path = os.path.abspath(out_csv)
+    valid = (mark is not None and mark["after"] is not None and mark["path"] == path
+             and os.path.exists(path) and os.path.getsize(path) == mark["size"])
+    after = pd.Timestamp(mark["after"]) if valid else None
+    agg = hourly_store.read_hourly(None if after is None else after + pd.Timedelta(hours=1), root=root)
+    agg = present(agg.sort_values(["ts_hour", "station_id"], ignore_index=True))
+    closed = agg["ts_hour"] <= wm if wm is not None else pd.Series(False, index=agg.index)
+
+    with open(path if valid else path + ".tmp", "r+b" if valid else "wb") as f:
+        if valid:
+            f.seek(mark["offset"])
+            f.truncate()
+            f.write(agg[closed].to_csv(index=False, header=False).encode("utf-8"))
+        else:
+            f.write(agg[closed].to_csv(index=False).encode(schemas.CSV_ENCODING))
+        offset = f.tell()
+        f.write(agg[~closed].to_csv(index=False, header=False).encode("utf-8"))
+        size = f.tell()
+    if not valid:
+        os.replace(path + ".tmp", path)
+    mark = {"path": path, "after": None if wm is None else wm.isoformat(), "offset": offset, "size": size}
+    return len(agg), mark
+
+def _covered(wm):
+    """Snapshots d'historique dont l'heure est close au watermark `wm`."""
+    return len(history_store.list_snapshots(end=wm + pd.Timedelta(hours=1) - pd.Timedelta(microseconds=1)))
+
+def run_incremental(args):
+    # Heures ≤ watermark : closes et déjà agrégées → on ne relit que la suite,
+    # y compris l'heure en cours (recalculée à chaque passage).
+    with instrument.stage("aggregate", mode="incremental") as st:
+        wm, mark = hourly_store.load_watermark(), hourly_store.csv_mark()
+        if wm is not None and not args.rebuild:
+            if hourly_store.store_version() != hourly_store.STORE_VERSION:
+                print("ℹ️ Stockage horaire d'un ancien format → reconstruction")
+                args.rebuild = True
+            elif hourly_store.covered_snapshots() != _covered(wm):
+                print(f"ℹ️ Historique modifié avant le watermark {wm} (backfill ?) → reconstruction")
+                args.rebuild = True
+        if args.rebuild:
+            hourly_store.reset()
+            wm = None
+        start = wm + pd.Timedelta(hours=1) if wm is not None else args.start
+        df = history_store.read_history(start, args.end)
+        st.rows_in = len(df)
+        if df.empty and os.path.exists(args.out):
+            print(f"✅ Rien de nouveau depuis {wm}")
+            return
+
+        n_parts = 0
+        if not df.empty:
+            agg = aggregate(df, args.workers)
+            n_parts = hourly_store.upsert(agg)
+
+            # Une heure est close quand l'heure suivante a commencé
+            now_hour = pd.Timestamp.now(tz="UTC").floor("h")
+            last_closed = min(now_hour, agg["ts_hour"].max() + pd.Timedelta(hours=1)) - pd.Timedelta(hours=1)
+            wm = last_closed if wm is None else max(wm, last_closed)
+        # watermark et repère du CSV enregistrés ensemble, une fois le CSV écrit
+        st.rows_out, mark = write_from_store(args.out, wm, None if args.rebuild else mark)
+        if wm is not None:
+            hourly_store.save_watermark(wm, n_snapshots=_covered(wm), csv=mark)
+    print(f"✅ Incrémental : {len(df)} lignes brutes → {n_parts} partition(s) mise(s) à jour "
+          f"| watermark: {wm} | {args.out} : {st.rows_out} lignes (ré)écrites")
+
+def run_chunked(args):
+    # Historique plus grand que la RAM : blocs de snapshots dans l'ordre du temps,
+    # chaque heure close est écrite aussitôt (seule l'heure ouverte reste en mémoire).
+    with instrument.stage("aggregate", mode="chunked") as st:
+        acc = hourly_store.HourlyAccumulator()
+        n_in = n_out = 0
+        hours = set()
+        tmp = args.out + ".tmp"
+
+        def emit(agg, first):
+            if agg.empty:
+                return 0
+            agg = present(agg.sort_values(["ts_hour", "station_id"], ignore_index=True))
+            agg.to_csv(tmp, mode="w" if first else "a", header=first, index=False,
+                       encoding=schemas.CSV_ENCODING if first else "utf-8")
+            hours.update(agg["ts_hour"].unique())
+            return len(agg)
+
+        for chunk in history_store.iter_history(args.start, args.end, ["station_id", "bikes", "docks"],
+                                                chunk_snapshots=args.chunk_snapshots):
+            n_in += len(chunk)
+            n_out += emit(acc.add(chunk), n_out == 0)
+        n_out += emit(acc.close(), n_out == 0)
+        if not n_out:
+            raise FileNotFoundError(f"❌ Historique vide : {history_store.HISTORY_DIR}. Lance d'abord la collecte.")
+        os.replace(tmp, args.out)
+        st.rows_in, st.rows_out = n_in, n_out
+    print(f"✅ Fichier écrit (flux) : {args.out} | lignes: {n_out} | heures uniques: {len(hours)}")
+
+def run_full(args):
+    with instrument.stage("aggregate", mode="full") as st:
+        # 1) Charger l’historique (seules les partitions de la plage sont lues)
+        df = history_store.read_history(args.start, args.end)
+        if df.empty:
+            raise FileNotFoundError(f"❌ Historique vide : {history_store.HISTORY_DIR}. Lance d'abord la collecte.")
+        st.rows_in = len(df)
+
+        # 2) + 3) Arrondir à l’heure et agréger par station (clé entière) + heure
+        agg = present(aggregate(df, args.workers))
 
-# 2) Arrondir l’horodatage à l’heure
-df["ts_hour"] = df["ts"].dt.floor("H")
+        # 4) Sauvegarder
+        schemas.write_csv(agg, args.out, schemas.HOURLY)
+        st.rows_out = len(agg)
+    print(f"✅ Fichier écrit : {args.out} | lignes: {len(agg)} | heures uniques: {agg['ts_hour'].nunique()}")
 
-# 3) Agréger par station + heure
-agg = (
-    df.groupby(["stationcode", "name", "arrdt", "lat", "lon", "ts_hour"])
-      .agg(
-          bikes_mean=("bikes", "mean"),
-          bikes_median=("bikes", "median"),
-          docks_mean=("docks", "mean"),
-      )
-      .reset_index()
-)
+def main():
+    ap = argparse.ArgumentParser(description="Agrégation horaire de l'historique Vélib")
+    ap.add_argument("--start", help="début de plage (UTC), ex. 2025-08-24")
+    ap.add_argument("--end", help="fin de plage (UTC, incluse)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="ne traiter que les snapshots après le watermark, upsert dans data/hourly/ "
+                         "puis réécrire le CSV depuis ce stockage")
+    ap.add_argument("--rebuild", action="store_true",
+                    help="(--incremental) vider data/hourly/ et tout ré-agréger")
+    ap.add_argument("--workers", type=int, default=1, help="processus (stations réparties en shards)")
+    ap.add_argument("--out", default="historique_hourly.csv", help="CSV horaire écrit")
+    ap.add_argument("--chunked", action="store_true",
+                    help="mode complet en flux : mémoire bornée, CSV trié par heure puis station")
+    ap.add_argument("--chunk-snapshots", type=int, default=60, help="snapshots lus par bloc (--chunked)")
+    args = ap.parse_args()
+    if args.rebuild and not args.incremental:
+        ap.error("--rebuild s'utilise avec --incremental")
 
-# 4) Sauvegarder dans un nouveau CSV
-agg.to_csv("historique_hourly.csv", index=False, encoding="utf-8-sig")
+    if args.incremental:
+        run_incremental(args)
+    elif args.chunked:
+        run_chunked(args)
+    else:
+        run_full(args)
 
-print(f"✅ Fichier écrit : historique_hourly.csv ({len(agg)} lignes)")
+if __name__ == "__main__":
+    main()
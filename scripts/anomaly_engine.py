@@ -0,0 +1,182 @@
+"""Moteur d'anomalies vectorisé (toutes les stations d'un coup).
+
+`compute_anomalies(df)` produit exactement les colonnes de l'ancien
+`groupby("stationcode").apply(compute_anomaly)` :
+
+- les séries horaires sont rangées dans un tableau station × rang (fenêtres
+  glissantes en lignes, comme `rolling(win)` par station), complété de NaN
+- médiane et quartiles glissants : fenêtres `sliding_window_view` triées une
+  seule fois (NaN en fin), puis quantiles lus par indice avec l'interpolation
+  linéaire de pandas/numpy — par blocs de stations dont la taille découle de
+  n_t × win, pour que fenêtres triées et masques tiennent dans `BLOCK_BYTES`
+- longueur des blocages consécutifs par cumsum, sans boucle Python
+
+`compute_anomaly` (version par station) est conservée comme référence.
+
+`spatial_scores(out)` ajoute un score spatial : l'écart signé de chaque
+station est comparé à la moyenne des écarts de ses voisines (rayon en mètres),
+via une matrice d'adjacence creuse CSR précalculée une fois
+(`StationIndex.radius_graph`) ; la moyenne des voisines de TOUTES les heures
+est un seul produit matrice creuse × matrice (une colonne = une heure). Une
+panne de zone (voisines aussi anormales) a un score spatial faible ; une
+station isolée en panne, un score élevé.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from spatial_index import StationIndex
+
+BLOCK_BYTES = 64 << 20  # mémoire visée pour les fenêtres d'un bloc de stations
+
+OUT_COLS = [
+    "ts_hour","stationcode","name","arrdt","lat","lon",
+    "bikes_mean","bikes_median","docks_mean",
+    "roll_med","roll_iqr","anomaly_score","is_anomaly",
+    "is_blocked_now","blocked_run_len","is_blocked_3h",
+    "neigh_dev","spatial_score","is_spatial_anomaly"
+]
+SPATIAL_RADIUS_M = 500.0
+DEV_CLIP = 10.0  # écarts signés bornés (IQR nul → écart ~1e9 qui écraserait la moyenne)
+
+def compute_anomaly(g: pd.DataFrame, win: int = 24, thr: float = 3.0) -> pd.DataFrame:
+    """Référence par station : médiane/IQR glissants (fenêtre ~24h)."""
+    g = g.copy()
+    minp = max(8, win // 3)
+
+    # médiane glissante
+    g["roll_med"] = g["bikes_median"].rolling(win, min_periods=minp).median()
+
+    # IQR glissant
+    def iqr(x):
+        x = pd.Series(x).dropna()
+        return (x.quantile(0.75) - x.quantile(0.25)) if len(x) else 0.0
+
+    g["roll_iqr"] = g["bikes_median"].rolling(win, min_periods=minp).apply(iqr, raw=False)
+    g["norm_iqr"] = g["roll_iqr"].replace(0, 1e-9)
+
+    # score d'anomalie (écart normalisé)
+    g["anomaly_score"] = (g["bikes_median"] - g["roll_med"]).abs() / g["norm_iqr"]
+    g["is_anomaly"] = g["anomaly_score"] > thr
+
+    # règle simple: station bloquée (0 vélos ET 0 bornes)
+    g["is_blocked_now"] = (g["bikes_median"] == 0) & (g["docks_mean"] == 0)
+
+    # bloquée ≥ 3h d'affilée (compte de runs)
+    run_id = (~g["is_blocked_now"]).cumsum()
+    g["blocked_run_len"] = g.groupby(run_id)["is_blocked_now"].cumsum().where(g["is_blocked_now"], 0)
+    g["is_blocked_3h"] = g["blocked_run_len"] >= 3
+    return g
+
+def _quantile(sorted_w, n, q):
+    """Quantile linéaire de fenêtres triées de `n` valeurs (même arrondi que numpy)."""
+    h = np.maximum(n - 1, 0) * q
+    i = np.floor(h).astype(np.int64)
+    t = h - i
+    a = np.take_along_axis(sorted_w, i[..., None], -1)[..., 0]
+    b = np.take_along_axis(sorted_w, np.minimum(i + 1, np.maximum(n - 1, 0))[..., None], -1)[..., 0]
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+def rolling_median_iqr(values, station_idx, pos, win=24, minp=8, block=None):
+    """Médiane et IQR glissants (en lignes) pour toutes les stations.
+
+    `values[i]` est la i-ème valeur, à la position `pos[i]` de la station
+    `station_idx[i]`. Retourne (roll_med, roll_iqr) alignés sur `values`.
+    `block` : stations par bloc (défaut : déduit de `BLOCK_BYTES`).
+    """
+    n_st = int(station_idx.max()) + 1 if len(values) else 0
+    n_t = int(pos.max()) + 1 if len(values) else 0
+    if block is None:
+        # par station : copie triée des fenêtres (float64) + masque NaN et temporaires
+        block = max(1, BLOCK_BYTES // (max(n_t, 1) * win * 16))
+    grid = np.full((n_st, n_t + win - 1), np.nan)
+    grid[station_idx, pos + win - 1] = values  # NaN en tête = fenêtres partielles
+
+    med = np.full((n_st, n_t), np.nan)
+    iqr = np.full((n_st, n_t), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # fenêtres vides (masquées ensuite)
+        for s in range(0, n_st, block):
+            w = np.sort(sliding_window_view(grid[s:s + block], win, axis=1), axis=-1)  # NaN en fin
+            n = (~np.isnan(w)).sum(axis=-1)
+            ok = n >= minp
+            # médiane comme le skiplist de pandas : (a + b) / 2
+            lo = np.take_along_axis(w, np.maximum(n - 1, 0)[..., None] // 2, -1)[..., 0]
+            hi = np.take_along_axis(w, (n // 2)[..., None], -1)[..., 0]
+            med[s:s + block] = np.where(ok, (lo + hi) / 2, np.nan)
+            iqr[s:s + block] = np.where(ok, _quantile(w, n, 0.75) - _quantile(w, n, 0.25), np.nan)
+    return med[station_idx, pos], iqr[station_idx, pos]
+
+def blocked_runs(blocked, first_of_station):
+    """Longueur du blocage en cours à chaque ligne (remise à zéro à chaque station)."""
+    b = blocked.astype(np.int64)
+    c = np.cumsum(b)
+    # base = valeur du cumsum au dernier « reset » (ligne non bloquée ou début de station)
+    base = np.where(~blocked, c, np.where(first_of_station, c - b, -1))
+    base = np.maximum.accumulate(base)
+    return np.where(blocked, c - base, 0)
+
+def compute_anomalies(df: pd.DataFrame, win: int = 24, thr: float = 3.0) -> pd.DataFrame:
+    """Version batch de `compute_anomaly` sur toutes les stations.
+
+    `df` doit être trié par (stationcode, ts_hour) ; l'ordre est conservé.
+    """
+    out = df.copy()
+    minp = max(8, win // 3)
+    station_idx, _ = pd.factorize(out["stationcode"], sort=False)
+    pos = out.groupby("stationcode", sort=False).cumcount().to_numpy()
+
+    b_med = out["bikes_median"].to_numpy(dtype=float)
+    roll_med, roll_iqr = rolling_median_iqr(b_med, station_idx, pos, win, minp)
+    out["roll_med"] = roll_med
+    out["roll_iqr"] = roll_iqr
+    out["norm_iqr"] = out["roll_iqr"].replace(0, 1e-9)
+
+    out["anomaly_score"] = (out["bikes_median"] - out["roll_med"]).abs() / out["norm_iqr"]
+    out["is_anomaly"] = out["anomaly_score"] > thr
+
+    out["is_blocked_now"] = (out["bikes_median"] == 0) & (out["docks_mean"] == 0)
+    out["blocked_run_len"] = blocked_runs(out["is_blocked_now"].to_numpy(), pos == 0)
+    out["is_blocked_3h"] = out["blocked_run_len"] >= 3
+    return out
+
+def spatial_scores(out: pd.DataFrame, radius_m: float = SPATIAL_RADIUS_M, thr: float = 3.0) -> pd.DataFrame:
+    """Ajoute `neigh_dev`, `spatial_score`, `is_spatial_anomaly` à la sortie de `compute_anomalies`.
+
+    - écart signé d'une station : (bikes_median - roll_med) / norm_iqr, borné à ±DEV_CLIP
+    - `neigh_dev` : moyenne des écarts des voisines (< `radius_m`) à la même heure
+      (0 si aucune voisine mesurée : pas d'information → neutre)
+    - `spatial_score` = |écart - neigh_dev| ; `is_spatial_anomaly` = anomalie
+      propre ET score spatial > thr (panne isolée, pas un effet de zone)
+    """
+    out = out.copy()
+    stations = out.drop_duplicates("stationcode", keep="last")[["stationcode", "lat", "lon"]]
+    index = StationIndex(stations)
+    adj = index.radius_graph(radius_m)  # CSR n × n, calculée une fois
+
+    si = pd.Index(index.stations["stationcode"]).get_indexer(out["stationcode"])
+    hi, hours = pd.factorize(out["ts_hour"], sort=True)
+    dev = ((out["bikes_median"] - out["roll_med"]) / out["norm_iqr"]).to_numpy(dtype=float)
+    dev = np.clip(dev, -DEV_CLIP, DEV_CLIP)
+    ok = (si >= 0) & np.isfinite(dev)
+
+    # station × heure : somme des écarts et nombre de voisines mesurées
+    dev_mat = np.zeros((len(index), len(hours)), dtype=np.float32)
+    seen = np.zeros((len(index), len(hours)), dtype=np.float32)
+    dev_mat[si[ok], hi[ok]] = dev[ok]
+    seen[si[ok], hi[ok]] = 1.0
+    total = adj @ dev_mat
+    count = adj @ seen
+    with np.errstate(invalid="ignore", divide="ignore"):
+        neigh = np.where(count > 0, total / count, 0.0)
+
+    neigh_dev = np.zeros(len(out))
+    has_xy = si >= 0
+    neigh_dev[has_xy] = neigh[si[has_xy], hi[has_xy]]
+    out["neigh_dev"] = np.where(ok, neigh_dev, np.nan)
+    out["spatial_score"] = np.abs(dev - out["neigh_dev"].to_numpy())
+    out["is_spatial_anomaly"] = out["is_anomaly"] & (out["spatial_score"] > thr)
+    return out
@@ -0,0 +1,158 @@
+"""Détecteur d'anomalies en flux : une mise à jour par nouvelle valeur horaire.
+
+Même règle que `anomaly_engine.compute_anomalies` (fenêtre de `win` lignes,
+min_periods = max(8, win // 3), seuil `thr`), mais sans relire l'historique :
+
+- par station, la fenêtre glissante est gardée en ordre d'arrivée (deque) et
+  en ordre trié (bisect) → médiane/quartiles lus par indice à chaque valeur
+- le compteur de blocage consécutif est tenu à jour au fil de l'eau
+- l'état est sauvegardé sur disque (JSON) : un redémarrage reprend là où il
+  s'était arrêté
+
+Usage (alimenté par les heures closes du stockage horaire) :
+    python anomaly_stream.py
+"""
+import bisect
+import json
+import math
+import os
+from collections import deque
+
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = os.path.join(BASE_DIR, "data", "anomaly_stream_state.json")
+OUT_CSV = os.path.join(BASE_DIR, "anomalies_live.csv")
+
+def _quantile(xs, q):
+    """Quantile linéaire d'une liste triée (même arrondi que numpy)."""
+    h = (len(xs) - 1) * q
+    i = math.floor(h)
+    t = h - i
+    a, b = xs[i], xs[min(i + 1, len(xs) - 1)]
+    return b - (b - a) * (1 - t) if t >= 0.5 else a + (b - a) * t
+
+class StationWindow:
+    """Fenêtre glissante d'une station + compteur de blocage."""
+
+    __slots__ = ("win", "values", "sorted", "run", "last_ts")
+
+    def __init__(self, win, values=(), run=0, last_ts=None):
+        self.win = win
+        self.values = deque(maxlen=win)   # ordre d'arrivée (NaN compris)
+        self.sorted = []                  # valeurs non-NaN triées
+        self.run = run
+        self.last_ts = last_ts
+        for v in values:
+            self._push(v)
+
+    def _push(self, v):
+        if len(self.values) == self.win:
+            old = self.values[0]
+            if not math.isnan(old):
+                del self.sorted[bisect.bisect_left(self.sorted, old)]
+        self.values.append(v)
+        if not math.isnan(v):
+            bisect.insort(self.sorted, v)
+
+    def median_iqr(self, minp):
+        xs = self.sorted
+        if len(xs) < minp:
+            return math.nan, math.nan
+        n = len(xs)
+        med = (xs[(n - 1) // 2] + xs[n // 2]) / 2   # comme le skiplist de pandas
+        return med, _quantile(xs, 0.75) - _quantile(xs, 0.25)
+
+class StreamingDetector:
+    """État de toutes les stations ; `update` émet le résultat immédiatement."""
+
+    def __init__(self, win=24, thr=3.0):
+        self.win = win
+        self.thr = thr
+        self.minp = max(8, win // 3)
+        self.stations = {}
+
+    def update(self, station, ts_hour, bikes_median, docks_mean):
+        """Intégrer une nouvelle valeur horaire → dict des colonnes d'anomalie."""
+        st = self.stations.get(station)
+        if st is None:
+            st = self.stations[station] = StationWindow(self.win)
+        v = float(bikes_median) if bikes_median is not None else math.nan
+        st._push(v)
+        st.last_ts = str(ts_hour)
+
+        med, iqr = st.median_iqr(self.minp)
+        norm = 1e-9 if iqr == 0 else iqr
+        score = abs(v - med) / norm
+        blocked = v == 0 and docks_mean == 0
+        st.run = st.run + 1 if blocked else 0
+        return {
+            "roll_med": med,
+            "roll_iqr": iqr,
+            "anomaly_score": score,
+            "is_anomaly": bool(score > self.thr),
+            "is_blocked_now": blocked,
+            "blocked_run_len": st.run,
+            "is_blocked_3h": st.run >= 3,
+        }
+
+    def save(self, path=STATE_FILE):
+        """Checkpoint atomique de l'état (fenêtres, compteurs, dernière heure vue)."""
+        state = {
+            "win": self.win, "thr": self.thr,
+            "stations": {str(k): {"values": [None if math.isnan(x) else x for x in st.values],
+                                  "run": st.run, "last_ts": st.last_ts}
+                         for k, st in self.stations.items()},
+        }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=STATE_FILE, win=24, thr=3.0):
+        """Recharger un checkpoint (ou un détecteur vide s'il n'existe pas)."""
+        if not os.path.exists(path):
+            return cls(win, thr)
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        det = cls(state["win"], state["thr"])
+        for k, s in state["stations"].items():
+            vals = [math.nan if x is None else x for x in s["values"]]
+            det.stations[k] = StationWindow(det.win, vals, s["run"], s["last_ts"])
+        return det
+
+    def last_ts(self):
+        seen = [st.last_ts for st in self.stations.values() if st.last_ts]
+        return pd.Timestamp(max(seen)) if seen else None
+
+def main():
+    import history_store
+    import hourly_store
+    import schemas
+
+    det = StreamingDetector.load()
+    since = det.last_ts()
+    wm = hourly_store.load_watermark()
+    if wm is None:
+        raise FileNotFoundError("❌ Pas de watermark : lance d'abord aggregate_hourly.py --incremental.")
+
+    # seules les heures closes et pas encore vues
+    start = since + pd.Timedelta(hours=1) if since is not None else None
+    df = hourly_store.read_hourly(start, wm).sort_values(["ts_hour", "station_id"])
+    if df.empty:
+        print(f"✅ Rien de nouveau (dernière heure traitée : {since})")
+        return
+
+    res = [det.update(str(r.station_id), r.ts_hour, r.bikes_median, r.docks_mean)
+           for r in df.itertuples(index=False)]
+    out = pd.concat([df.reset_index(drop=True), pd.DataFrame(res)], axis=1)
+    det.save()
+
+    out = history_store.attach_stations(out, on="ts_hour")
+    schemas.write_csv(schemas.apply_schema(out, schemas.ANOMALIES), OUT_CSV)
+    print(f"✅ {len(df)} valeurs intégrées → {OUT_CSV} | anomalies: {int(out['is_anomaly'].sum())} "
+          f"| blocages≥3h: {int(out['is_blocked_3h'].sum())} | checkpoint: {STATE_FILE}")
+
+if __name__ == "__main__":
+    main()
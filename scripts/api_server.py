@@ -0,0 +1,349 @@
+"""API HTTP locale (asyncio) : disponibilités live et KPIs servis depuis la mémoire.
+
+Les réponses JSON sont précalculées à chaque (re)chargement des sources :
+servir une requête = une recherche dans un dict + l'écriture d'octets déjà
+prêts (corps brut ET gzip, ETag). Aucune lecture disque par requête.
+Un rechargement construit un `Snapshot` complet hors de la boucle
+d'événements puis le publie par une seule affectation.
+
+Sources (rechargées quand le pipeline publie une nouvelle version, vérifiées
+toutes les `--reload-every` secondes par de simples `stat`) :
+
+- live        : dernier état du store `data/history` (sinon dernière heure du Parquet horaire)
+- dashboard   : artefacts versionnés `outputs/dashboard/CURRENT` (taux de vide par station)
+- kpi         : `outputs/kpi_*.csv`
+- anomalies   : dernière heure de `anomalies_velib.csv`
+
+Endpoints (GET/HEAD, ETag/304, gzip si `Accept-Encoding: gzip`) :
+    /health                       versions chargées
+    /stations[?arrdt=Paris]       stations (filtrables par arrondissement)
+    /stations/<stationcode>       une station (live + taux de vide + anomalie)
+    /arrondissements              résumé par arrondissement
+    /arrondissements/<nom>        un arrondissement
+    /kpi/heures                   courbe horaire (heures de pointe)
+    /kpi/top-vides[?n=10]         stations le plus souvent vides
+    /anomalies/latest             anomalies de la dernière heure
+
+Usage :
+    python scripts/api_server.py --port 8080
+    python scripts/load_test.py --url http://127.0.0.1:8080 --duration 10
+"""
+import argparse
+import asyncio
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import dashboard_artifacts
+import history_store
+import schemas
+from hourly_store import HOURLY_PARQUET, query_hourly
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
+ANOMALIES_CSV = os.path.join(BASE_DIR, "anomalies_velib.csv")
+KPI_FILES = {
+    "heures": "kpi_heures_de_pointe.csv",
+    "saturation": "kpi_saturation_arrondissement.csv",
+    "top_vides": "kpi_top_stations_vides.csv",
+}
+GZIP_MIN_BYTES = 512
+MAX_HEADER_BYTES = 16 * 1024
+
+class Response:
+    """Corps JSON figé + variante gzip + ETag, calculés une seule fois."""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, obj):
+        self.body = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=8).hexdigest() + '"'
+
+def _records(df):
+    """DataFrame → liste de dicts JSON (NaN → null, types numpy → Python)."""
+    return json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+
+def _mtime(path):
+    return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+
+class Snapshot:
+    """Réponses figées d'une version des sources ; jamais modifié une fois publié.
+
+    Les réponses `/kpi/top-vides?n=…` (n ≤ taille du top) sont toutes
+    précalculées : aucune écriture à la lecture.
+    """
+
+    __slots__ = ("routes", "stations", "by_arrdt", "arrdts", "top_vides", "tops")
+
+    def __init__(self, routes=None, stations=None, by_arrdt=None, arrdts=None, top_vides=()):
+        self.routes = routes or {}
+        self.stations = stations or {}
+        self.by_arrdt = by_arrdt or {}
+        self.arrdts = arrdts or {}
+        self.top_vides = list(top_vides)
+        self.tops = tuple(Response(self.top_vides[:n]) for n in range(len(self.top_vides) + 1))
+
+    def top(self, n):
+        return self.tops[max(0, min(n, len(self.top_vides)))]
+
+    def lookup(self, target):
+        """Chemin + query → Response (None = 404)."""
+        parts = urlsplit(target)
+        path = parts.path.rstrip("/") or "/"
+        if path in self.routes and not parts.query:
+            return self.routes[path]
+        query = parse_qs(parts.query)
+        if path == "/stations":
+            if "arrdt" in query:
+                return self.by_arrdt.get(query["arrdt"][0], Response([]))
+            return self.routes.get(path)
+        if path.startswith("/stations/"):
+            return self.stations.get(unquote(path[len("/stations/"):]))
+        if path.startswith("/arrondissements/"):
+            return self.arrdts.get(unquote(path[len("/arrondissements/"):]))
+        if path == "/kpi/top-vides":
+            try:
+                n = int(query.get("n", ["10"])[0])
+            except ValueError:
+                return None
+            return self.top(n)
+        return self.routes.get(path)
+
+class DataStore:
+    """Données en mémoire + réponses précalculées ; `refresh()` recharge ce qui a changé."""
+
+    def __init__(self, history_root=history_store.HISTORY_DIR, dashboard_root=dashboard_artifacts.DASHBOARD_DIR,
+                 output_dir=OUTPUT_DIR, anomalies_csv=ANOMALIES_CSV, hourly_parquet=HOURLY_PARQUET):
+        self.history_root = history_root
+        self.dashboard_root = dashboard_root
+        self.output_dir = output_dir
+        self.anomalies_csv = anomalies_csv
+        self.hourly_parquet = hourly_parquet
+        self.versions = {}
+        self.frames = {}
+        self.snapshot = Snapshot()  # seule référence lue par les requêtes
+
+    # ---------- signatures (stat uniquement) ----------
+    def _signatures(self):
+        recent = history_store.list_snapshots(
+            start=pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=1), root=self.history_root)
+        return {
+            "live": os.path.basename(recent[-1]) if recent else _mtime(self.hourly_parquet),
+            "dashboard": dashboard_artifacts.current_version(self.dashboard_root),
+            "kpi": tuple(_mtime(os.path.join(self.output_dir, f)) for f in KPI_FILES.values()),
+            "anomalies": _mtime(self.anomalies_csv),
+        }
+
+    # ---------- chargeurs ----------
+    def _load_live(self, sig):
+        if isinstance(sig, str):
+            state = history_store.state_at(pd.Timestamp.now(tz="UTC"), self.history_root)
+            live = history_store.attach_stations(state, self.history_root)
+            return live[["stationcode", "name", "arrdt", "lat", "lon", "ts", "bikes", "docks", "mechanical", "ebikes"]]
+        if sig is None:
+            return pd.DataFrame(columns=["stationcode", "name", "arrdt", "lat", "lon", "ts", "bikes", "docks"])
+        df = query_hourly(columns=["ts_hour", "stationcode", "name", "arrdt", "lat", "lon", "bikes_mean", "docks_mean"],
+                          path=self.hourly_parquet)
+        last = df[df["ts_hour"] == df["ts_hour"].max()]
+        return last.rename(columns={"ts_hour": "ts", "bikes_mean": "bikes", "docks_mean": "docks"})
+
+    def _load_dashboard(self, version):
+        if version is None:
+            return pd.DataFrame(columns=["stationcode", "empty_pct"])
+        return dashboard_artifacts.load(version, self.dashboard_root)["stations"][["stationcode", "empty_pct"]]
+
+    def _load_kpi(self, sig):
+        out = {}
+        for key, name in KPI_FILES.items():
+            path = os.path.join(self.output_dir, name)
+            out[key] = pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
+        return out
+
+    def _load_anomalies(self, sig):
+        if sig is None:
+            return pd.DataFrame(columns=["stationcode", "ts_hour", "anomaly_score", "is_anomaly", "is_blocked_3h"])
+        df = schemas.read_anomalies(self.anomalies_csv)
+        return df[df["ts_hour"] == df["ts_hour"].max()]
+
+    def refresh(self):
+        """Recharger les sources dont la signature a changé ; True si quelque chose a changé."""
+        sigs = self._signatures()
+        loaders = {"live": self._load_live, "dashboard": self._load_dashboard,
+                   "kpi": self._load_kpi, "anomalies": self._load_anomalies}
+        changed = [k for k, sig in sigs.items() if k not in self.versions or self.versions[k] != sig]
+        if not changed:
+            return False
+        # tout est construit à part (thread de rechargement), puis publié d'un coup :
+        # une requête voit l'ancien instantané ou le nouveau, jamais un mélange
+        frames, versions = dict(self.frames), dict(self.versions)
+        for key in changed:
+            frames[key] = loaders[key](sigs[key])
+            versions[key] = sigs[key]
+        snapshot = self._build(frames, versions)
+        self.frames, self.versions = frames, versions
+        self.snapshot = snapshot
+        return True
+
+    # ---------- réponses précalculées ----------
+    def _build(self, frames, versions):
+        live = frames["live"].copy()
+        live["stationcode"] = live["stationcode"].astype(str)
+        dash = frames["dashboard"].assign(stationcode=lambda d: d["stationcode"].astype(str))
+        anom = frames["anomalies"].copy()
+        anom["stationcode"] = anom["stationcode"].astype(str)
+        flags = anom[["stationcode", "anomaly_score", "is_anomaly", "is_blocked_3h"]]
+        st = (live.merge(dash, on="stationcode", how="left")
+                  .merge(flags, on="stationcode", how="left")
+                  .sort_values("stationcode"))
+        records = _records(st)
+
+        stations = {r["stationcode"]: Response(r) for r in records}
+        groups = {}
+        for r in records:
+            groups.setdefault(r["arrdt"], []).append(r)
+        by_arrdt = {a: Response(rs) for a, rs in groups.items()}
+
+        sat = frames["kpi"]["saturation"]
+        sat_map = dict(zip(sat.get("arrdt", []), sat.get("is_empty", [])))
+        summary = []
+        for arrdt, rs in sorted(groups.items(), key=lambda kv: str(kv[0])):
+            bikes = np.array([r.get("bikes") or 0 for r in rs], dtype=float)
+            docks = np.array([r.get("docks") or 0 for r in rs], dtype=float)
+            summary.append({"arrdt": arrdt, "stations": len(rs),
+                            "bikes": float(bikes.sum()), "docks": float(docks.sum()),
+                            "empty_now": int((bikes == 0).sum()),
+                            "anomalies": int(sum(bool(r.get("is_anomaly")) for r in rs)),
+                            "saturation_pct": sat_map.get(arrdt)})
+        arrdts = {s["arrdt"]: Response(s) for s in summary}
+
+        top = frames["kpi"]["top_vides"]
+        if len(top):
+            top = top.assign(stationcode=top["stationcode"].astype(str))
+            names = live[["stationcode", "name", "arrdt"]]
+            top = top.merge(names, on="stationcode", how="left")
+        top_vides = _records(top)
+
+        anomalies = anom[anom["is_anomaly"].fillna(False).astype(bool)] if len(anom) else anom
+        routes = {
+            "/health": Response({"status": "ok", "versions": {k: str(v) for k, v in versions.items()},
+                                 "stations": len(stations)}),
+            "/stations": Response(records),
+            "/arrondissements": Response(summary),
+            "/kpi/heures": Response(_records(frames["kpi"]["heures"])),
+            "/anomalies/latest": Response(_records(anomalies.sort_values("anomaly_score", ascending=False))),
+        }
+        return Snapshot(routes, stations, by_arrdt, arrdts, top_vides)
+
+    def lookup(self, target):
+        return self.snapshot.lookup(target)
+
+_REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+def _head(status, extra, length, keep_alive):
+    lines = [f"HTTP/1.1 {status} {_REASONS[status]}", f"Content-Length: {length}",
+             "Connection: " + ("keep-alive" if keep_alive else "close")] + extra
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+def respond(store, method, target, headers):
+    """(en-têtes + corps) pour une requête déjà analysée."""
+    if method not in ("GET", "HEAD"):
+        return 405, [], b""
+    res = store.lookup(target)
+    if res is None:
+        return 404, ["Content-Type: application/json"], b'{"error":"not found"}'
+    extra = [f"ETag: {res.etag}", "Cache-Control: no-cache", "Vary: Accept-Encoding"]
+    if headers.get("if-none-match") == res.etag:
+        return 304, extra, b""
+    extra.append("Content-Type: application/json; charset=utf-8")
+    if res.gzipped is not None and "gzip" in headers.get("accept-encoding", ""):
+        return 200, extra + ["Content-Encoding: gzip"], res.gzipped
+    return 200, extra, res.body
+
+async def handle(store, reader, writer):
+    """Connexion HTTP/1.1 keep-alive : requêtes traitées en séquence."""
+    try:
+        while True:
+            try:
+                raw = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = raw.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                writer.write(_head(400, [], 0, False))
+                break
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    k, v = line.split(":", 1)
+                    headers[k.strip().lower()] = v.strip()
+            try:
+                length = int(headers.get("content-length", "0"))
+            except ValueError:
+                length = -1
+            if length < 0:
+                writer.write(_head(400, [], 0, False))
+                break
+            if length:
+                await reader.readexactly(length)
+            keep_alive = (headers.get("connection", "").lower() != "close") and version == "HTTP/1.1"
+            status, extra, body = respond(store, method, target, headers)
+            writer.write(_head(status, extra, len(body), keep_alive))
+            if method != "HEAD" and body:
+                writer.write(body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+async def reload_loop(store, every):
+    while True:
+        await asyncio.sleep(every)
+        try:
+            # chargement hors de la boucle d'événements : les requêtes continuent
+            if await asyncio.to_thread(store.refresh):
+                print(f"🔄 Données rechargées : {store.versions}")
+        except Exception as exc:  # on garde les données précédentes
+            print(f"⚠️ Rechargement échoué : {exc}")
+
+async def serve(store, host="127.0.0.1", port=8080, reload_every=10.0):
+    server = await asyncio.start_server(lambda r, w: handle(store, r, w), host, port,
+                                        limit=MAX_HEADER_BYTES, backlog=1024)
+    # référence gardée : la boucle d'événements ne tient les tâches que faiblement
+    reloader = asyncio.create_task(reload_loop(store, reload_every))
+    addr = server.sockets[0].getsockname()
+    print(f"🚀 API Vélib : http://{addr[0]}:{addr[1]} ({len(store.snapshot.stations)} stations en mémoire)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        reloader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reloader
+
+def main():
+    ap = argparse.ArgumentParser(description="API HTTP locale Vélib (données en mémoire)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--reload-every", type=float, default=10.0, help="secondes entre deux vérifications des sources")
+    ap.add_argument("--anomalies", default=ANOMALIES_CSV)
+    args = ap.parse_args()
+
+    store = DataStore(anomalies_csv=args.anomalies)
+    store.refresh()
+    try:
+        asyncio.run(serve(store, args.host, args.port, args.reload_every))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
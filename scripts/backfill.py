@@ -0,0 +1,128 @@
+"""Ingestion en masse des dumps bruts `data_velib_*.json[.gz]` dans l'historique.
+
+Usage :
+    python backfill.py ../raw            # tous les dumps du dossier
+    python backfill.py ../raw --workers 8
+
+- décodage en parallèle (pool de processus) avec orjson (requirements.txt ;
+  repli sur json sinon) ; chaque worker renvoie une table Arrow colonnaire
+- `ts` = horodatage propre au dump (max des `record_timestamp`), pas l'heure d'import
+- les fichiers déjà ingérés (manifeste `_ingested.json`) sont ignorés
+- flux borné : au plus 2 × workers dumps décodés en vol ; chaque snapshot est
+  écrit dès que son tour arrive, dans l'ordre des noms de fichiers
+  (`data_velib_AAAAMMJJ_HHMMSS`, donc chronologique) pour que la dimension
+  stations voie les versions dans le bon ordre
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+import history_store
+
+try:  # décodeur rapide optionnel
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+MANIFEST = "_ingested.json"
+
+def load_dump(path):
+    """Lire un dump brut, compressé (.gz) ou non."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return _loads(f.read())
+
+def dump_ts(data):
+    """Horodatage du dump : dernier `record_timestamp` (UTC, à la seconde)."""
+    stamps = [r["record_timestamp"] for r in data.get("records", []) if "record_timestamp" in r]
+    if not stamps:
+        return None
+    ts = max(pd.to_datetime(stamps, utc=True)).floor("s")
+    return ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def parse_dump(path):
+    """(worker) Dump → (chemin, ts, table Arrow des lignes d'historique).
+
+    Colonnaire plutôt qu'une liste de dicts : le retour vers le processus
+    parent passe par les buffers Arrow, pas par un pickle ligne à ligne.
+    """
+    from collect_historique import to_rows  # import paresseux côté worker
+
+    data = load_dump(path)
+    ts = dump_ts(data)
+    fields = [rec["fields"] for rec in data.get("records", []) if "fields" in rec]
+    del data
+    df = pd.DataFrame(to_rows(fields, ts)).dropna(subset=["lat", "lon"])
+    return path, ts, pa.Table.from_pandas(df, preserve_index=False)
+
+def load_manifest(root=history_store.HISTORY_DIR):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(manifest, root=history_store.HISTORY_DIR):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, MANIFEST)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def _ingest(parsed, manifest, root, written, last_ts):
+    """Écrire un dump décodé puis l'inscrire au manifeste → (written, last_ts)."""
+    path, ts, table = parsed
+    if ts is None:
+        print(f"⚠️ Pas de record_timestamp, ignoré : {path}")
+        return written, last_ts
+    if last_ts is not None and ts < last_ts:
+        print(f"⚠️ Dump antérieur au précédent ({ts} < {last_ts}) : {path}")
+    if not os.path.exists(history_store.snapshot_path(ts, root)):
+        history_store.write_snapshot(table.to_pandas(), root)
+        written += 1
+    manifest[os.path.basename(path)] = ts
+    save_manifest(manifest, root)  # après chaque fichier : reprise possible
+    return written, max(ts, last_ts or ts)
+
+def backfill(raw_dir, workers=None, root=history_store.HISTORY_DIR):
+    """Ingérer tous les dumps non encore vus de `raw_dir` → nb de snapshots écrits."""
+    files = sorted(glob.glob(os.path.join(raw_dir, "data_velib_*.json"))
+                   + glob.glob(os.path.join(raw_dir, "data_velib_*.json.gz")))
+    manifest = load_manifest(root)
+    todo = [p for p in files if os.path.basename(p) not in manifest]
+    if not todo:
+        return 0, len(files)
+
+    workers = workers or os.cpu_count() or 1
+    written, last_ts = 0, None
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        inflight = deque()
+        for path in todo:
+            inflight.append(ex.submit(parse_dump, path))
+            if len(inflight) >= 2 * workers:
+                written, last_ts = _ingest(inflight.popleft().result(), manifest, root, written, last_ts)
+        while inflight:
+            written, last_ts = _ingest(inflight.popleft().result(), manifest, root, written, last_ts)
+    return written, len(files)
+
+def main():
+    ap = argparse.ArgumentParser(description="Backfill des dumps JSON bruts dans l'historique")
+    ap.add_argument("raw_dir", nargs="?", default="raw")
+    ap.add_argument("--workers", type=int, default=None, help="processus (défaut : nb de cœurs)")
+    args = ap.parse_args()
+
+    written, total = backfill(args.raw_dir, args.workers)
+    print(f"✅ Backfill : {written} snapshot(s) écrit(s) | {total} dump(s) dans {args.raw_dir}")
+    if written:
+        print("ℹ️ Snapshots anciens : aggregate_hourly.py --incremental reconstruira data/hourly/ au prochain passage.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Suite de benchmarks du pipeline sur données synthétiques (voir synth_velib.py).
+
+Chaque étape tourne dans un processus neuf (pic mémoire RSS propre à
+l'étape) sur un espace de travail temporaire ; les entrées sont chargées
+avant le chrono, seule l'opération mesurée est chronométrée :
+
+    generate    synth_velib.iter_days                     (lignes brutes)
+    store_write history_store.write_snapshot, 1 par ts     (lignes brutes)
+    store_read  history_store.read_history                 (lignes brutes)
+    aggregate   hourly_store.aggregate_snapshots + attach  (lignes brutes)
+    anomalies   compute_anomalies + spatial_scores         (lignes horaires)
+    kpis        kpi_engine.update + kpi_tables             (lignes horaires)
+    map         calques map_layers (dernière heure) + HTML (stations)
+
+Rapport : temps, lignes/s, pic RSS par étape. Comparaison à la référence
+`data/bench_baseline.json` (par échelle, avec la machine qui l'a produite) :
+code de sortie 1 si une étape dépasse la tolérance en temps ou en mémoire.
+Sur une autre machine les écarts sont seulement affichés — enregistrer
+une référence locale avec `--update-baseline`.
+
+Une étape dont le processus meurt (OOM, signal) ou dépasse `--timeout`
+est signalée en échec au lieu de bloquer la suite.
+
+Usage :
+    python scripts/bench_pipeline.py                      # échelle small, compare à la référence
+    python scripts/bench_pipeline.py --scale medium
+    python scripts/bench_pipeline.py --update-baseline    # (ré)enregistrer la référence
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue as queue_mod
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(BASE_DIR, "data", "bench_baseline.json")
+SCALES = {
+    # stations, jours, pas (min)
+    "small": (300, 1, 5),
+    "medium": (1467, 7, 5),
+    "large": (1467, 30, 1),
+}
+MIN_DELTA_S = 0.05  # écarts de temps plus petits = bruit de mesure, jamais une régression
+STAGES = ["generate", "store_write", "store_read", "aggregate", "anomalies", "kpis", "map"]
+
+# ---------- étapes : (ws, cfg) → (lignes traitées, secondes) ----------
+def stage_generate(ws, cfg):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import synth_velib
+
+    # un jour à la fois : jamais tout l'historique en mémoire (≈ 63 M lignes en large)
+    days = synth_velib.iter_days(cfg["stations"], cfg["days"], cfg["period"], cfg["seed"])
+    writer, rows, dt = None, 0, 0.0
+    try:
+        while True:
+            t0 = time.perf_counter()
+            day = next(days, None)
+            dt += time.perf_counter() - t0
+            if day is None:
+                break
+            table = pa.Table.from_pandas(day, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(os.path.join(ws, "raw.parquet"), table.schema)
+            writer.write_table(table.cast(writer.schema), row_group_size=len(day))  # 1 row group = 1 jour
+            rows += len(day)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows, dt
+
+def stage_store_write(ws, cfg):
+    import pyarrow.parquet as pq
+    import history_store
+
+    raw = pq.ParquetFile(os.path.join(ws, "raw.parquet"))
+    rows, dt = 0, 0.0
+    for i in range(raw.num_row_groups):  # un jour par row group, aucun ts à cheval
+        day = raw.read_row_group(i).to_pandas()
+        snaps = [snap for _, snap in day.groupby("ts", sort=True)]
+        t0 = time.perf_counter()
+        for snap in snaps:
+            history_store.write_snapshot(snap, os.path.join(ws, "history"))
+        dt += time.perf_counter() - t0
+        rows += len(day)
+    return rows, dt
+
+def stage_store_read(ws, cfg):
+    import history_store
+
+    t0 = time.perf_counter()
+    df = history_store.read_history(root=os.path.join(ws, "history"))
+    return len(df), time.perf_counter() - t0
+
+def stage_aggregate(ws, cfg):
+    import history_store
+    import hourly_store
+
+    root = os.path.join(ws, "history")
+    df = history_store.read_history(root=root)
+    t0 = time.perf_counter()
+    agg = hourly_store.aggregate_snapshots(df)
+    agg = history_store.attach_stations(agg, root, on="ts_hour")
+    dt = time.perf_counter() - t0
+    agg = agg[["stationcode", "name", "arrdt", "lat", "lon", "ts_hour", "bikes_mean", "bikes_median", "docks_mean"]]
+    hourly_store.write_hourly_parquet(agg.astype({"stationcode": str}), os.path.join(ws, "hourly.parquet"))
+    return len(df), dt
+
+def stage_anomalies(ws, cfg):
+    import pandas as pd
+    from anomaly_engine import compute_anomalies, spatial_scores
+
+    df = pd.read_parquet(os.path.join(ws, "hourly.parquet"))
+    df = df.astype({"name": str, "arrdt": str}).sort_values(["stationcode", "ts_hour"])
+    t0 = time.perf_counter()
+    out = spatial_scores(compute_anomalies(df, win=24, thr=3.0))
+    return len(out), time.perf_counter() - t0
+
+def stage_kpis(ws, cfg):
+    import kpi_engine
+
+    t0 = time.perf_counter()
+    state, n = kpi_engine.update(os.path.join(ws, "hourly.parquet"), kpi_engine.new_state())
+    kpi_engine.kpi_tables(state)
+    return n, time.perf_counter() - t0
+
+def stage_map(ws, cfg):
+    import folium
+    import pandas as pd
+    from map_layers import cluster_layer, color_by_bikes, geojson_layer
+
+    df = pd.read_parquet(os.path.join(ws, "hourly.parquet"))
+    last = df[df["ts_hour"] == df["ts_hour"].max()].astype({"name": str, "arrdt": str})
+    t0 = time.perf_counter()
+    m = folium.Map(location=[48.8566, 2.3522], zoom_start=12)
+    popup = ("name", [("Arrondissement", "arrdt"), ("Vélos", "bikes_mean")])
+    colors = color_by_bikes(last["bikes_mean"])
+    geojson_layer(last, ["name", "arrdt", "bikes_mean"], colors, popup, name="Stations").add_to(m)
+    cluster_layer(last, ["name", "arrdt", "bikes_mean"], colors, popup, name="Cluster").add_to(m)
+    m.save(os.path.join(ws, "map.html"))
+    return len(last), time.perf_counter() - t0
+
+def _child(name, ws, cfg, queue):
+    try:
+        rows, seconds = globals()[f"stage_{name}"](ws, cfg)
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux : Ko
+        queue.put({"rows": rows, "seconds": seconds, "rows_per_s": rows / max(seconds, 1e-9),
+                   "peak_rss_mb": rss_mb})
+    except Exception as exc:
+        queue.put({"error": repr(exc)})
+
+def run_stage(name, ws, cfg, timeout=None):
+    """Lancer une étape dans un processus neuf → mesures.
+
+    Le résultat est attendu par tranches d'une seconde : si le processus
+    meurt sans rien envoyer, ou si `timeout` (s) est dépassé, l'étape échoue.
+    """
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_child, args=(name, ws, cfg, queue))
+    proc.start()
+    t0 = time.monotonic()
+    res = None
+    try:
+        while res is None:
+            try:
+                res = queue.get(timeout=1.0)
+            except queue_mod.Empty:
+                if not proc.is_alive():
+                    try:  # résultat posté juste avant la sortie
+                        res = queue.get(timeout=1.0)
+                    except queue_mod.Empty:
+                        raise RuntimeError(f"étape {name} : processus terminé sans résultat "
+                                           f"(code de sortie {proc.exitcode})") from None
+                elif timeout is not None and time.monotonic() - t0 > timeout:
+                    raise RuntimeError(f"étape {name} : délai de {timeout:g} s dépassé")
+    finally:
+        if proc.is_alive() and res is None:
+            proc.terminate()
+        proc.join()
+    if "error" in res:
+        raise RuntimeError(f"étape {name} : {res['error']}")
+    return res
+
+def run_suite(cfg, stages=STAGES, keep=False, timeout=None):
+    ws = tempfile.mkdtemp(prefix="velib_bench_")
+    try:
+        results = {}
+        for name in stages:
+            results[name] = run_stage(name, ws, cfg, timeout)
+            r = results[name]
+            print(f"  {name:<12} {r['seconds']:8.3f} s  {r['rows_per_s']:>14,.0f} lignes/s  "
+                  f"{r['peak_rss_mb']:8.0f} Mo  ({r['rows']:,} lignes)")
+        return results
+    finally:
+        if keep:
+            print(f"📁 Espace de travail conservé : {ws}")
+        else:
+            shutil.rmtree(ws, ignore_errors=True)
+
+def compare(results, baseline, tol_time=0.30, tol_mem=0.20):
+    """Régressions vs la référence → liste de messages (vide = OK)."""
+    problems = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["seconds"] > base["seconds"] * (1 + tol_time) and r["seconds"] - base["seconds"] > MIN_DELTA_S:
+            problems.append(f"{name} : {r['seconds']:.3f} s > {base['seconds']:.3f} s (+{tol_time:.0%})")
+        if r["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tol_mem):
+            problems.append(f"{name} : {r['peak_rss_mb']:.0f} Mo > {base['peak_rss_mb']:.0f} Mo (+{tol_mem:.0%})")
+    return problems
+
+def machine_info():
+    """Ce qui rend des temps comparables : CPU, cœurs, OS, versions Python/pandas/numpy."""
+    import numpy as np
+    import pandas as pd
+
+    return {"machine": platform.machine(), "processor": platform.processor() or platform.machine(),
+            "cpus": os.cpu_count(), "system": platform.system(), "python": platform.python_version(),
+            "pandas": pd.__version__, "numpy": np.__version__}
+
+def load_baseline(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_baseline(data, path=BASELINE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks du pipeline Vélib (données synthétiques)")
+    ap.add_argument("--scale", choices=sorted(SCALES), default="small")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES)
+    ap.add_argument("--tol-time", type=float, default=0.30, help="tolérance en temps (0.30 = +30 %%)")
+    ap.add_argument("--tol-mem", type=float, default=0.20, help="tolérance en pic mémoire")
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--keep", action="store_true", help="conserver l'espace de travail")
+    ap.add_argument("--timeout", type=float, default=None, help="délai max par étape (s)")
+    args = ap.parse_args()
+
+    stations, days, period = SCALES[args.scale]
+    cfg = {"stations": stations, "days": days, "period": period, "seed": args.seed}
+    print(f"🏁 Échelle {args.scale} : {stations} stations × {days} j, pas {period} min")
+    # les étapes dépendent des précédentes : on rejoue la chaîne jusqu'à la dernière demandée
+    last = max(STAGES.index(s) for s in args.stages)
+    results = run_suite(cfg, STAGES[:last + 1], args.keep, args.timeout)
+    results = {k: v for k, v in results.items() if k in args.stages}
+
+    baseline = load_baseline()
+    if args.update_baseline:
+        baseline[args.scale] = {
+            "machine": machine_info(),
+            "stages": {k: {m: round(v[m], 4) for m in ("seconds", "rows_per_s", "peak_rss_mb")}
+                       for k, v in results.items()},
+        }
+        save_baseline(baseline)
+        print(f"💾 Référence enregistrée : {BASELINE_FILE} [{args.scale}]")
+        return
+
+    if args.scale not in baseline:
+        print(f"⚠️ Pas de référence pour « {args.scale} » (lancer avec --update-baseline)")
+        return
+    ref = baseline[args.scale]
+    if "stages" not in ref:  # ancien format : mesures seules, machine inconnue
+        ref = {"machine": None, "stages": ref}
+    problems = compare(results, ref["stages"], args.tol_time, args.tol_mem)
+    same_machine = ref.get("machine") == machine_info()
+    if problems:
+        print("❌ Régressions :" if same_machine else
+              f"⚠️ Écarts vs une référence d'une autre machine ({ref.get('machine')}), non bloquants :")
+        for p in problems:
+            print(f"  - {p}")
+        if same_machine:
+            sys.exit(1)
+        return
+    print("✅ Aucune régression vs la référence")
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,69 @@
 import os
 import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
 
-API_URL = "https://opendata.paris.fr/api/records/1.0/search/"
+import history_store
+import instrument
+
+# URL surchargeable (ex. serveur local de mock_api.py pour tester hors-ligne)
+API_URL = os.environ.get("VELIB_API_URL", "https://opendata.paris.fr/api/records/1.0/search/")
 DATASET = "velib-disponibilite-en-temps-reel"
-OUT_CSV = "historique_velib.csv"   # fichier d’historique
+MAX_PARALLEL = 4                   # pages récupérées en parallèle (borne)
 
 def utc_iso():
     """Horodatage UTC ISO (sans microsecondes)."""
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
-def fetch_all(rows=1000):
-    """Paginer l'API pour récupérer toutes les stations Vélib."""
-    start, out = 0, []
-    while True:
-        params = {"dataset": DATASET, "rows": rows, "start": start}
-        r = requests.get(API_URL, params=params, timeout=20)
+def make_session(pool_size=MAX_PARALLEL):
+    """Session HTTP keep-alive avec pool de connexions et gzip."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers.update({"Accept-Encoding": "gzip, deflate"})
+    return s
+
+def fetch_page(session, start, rows, url=API_URL):
+    """Récupérer une page de l'API → (nhits, liste des champs)."""
+    params = {"dataset": DATASET, "rows": rows, "start": start}
+    with instrument.stage("collect.page", page_start=start) as st:
+        r = session.get(url, params=params, timeout=20)
         r.raise_for_status()
-        batch = [rec["fields"] for rec in r.json().get("records", []) if "fields" in rec]
-        if not batch:  # plus de résultats → on arrête
-            break
-        out.extend(batch)
-        start += rows
-    return out
+        data = r.json()
+        batch = [rec["fields"] for rec in data.get("records", []) if "fields" in rec]
+        # pages en parallèle : octets reçus pour CETTE page (compressés si gzip)
+        st.bytes_read = int(r.headers.get("Content-Length", len(r.content)))
+        st.rows_out = len(batch)
+    return data.get("nhits", 0), batch
+
+def fetch_all(rows=1000, max_parallel=MAX_PARALLEL, session=None, url=API_URL):
+    """Paginer l'API pour récupérer toutes les stations Vélib.
+
+    La 1re page donne `nhits` : les pages restantes sont connues d'avance et
+    récupérées en parallèle (bornée) sur une session partagée — plus de
+    requête vide finale, et moins d'écart d'horodatage dans un snapshot.
+    `url` : point d'entrée de l'API (ex. celui de `mock_api.serve_in_thread`).
+    """
+    own = session is None
+    session = session or make_session(max_parallel)
+    try:
+        nhits, out = fetch_page(session, 0, rows, url)
+        starts = range(rows, nhits, rows)
+        if starts:
+            with ThreadPoolExecutor(max_workers=max_parallel) as ex:
+                # map conserve l'ordre des pages → résultat déterministe
+                for _, batch in ex.map(lambda s: fetch_page(session, s, rows, url), starts):
+                    out.extend(batch)
+        return out
+    finally:
+        if own:
+            session.close()
 
 def to_rows(fields_list, ts):
-    """Transformer les enregistrements bruts en lignes prêtes pour CSV."""
+    """Transformer les enregistrements bruts en lignes d'historique."""
     rows = []
     for f in fields_list:
         lat, lon = (f.get("coordonnees_geo") or [None, None])
@@ -47,15 +84,17 @@ def to_rows(fields_list, ts):
 
 def main():
     ts = utc_iso()
-    fields = fetch_all(rows=1000)  # récupère toutes les stations (≈1400)
-    rows = to_rows(fields, ts)
-    df = pd.DataFrame(rows).dropna(subset=["lat", "lon"])
+    with instrument.stage("collect") as st:
+        fields = fetch_all(rows=1000)  # récupère toutes les stations (≈1400)
+        rows = to_rows(fields, ts)
+        df = pd.DataFrame(rows).dropna(subset=["lat", "lon"])
+        st.rows_in = len(fields)
 
-    # Append dans le CSV (écrit l’en-tête seulement si le fichier n’existe pas)
-    header = not os.path.exists(OUT_CSV)
-    df.to_csv(OUT_CSV, mode="a", index=False, encoding="utf-8-sig", header=header)
+        # Un fichier Parquet par snapshot (écriture atomique, partition du jour)
+        path = history_store.write_snapshot(df)
+        st.rows_out = len(df)
 
-    print(f"✅ Snapshot ajouté : {len(df)} stations @ {ts} → {OUT_CSV}")
+    print(f"✅ Snapshot ajouté : {len(df)} stations @ {ts} → {path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,92 @@
+"""Collecteur résident : remplace le couple cron + collect_historique.py.
+
+    python collector.py                       # toutes les 60 s, keyframe toutes les 60 polls
+    python collector.py --period 30 --keyframe-every 120
+
+- planification sans dérive : les ticks sont calés sur t0 + k × période
+  (un poll trop long saute les ticks manqués au lieu de décaler les suivants)
+- une seule session HTTP keep-alive (pool de connexions) pour toute la vie du process
+- le snapshot précédent est gardé en mémoire : on n'écrit que les stations dont
+  bikes/docks/mechanical/ebikes (ou les attributs) ont changé, plus une keyframe
+  complète périodique qui borne le coût de reconstitution (`history_store.state_at`) ;
+  les stations disparues depuis le poll précédent sont écrites en pierres tombales
+"""
+import argparse
+import time
+
+import pandas as pd
+
+import history_store
+from collect_historique import fetch_all, make_session, to_rows, utc_iso
+
+STATUS = ["bikes", "docks", "mechanical", "ebikes"]
+ATTRS = ["name", "arrdt", "lat", "lon"]
+
+def changed_rows(df, prev):
+    """Lignes de `df` différentes du snapshot précédent (indexé par stationcode)."""
+    df = df.drop_duplicates("stationcode", keep="last")
+    cur = df.set_index("stationcode")[STATUS + ATTRS]
+    old = prev.reindex(cur.index)
+    same = (cur == old) | (cur.isna() & old.isna())
+    return df[~same.all(axis=1).to_numpy()]
+
+class Collector:
+    """Boucle de collecte avec état en mémoire (snapshot précédent + compteur de keyframe)."""
+
+    def __init__(self, period=60.0, keyframe_every=60, root=history_store.HISTORY_DIR):
+        self.period = period
+        self.keyframe_every = keyframe_every
+        self.root = root
+        self.session = make_session()
+        self.prev = None      # dernier état complet, indexé par stationcode
+        self.n_polls = 0
+
+    def poll(self):
+        """Un tick : récupérer, comparer, écrire keyframe ou delta → (chemin, nb lignes)."""
+        ts = utc_iso()
+        df = pd.DataFrame(to_rows(fetch_all(session=self.session), ts)).dropna(subset=["lat", "lon"])
+        df["stationcode"] = df["stationcode"].astype(str)
+        df = df.drop_duplicates("stationcode", keep="last")  # l'API répète parfois une station
+
+        keyframe = self.prev is None or self.n_polls % self.keyframe_every == 0
+        out = df if keyframe else changed_rows(df, self.prev)
+        removed = [] if self.prev is None else list(self.prev.index.difference(df["stationcode"]))
+        path = history_store.write_snapshot(out, self.root, ts=ts, delta=not keyframe, removed=removed)
+
+        self.prev = df.set_index("stationcode")[STATUS + ATTRS]
+        self.n_polls += 1
+        return path, len(out) + (0 if keyframe else len(removed))
+
+    def run(self, max_polls=None):
+        """Boucle de polls ; `max_polls` borne les tentatives (réussies ou non)."""
+        t0 = time.monotonic()
+        k = attempts = 0
+        while max_polls is None or attempts < max_polls:
+            attempts += 1
+            try:
+                path, n = self.poll()
+                print(f"✅ {n} ligne(s) → {path}")
+            except Exception as e:  # on ne tue pas le démon pour un poll raté
+                print(f"⚠️ Poll échoué : {e}")
+            # prochain tick calé sur la grille t0 + k × période
+            k = max(k + 1, int((time.monotonic() - t0) // self.period) + 1)
+            time.sleep(max(0.0, t0 + k * self.period - time.monotonic()))
+
+def main():
+    ap = argparse.ArgumentParser(description="Collecteur Vélib résident")
+    ap.add_argument("--period", type=float, default=60.0, help="secondes entre deux polls")
+    ap.add_argument("--keyframe-every", type=int, default=60, help="polls entre deux keyframes complètes")
+    ap.add_argument("--max-polls", type=int, default=None)
+    args = ap.parse_args()
+
+    collector = Collector(args.period, args.keyframe_every)
+    print(f"🚲 Collecteur : toutes les {args.period:g} s, keyframe tous les {args.keyframe_every} polls")
+    try:
+        collector.run(args.max_polls)
+    except KeyboardInterrupt:
+        print("👋 Arrêt du collecteur")
+    finally:
+        collector.session.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Cube dense station × heure partagé sur disque (np.memmap).
+
+    data/cube/meta.json          ← t0, nb d'heures, capacité, index des stations
+    data/cube/bikes_mean.f32     ← float32, forme (heures, capacité)
+    data/cube/bikes_median.f32
+    data/cube/docks_mean.f32
+
+- disposition « heure-majeure » : ajouter une heure = ajouter une ligne en fin
+  de fichier, sans réécrire l'existant
+- heure absente pour une station = NaN explicite
+- plusieurs processus peuvent ouvrir le cube en lecture (pages partagées par
+  l'OS, aucune copie) ; une seule écriture à la fois
+
+Portée : seul `forecast.py` lit le cube aujourd'hui. KPIs, anomalies et
+dashboard restent sur le Parquet horaire consolidé, qui porte aussi
+arrdt/nom/coordonnées et dont les lectures sont déjà projetées et filtrées
+(`hourly_store.query_hourly`). L'étape `cube` du pipeline (`cube.py update`,
+après l'agrégation) ajoute les heures closes depuis le stockage horaire ; si
+ce stockage a été reconstruit (backfill), le cube l'est aussi.
+
+Usage :
+    python cube.py build historique_hourly.csv   # (re)construire depuis un CSV horaire
+    python cube.py update [--rebuild]            # ajouter les heures du stockage horaire
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import schemas
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CUBE_DIR = os.path.join(BASE_DIR, "data", "cube")
+METRICS = ["bikes_mean", "bikes_median", "docks_mean"]
+DEFAULT_CAPACITY = 2048  # ≈ 1 470 stations aujourd'hui, marge pour les ouvertures
+
+class Cube:
+    """Accès au cube : `cube["bikes_mean"][h, s]` (vue memmap, sans copie)."""
+
+    def __init__(self, root=CUBE_DIR, mode="r"):
+        self.root = root
+        self.mode = mode
+        with open(os.path.join(root, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.t0 = pd.Timestamp(meta["t0"])
+        self.n_hours = meta["n_hours"]
+        self.capacity = meta["capacity"]
+        self.stations = meta["stations"]  # index → stationcode
+        self.source = meta.get("source")  # `hourly_store.store_created()` pour `update`
+        self.station_index = {code: i for i, code in enumerate(self.stations)}
+        self._arrays = {}
+
+    def __getitem__(self, metric):
+        if metric not in self._arrays:
+            self._arrays[metric] = np.memmap(
+                os.path.join(self.root, f"{metric}.f32"), dtype=np.float32,
+                mode=self.mode, shape=(self.n_hours, self.capacity))
+        return self._arrays[metric][:, :len(self.stations)]
+
+    @property
+    def hours(self):
+        return pd.date_range(self.t0, periods=self.n_hours, freq="h")
+
+    def hour_index(self, ts):
+        return int((pd.Timestamp(ts) - self.t0) // pd.Timedelta(hours=1))
+
+    def slice(self, metric, start=None, end=None, stations=None):
+        """Sous-cube [start, end] (heures incluses) × stations (stationcodes)."""
+        a = 0 if start is None else max(self.hour_index(start), 0)
+        b = self.n_hours if end is None else min(self.hour_index(end) + 1, self.n_hours)
+        arr = self[metric][a:b]
+        if stations is not None:
+            arr = arr[:, [self.station_index[c] for c in stations]]
+        return arr
+
+    def window(self, metric, end, hours=24):
+        """Les `hours` dernières heures jusqu'à `end` incluse (fenêtre d'anomalie)."""
+        return self.slice(metric, pd.Timestamp(end) - pd.Timedelta(hours=hours - 1), end)
+
+    def to_long(self, metric):
+        """Retour au format long (stationcode, ts_hour, valeur) sans les NaN."""
+        arr = self[metric]
+        h, s = np.nonzero(~np.isnan(arr))
+        return pd.DataFrame({"stationcode": np.asarray(self.stations, dtype=object)[s],
+                             "ts_hour": self.hours[h], metric: arr[h, s]})
+
+def _write_meta(root, t0, n_hours, capacity, stations, source=None):
+    path = os.path.join(root, "meta.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"t0": pd.Timestamp(t0).isoformat(), "n_hours": n_hours,
+                   "capacity": capacity, "stations": stations, "source": source}, f)
+    os.replace(path + ".tmp", path)
+
+def _resize(root, metric, old_shape, new_shape):
+    """Agrandir un fichier : heures en plus (ajout en fin) et/ou capacité (recopie)."""
+    path = os.path.join(root, f"{metric}.f32")
+    (h0, c0), (h1, c1) = old_shape, new_shape
+    if c1 != c0 and h0:
+        old = np.array(np.memmap(path, dtype=np.float32, mode="r", shape=(h0, c0)))
+        new = np.memmap(path + ".tmp", dtype=np.float32, mode="w+", shape=(h1, c1))
+        new[:] = np.nan
+        new[:h0, :c0] = old
+        new.flush()
+        del new
+        os.replace(path + ".tmp", path)
+        return
+    with open(path, "ab") as f:  # ajout en fin de fichier uniquement
+        f.write(np.full((h1 - h0) * c1, np.nan, dtype=np.float32).tobytes())
+
+def clear(root=CUBE_DIR):
+    """Supprimer le cube (fichiers de métriques + meta)."""
+    for name in [f"{m}.f32" for m in METRICS] + ["meta.json"]:
+        if os.path.exists(os.path.join(root, name)):
+            os.remove(os.path.join(root, name))
+
+def append(df, root=CUBE_DIR, capacity=DEFAULT_CAPACITY, source=None):
+    """Écrire des lignes horaires (stationcode, ts_hour, métriques) dans le cube.
+
+    Crée le cube si besoin, l'étend aux nouvelles heures/stations ; une heure
+    déjà présente (heure encore ouverte) est simplement réécrite. Les heures
+    antérieures à `t0` sont ignorées (relancer `build` pour un backfill).
+    """
+    exists = os.path.exists(os.path.join(root, "meta.json"))
+    if df.empty and not exists:
+        raise ValueError("❌ Aucune ligne horaire : impossible de créer le cube (t0 inconnu).")
+    os.makedirs(root, exist_ok=True)
+    df = df.assign(stationcode=df["stationcode"].astype(str),
+                   ts_hour=pd.to_datetime(df["ts_hour"], utc=True))
+    if not exists:
+        t0 = df["ts_hour"].min()
+        for m in METRICS:
+            open(os.path.join(root, f"{m}.f32"), "wb").close()
+        _write_meta(root, t0, 0, capacity, [])
+
+    cube = Cube(root)
+    stations = list(cube.stations)
+    known = cube.station_index
+    for code in pd.unique(df["stationcode"]):
+        if code not in known:
+            known[code] = len(stations)
+            stations.append(code)
+    df = df[df["ts_hour"] >= cube.t0]
+
+    n_hours = max(cube.n_hours, cube.hour_index(df["ts_hour"].max()) + 1) if len(df) else cube.n_hours
+    new_cap = cube.capacity
+    while new_cap < len(stations):
+        new_cap *= 2
+    if (n_hours, new_cap) != (cube.n_hours, cube.capacity):
+        for m in METRICS:
+            _resize(root, m, (cube.n_hours, cube.capacity), (n_hours, new_cap))
+
+    h = ((df["ts_hour"] - cube.t0) // pd.Timedelta(hours=1)).to_numpy()
+    s = df["stationcode"].map(known).to_numpy()
+    for m in METRICS:
+        arr = np.memmap(os.path.join(root, f"{m}.f32"), dtype=np.float32, mode="r+", shape=(n_hours, new_cap))
+        arr[h, s] = df[m].to_numpy(dtype=np.float32)
+        arr.flush()
+        del arr
+    # meta en dernier : un lecteur ne voit jamais d'heures non écrites
+    _write_meta(root, cube.t0, n_hours, new_cap, stations, source)
+    return n_hours, len(stations)
+
+def main():
+    ap = argparse.ArgumentParser(description="Cube station × heure (memmap)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build", help="reconstruire depuis un CSV horaire")
+    b.add_argument("csv", nargs="?", default="historique_hourly.csv")
+    u = sub.add_parser("update", help="ajouter les heures du stockage horaire (data/hourly)")
+    u.add_argument("--rebuild", action="store_true", help="repartir d'un cube vide")
+    args = ap.parse_args()
+
+    source = None
+    if args.cmd == "build":
+        df = schemas.read_hourly(args.csv)
+        if df.empty:  # avant d'effacer le cube existant
+            raise ValueError(f"❌ CSV horaire vide : {args.csv}")
+        clear()
+    else:
+        import history_store
+        import hourly_store
+
+        source = hourly_store.store_created()
+        start = None
+        if os.path.exists(os.path.join(CUBE_DIR, "meta.json")) and not args.rebuild:
+            cube = Cube()
+            if cube.source != source:
+                print("ℹ️ Stockage horaire reconstruit depuis la dernière mise à jour → cube reconstruit")
+                args.rebuild = True
+            else:
+                start = cube.hours[-1] if cube.n_hours else None  # l'heure ouverte est réécrite
+        if args.rebuild:
+            clear()
+        df = hourly_store.read_hourly(start)
+        # dimension complète : les stations retirées depuis gardent leur code
+        codes = history_store.load_stations().drop_duplicates("station_id", keep="last")
+        df = df.merge(codes[["station_id", "stationcode"]], on="station_id", how="left")
+    n_hours, n_st = append(df, source=source)
+    print(f"✅ Cube : {n_st} stations × {n_hours} heures → {CUBE_DIR}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Couche de service du dashboard : artefacts précalculés et versionnés.
+
+    outputs/dashboard/CURRENT           ← version publiée (contenu : "v20250824T1400Z-1a2b3c4d")
+    outputs/dashboard/<version>/
+        stations.parquet                ← résumé par station (empty_pct, coordonnées, arrdt)
+        arrondissements.parquet         ← saturation par arrondissement
+        heures.parquet                  ← courbe horaire (heures de pointe)
+
+`publish()` écrit une nouvelle version complète puis bascule `CURRENT`
+atomiquement ; l'app ne lit que ces petits fichiers, une fois par version
+et par processus (cache partagé entre sessions, voir app_final.py).
+
+Usage (après prepare_data.py et compute_kpis.py) :
+    python dashboard_artifacts.py
+"""
+import glob
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+
+from hourly_store import HOURLY_PARQUET, query_hourly
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
+DASHBOARD_DIR = os.path.join(OUTPUT_DIR, "dashboard")
+KEEP_VERSIONS = 3  # versions conservées (sessions encore ouvertes sur l'ancienne)
+
+def _inputs():
+    return [HOURLY_PARQUET,
+            os.path.join(OUTPUT_DIR, "kpi_heures_de_pointe.csv"),
+            os.path.join(OUTPUT_DIR, "kpi_saturation_arrondissement.csv")]
+
+def input_hash():
+    """Empreinte du contenu des entrées → version identique si rien n'a changé."""
+    h = hashlib.sha256()
+    for path in _inputs():
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:8]
+
+def build():
+    """Calculer les artefacts (une seule lecture projetée du Parquet)."""
+    df = query_hourly(columns=["stationcode", "name", "lat", "lon", "arrdt", "bikes_mean"])
+    df["empty_pct"] = (df["bikes_mean"] == 0) * 100
+    stations = (df.groupby(["stationcode", "name", "lat", "lon", "arrdt"], observed=True)
+                  .agg({"empty_pct": "mean"}).reset_index())
+    heures = pd.read_csv(os.path.join(OUTPUT_DIR, "kpi_heures_de_pointe.csv"))
+    arrdts = pd.read_csv(os.path.join(OUTPUT_DIR, "kpi_saturation_arrondissement.csv"))
+    return {"stations": stations, "arrondissements": arrdts, "heures": heures}
+
+def current_version(root=DASHBOARD_DIR):
+    """Version publiée (None si rien n'a encore été publié)."""
+    path = os.path.join(root, "CURRENT")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+def publish(root=DASHBOARD_DIR):
+    """Écrire une nouvelle version (si les entrées ont changé) → version courante."""
+    digest = input_hash()
+    cur = current_version(root)
+    if cur and cur.endswith(digest):
+        return cur
+
+    version = f"v{pd.Timestamp.now(tz='UTC'):%Y%m%dT%H%M%SZ}-{digest}"
+    tmp = os.path.join(root, f".{version}.tmp")
+    for stale in glob.glob(os.path.join(root, ".v*.tmp")):  # restes d'une construction interrompue
+        shutil.rmtree(stale, ignore_errors=True)
+    os.makedirs(tmp)
+    try:
+        for name, df in build().items():
+            df.to_parquet(os.path.join(tmp, f"{name}.parquet"), index=False)
+        os.replace(tmp, os.path.join(root, version))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)  # échec : pas de dossier à moitié écrit
+
+    with open(os.path.join(root, "CURRENT.tmp"), "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(os.path.join(root, "CURRENT.tmp"), os.path.join(root, "CURRENT"))
+
+    versions = sorted(d for d in os.listdir(root) if d.startswith("v"))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+def load(version, root=DASHBOARD_DIR):
+    """Charger les artefacts d'une version → dict de DataFrames."""
+    base = os.path.join(root, version)
+    return {name: pd.read_parquet(os.path.join(base, f"{name}.parquet"))
+            for name in ["stations", "arrondissements", "heures"]}
+
+def main():
+    version = publish()
+    arts = load(version)
+    print(f"✅ Artefacts dashboard publiés : {version} | stations: {len(arts['stations'])} "
+          f"| arrondissements: {len(arts['arrondissements'])} → {DASHBOARD_DIR}")
+
+if __name__ == "__main__":
+    main()
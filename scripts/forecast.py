@@ -0,0 +1,224 @@
+"""Prévision court terme (1–3 h) des vélos disponibles, toutes stations d'un coup.
+
+Modèle par station = profil saisonnier heure-de-semaine + correction AR(p)
+sur le résidu, ajusté en lot sur la matrice heure × station (aucun modèle
+par station dans une boucle Python) :
+
+- profil : moyenne des vélos par (jour, heure) locale, par station — une
+  réduction `np.add.at` sur les 168 créneaux de la semaine
+- AR(p) : équations normales de toutes les stations empilées
+  (`einsum` → S systèmes p × p, `np.linalg.solve` en lot, ridge λ)
+- prévision : récurrence AR sur h pas, vectorisée sur les stations (et sur les
+  origines en backtest), puis profil + résidu, borné à ≥ 0
+
+Source : le cube station × heure (`data/cube`) s'il existe, sinon un CSV
+horaire (`historique_hourly.csv`).
+
+Usage :
+    python scripts/forecast.py predict --horizon 3                 # → outputs/forecast_velib.csv
+    python scripts/forecast.py predict --stations 16107 4016 --csv historique_hourly.csv
+    python scripts/forecast.py backtest --test-hours 168
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import schemas
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUT_CSV = os.path.join(BASE_DIR, "outputs", "forecast_velib.csv")
+METRIC = "bikes_mean"
+TZ = "Europe/Paris"
+WEEK_HOURS = 168
+
+def hour_of_week(hours):
+    """Créneau 0..167 (lundi 0 h → dimanche 23 h, heure locale) de chaque heure."""
+    local = pd.DatetimeIndex(hours).tz_convert(TZ)
+    return (local.dayofweek * 24 + local.hour).to_numpy()
+
+def load_matrix(csv=None, metric=METRIC):
+    """(Y heures × stations, heures UTC, stationcodes) depuis le cube ou un CSV horaire."""
+    if csv is None:
+        from cube import CUBE_DIR, Cube
+
+        if not os.path.exists(os.path.join(CUBE_DIR, "meta.json")):
+            raise FileNotFoundError("❌ Cube absent : lance `python scripts/cube.py build` ou passe --csv.")
+        cube = Cube()
+        return np.asarray(cube[metric], dtype=np.float32), pd.DatetimeIndex(cube.hours).tz_convert("UTC"), list(cube.stations)
+
+    df = schemas.read_hourly(csv, columns=["stationcode", "ts_hour", metric])
+    codes, stations = pd.factorize(df["stationcode"], sort=True)
+    t0 = df["ts_hour"].min()
+    h = ((df["ts_hour"] - t0) // pd.Timedelta(hours=1)).to_numpy()
+    Y = np.full((h.max() + 1, len(stations)), np.nan, dtype=np.float32)
+    Y[h, codes] = df[metric].to_numpy(dtype=np.float32)
+    return Y, pd.date_range(t0, periods=len(Y), freq="h"), list(stations)
+
+def _lags(R, p):
+    """Fenêtres de p valeurs consécutives (n - p + 1, S, p), la plus récente en dernier."""
+    return sliding_window_view(R, p, axis=0)
+
+class SeasonalAR:
+    """Profil heure-de-semaine + AR(p) sur le résidu, une colonne par station."""
+
+    def __init__(self, p=3, ridge=1.0, fit_hours=8 * WEEK_HOURS):
+        self.p = p
+        self.ridge = ridge
+        self.fit_hours = fit_hours
+
+    def fit(self, Y, hours, stations):
+        """Ajuster sur les `fit_hours` dernières heures de Y (NaN = pas de mesure)."""
+        Y = np.asarray(Y, dtype=np.float32)[-self.fit_hours:]
+        if len(Y) <= self.p + 1:
+            raise ValueError(f"Historique trop court ({len(Y)} h) pour un AR({self.p}).")
+        hours = pd.DatetimeIndex(hours)[-len(Y):]
+        self.stations = list(stations)
+        self.station_index = {c: i for i, c in enumerate(self.stations)}
+        how = hour_of_week(hours)
+        ok = np.isfinite(Y)
+
+        # profil : moyenne par créneau ; créneau jamais vu → moyenne de la station
+        sums = np.zeros((WEEK_HOURS, Y.shape[1]), dtype=np.float64)
+        counts = np.zeros((WEEK_HOURS, Y.shape[1]), dtype=np.float64)
+        np.add.at(sums, how, np.where(ok, Y, 0.0))
+        np.add.at(counts, how, ok)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            station_mean = sums.sum(axis=0) / counts.sum(axis=0)
+            self.profile = np.where(counts > 0, sums / counts, station_mean).astype(np.float32)
+        self.profile = np.nan_to_num(self.profile, nan=0.0)
+
+        # AR(p) sur le résidu : S systèmes (XᵀX + λI) φ = Xᵀy résolus en lot
+        R = Y - self.profile[how]
+        X = _lags(R[:-1], self.p)               # (T - p, S, p)
+        y = R[self.p:]                           # (T - p, S)
+        m = np.isfinite(y) & np.isfinite(X).all(axis=2)
+        X = np.where(m[..., None], X, 0.0)
+        y = np.where(m, y, 0.0)
+        xtx = np.einsum("tsi,tsj->sij", X, X, dtype=np.float64) + self.ridge * np.eye(self.p)
+        xty = np.einsum("tsi,ts->si", X, y, dtype=np.float64)
+        self.phi = np.linalg.solve(xtx, xty[..., None])[..., 0].astype(np.float32)  # (S, p)
+
+        self.Y = Y
+        self.hours = hours
+        self.residuals = R
+        return self
+
+    def _roll(self, lags, horizon, phi):
+        """Récurrence AR : lags (..., S, p) → résidus prévus (..., S, horizon)."""
+        lags = np.nan_to_num(lags, nan=0.0)  # résidu inconnu → profil seul
+        out = np.empty(lags.shape[:-1] + (horizon,), dtype=np.float32)
+        for k in range(horizon):
+            r = (lags * phi).sum(axis=-1)
+            out[..., k] = r
+            lags = np.concatenate([lags[..., 1:], r[..., None]], axis=-1)
+        return out
+
+    def forecast_from(self, R, origin_hours, horizon, cols=slice(None)):
+        """Prévisions (origines, S, horizon) à partir des résidus observés `R`.
+
+        `R` : résidus (heures × stations), `origin_hours` : heure de chaque
+        origine ; la fenêtre de lags se termine à l'origine incluse.
+        """
+        lags = _lags(R, self.p)                  # origine = dernière heure de la fenêtre
+        res = self._roll(lags, horizon, self.phi[cols])
+        steps = pd.DatetimeIndex(origin_hours)
+        how = np.stack([hour_of_week(steps + pd.Timedelta(hours=k + 1)) for k in range(horizon)], axis=1)
+        base = self.profile[:, cols][how]        # (origines, horizon, S)
+        return np.clip(base.transpose(0, 2, 1) + res, 0.0, None)
+
+    def predict(self, stations=None, horizon=3):
+        """Prévision pour les h prochaines heures après la dernière heure connue.
+
+        `stations` : stationcodes (défaut : toutes). Retourne un DataFrame
+        (stationcode, ts_hour, horizon, bikes_pred).
+        """
+        codes = self.stations if stations is None else [str(c) for c in stations]
+        cols = np.array([self.station_index[c] for c in codes], dtype=np.int64)
+        R = self.residuals[-self.p:, cols]
+        origin = self.hours[-1]
+        pred = self.forecast_from(R, [origin], horizon, cols)[0]   # (S, horizon)
+        return pd.DataFrame({
+            "stationcode": np.repeat(np.asarray(codes, dtype=object), horizon),
+            "ts_hour": np.tile(origin + pd.to_timedelta(np.arange(1, horizon + 1), unit="h"), len(codes)),
+            "horizon": np.tile(np.arange(1, horizon + 1), len(codes)),
+            "bikes_pred": pred.ravel().round(2),
+        })
+
+def backtest(Y, hours, stations, test_hours=WEEK_HOURS, horizon=3, p=3, ridge=1.0, fit_hours=8 * WEEK_HOURS):
+    """Ajuste sur le passé, prévoit chaque heure de test (toutes origines en lot).
+
+    Retourne (tableau MAE/RMSE par horizon vs persistance et profil seul, timings).
+    """
+    Y = np.asarray(Y, dtype=np.float32)
+    n_train = len(Y) - test_hours
+    if n_train <= p + 1:
+        raise ValueError("Historique trop court pour ce backtest (réduire --test-hours).")
+    hours = pd.DatetimeIndex(hours)
+
+    t0 = time.perf_counter()
+    model = SeasonalAR(p, ridge, fit_hours).fit(Y[:n_train], hours[:n_train], stations)
+    fit_s = time.perf_counter() - t0
+
+    # origines : de la dernière heure d'entraînement à l'avant-dernière heure de test
+    how_all = hour_of_week(hours)
+    R = Y - model.profile[how_all]
+    origins = np.arange(n_train - 1, len(Y) - 1)
+    t0 = time.perf_counter()
+    pred = model.forecast_from(R[origins[0] - p + 1:origins[-1] + 1], hours[origins], horizon)
+    predict_s = time.perf_counter() - t0
+
+    rows = []
+    for k in range(horizon):
+        tgt = origins + k + 1
+        keep = tgt < len(Y)
+        truth = Y[tgt[keep]]
+        candidates = {
+            "seasonal_ar": pred[keep, :, k],
+            "profil": model.profile[how_all[tgt[keep]]],
+            "persistance": Y[origins[keep]],
+        }
+        for name, est in candidates.items():
+            err = est - truth
+            ok = np.isfinite(err)
+            rows.append({"horizon": k + 1, "modele": name, "n": int(ok.sum()),
+                         "mae": float(np.abs(err[ok]).mean()), "rmse": float(np.sqrt((err[ok] ** 2).mean()))})
+    n_forecasts = pred.size
+    timings = {"fit_s": fit_s, "predict_s": predict_s, "stations": Y.shape[1],
+               "forecasts": n_forecasts, "forecasts_per_s": n_forecasts / max(predict_s, 1e-9)}
+    return pd.DataFrame(rows), timings
+
+def main():
+    ap = argparse.ArgumentParser(description="Prévision Vélib à 1–3 h (profil hebdo + AR, toutes stations)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name in ("predict", "backtest"):
+        s = sub.add_parser(name)
+        s.add_argument("--csv", default=None, help="CSV horaire (sinon le cube data/cube)")
+        s.add_argument("--horizon", type=int, default=3)
+        s.add_argument("--p", type=int, default=3, help="ordre AR")
+        s.add_argument("--ridge", type=float, default=1.0)
+        s.add_argument("--fit-hours", type=int, default=8 * WEEK_HOURS)
+    sub.choices["predict"].add_argument("--stations", nargs="*", default=None)
+    sub.choices["predict"].add_argument("--out", default=OUT_CSV)
+    sub.choices["backtest"].add_argument("--test-hours", type=int, default=WEEK_HOURS)
+    args = ap.parse_args()
+
+    Y, hours, stations = load_matrix(args.csv)
+    print(f"📊 Historique : {Y.shape[1]} stations × {Y.shape[0]} heures")
+    if args.cmd == "predict":
+        model = SeasonalAR(args.p, args.ridge, args.fit_hours).fit(Y, hours, stations)
+        out = model.predict(args.stations, args.horizon)
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        out.to_csv(args.out, index=False, encoding="utf-8-sig")
+        print(f"✅ Écrit : {args.out} | {len(out)} prévisions (origine {hours[-1]})")
+    else:
+        scores, t = backtest(Y, hours, stations, args.test_hours, args.horizon, args.p, args.ridge, args.fit_hours)
+        print(scores.pivot(index="modele", columns="horizon", values="mae").round(3).to_string())
+        print(f"⏱️ fit {t['fit_s'] * 1e3:.0f} ms | predict {t['predict_s'] * 1e3:.0f} ms "
+              f"({t['forecasts']} prévisions, {t['forecasts_per_s']:,.0f}/s)")
+
+if __name__ == "__main__":
+    main()
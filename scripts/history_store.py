@@ -0,0 +1,357 @@
+"""Stockage de l'historique brut : Parquet partitionné par jour.
+
+Remplace l'ancien `historique_velib.csv` (append CSV relu en entier) :
+
+    data/history/stations.parquet                        ← dimension stations
+    data/history/date=2025-08-24/20250824T133850Z.parquet ← faits (statuts)
+
+- dimension `stations` à évolution lente, clé `stationcode` → `station_id`
+  (entier stable) ; un renommage ou un déplacement ferme la version courante
+  (`valid_to`) et en ouvre une nouvelle (`valid_from`)
+- faits compacts : (ts, station_id, bikes, docks, mechanical, ebikes)
+- un fichier par snapshot, écrit de façon atomique (fichier temporaire + rename) ;
+  le collecteur résident écrit des keyframes complètes (`<ts>.parquet`) et,
+  entre deux, des deltas ne contenant que les stations modifiées
+  (`<ts>.delta.parquet`) — la lecture reconstitue l'état complet à chaque ts ;
+  une station disparue de l'API est notée dans le delta par une ligne
+  « pierre tombale » (`bikes = TOMBSTONE`) et retirée de l'état rejoué
+- colonnes typées (int16 vélos/bornes, float32 coordonnées, ts timestamp UTC)
+- lecture : seules les partitions (et snapshots) de la plage demandée sont lues
+- les attributs des stations ne sont joints qu'à la présentation
+  (`attach_stations`)
+
+Migration unique depuis le CSV :
+    python history_store.py migrate historique_velib.csv
+"""
+import argparse
+import glob
+import os
+
+import pandas as pd
+
+import schemas
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_DIR = os.path.join(BASE_DIR, "data", "history")
+
+STATIONS_FILE = "stations.parquet"
+TS_FMT = "%Y%m%dT%H%M%SZ"  # nom de fichier d'un snapshot
+FULL_SUFFIX = ".parquet"
+DELTA_SUFFIX = ".delta.parquet"
+TS_DTYPE = "datetime64[us, UTC]"
+
+# Attributs « lents » d'une station (dimension)
+STATION_ATTRS = ["name", "arrdt", "lat", "lon"]
+STATION_DTYPES = {
+    "station_id": "int16",
+    "stationcode": "string",
+    "name": "string",
+    "arrdt": "string",
+    "lat": "float32",
+    "lon": "float32",
+}
+STATION_COLUMNS = list(STATION_DTYPES) + ["valid_from", "valid_to"]
+
+# Statuts (faits) : une ligne par station et par snapshot
+DTYPES = {
+    "station_id": "int16",
+    "bikes": "int16",
+    "docks": "int16",
+    "mechanical": "Int16",  # optionnels (absents des vieux snapshots)
+    "ebikes": "Int16",
+}
+COLUMNS = ["ts"] + list(DTYPES)
+TOMBSTONE = -1  # valeur de `bikes` d'une station retirée (deltas uniquement)
+
+def _utc(t):
+    """Convertir str/datetime en Timestamp UTC (None reste None)."""
+    if t is None:
+        return None
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+def normalize(df):
+    """Appliquer le schéma typé des faits (station_id déjà résolu)."""
+    df = df.copy()
+    for col in COLUMNS:
+        if col not in df.columns:
+            df[col] = pd.NA
+    df["ts"] = pd.to_datetime(df["ts"], utc=True)
+    df["bikes"] = df["bikes"].fillna(0)
+    df["docks"] = df["docks"].fillna(0)
+    return df[COLUMNS].astype(DTYPES)
+
+def _empty_stations():
+    df = pd.DataFrame({c: pd.Series(dtype=t) for c, t in STATION_DTYPES.items()})
+    df["valid_from"] = pd.Series(dtype=TS_DTYPE)
+    df["valid_to"] = pd.Series(dtype=TS_DTYPE)
+    return df
+
+def load_stations(root=HISTORY_DIR):
+    """Dimension complète (toutes versions ; `valid_to` vide = version courante)."""
+    path = os.path.join(root, STATIONS_FILE)
+    if not os.path.exists(path):
+        return _empty_stations()
+    return pd.read_parquet(path)
+
+def current_stations(root=HISTORY_DIR, as_of=None):
+    """Une ligne par station : version courante, ou valide à `as_of`."""
+    dim = load_stations(root)
+    if as_of is None:
+        cur = dim[dim["valid_to"].isna()]
+    else:
+        t = _utc(as_of)
+        cur = dim[(dim["valid_from"] <= t) & (dim["valid_to"].isna() | (dim["valid_to"] > t))]
+    return cur.sort_values("station_id").reset_index(drop=True)
+
+def _atomic_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)  # rename atomique : jamais de fichier à moitié écrit
+
+def upsert_stations(df, ts, root=HISTORY_DIR):
+    """Mettre à jour la dimension avec les stations d'un snapshot.
+
+    Nouvelle station → nouvel id ; nom/arrondissement/coordonnées modifiés →
+    la version courante est fermée à `ts` et une nouvelle version est ouverte.
+    Retourne le mapping stationcode → station_id.
+    """
+    ts = _utc(ts)
+    dim = load_stations(root)
+    snap = (df[["stationcode"] + STATION_ATTRS].drop_duplicates("stationcode")
+            .astype({k: STATION_DTYPES[k] for k in ["stationcode"] + STATION_ATTRS}))
+
+    cur = dim[dim["valid_to"].isna()]
+    ids = dict(zip(dim["stationcode"], dim["station_id"]))  # id stable par stationcode
+
+    m = snap.merge(cur, on="stationcode", how="left", suffixes=("", "_cur"))
+    is_new = m["station_id"].isna()
+    same = [(m[c] == m[f"{c}_cur"]).fillna(False) | (m[c].isna() & m[f"{c}_cur"].isna())
+            for c in STATION_ATTRS]
+    changed = ~is_new & ~pd.concat(same, axis=1).all(axis=1)
+
+    if not (is_new.any() or changed.any()):
+        return ids
+
+    next_id = int(dim["station_id"].max()) + 1 if len(dim) else 0
+    for code in m.loc[is_new, "stationcode"]:
+        if code not in ids:
+            ids[code] = next_id
+            next_id += 1
+
+    # fermer les versions remplacées
+    closing = set(m.loc[changed, "stationcode"])
+    dim.loc[dim["valid_to"].isna() & dim["stationcode"].isin(closing), "valid_to"] = ts
+
+    new = m.loc[is_new | changed, ["stationcode"] + STATION_ATTRS].copy()
+    new["station_id"] = new["stationcode"].map(ids)
+    new["valid_from"] = pd.Series(ts, index=new.index).astype(TS_DTYPE)
+    new["valid_to"] = pd.Series(pd.NaT, index=new.index, dtype=TS_DTYPE)
+    new = new[STATION_COLUMNS].astype(STATION_DTYPES)
+    dim = pd.concat([dim, new], ignore_index=True) if len(dim) else new
+    _atomic_parquet(dim[STATION_COLUMNS], os.path.join(root, STATIONS_FILE))
+    return ids
+
+def close_stations(codes, ts, root=HISTORY_DIR):
+    """Fermer (`valid_to = ts`) la version courante des stations retirées → {stationcode: station_id}."""
+    ts = _utc(ts)
+    dim = load_stations(root)
+    hit = dim["valid_to"].isna() & dim["stationcode"].isin(list(codes))
+    if hit.any():
+        dim.loc[hit, "valid_to"] = ts
+        _atomic_parquet(dim[STATION_COLUMNS], os.path.join(root, STATIONS_FILE))
+    return dict(zip(dim.loc[hit, "stationcode"], dim.loc[hit, "station_id"]))
+
+def attach_stations(df, root=HISTORY_DIR, on="ts"):
+    """Joindre (présentation) les attributs valides à chaque ligne `station_id`/`on`."""
+    dim = load_stations(root)
+    if df.empty:
+        out = df.copy()
+        for c in ["stationcode"] + STATION_ATTRS:
+            out[c] = pd.Series(dtype=STATION_DTYPES[c])
+        return out
+    left = df.reset_index(drop=True)
+    left["_row"] = range(len(left))
+    left[on] = pd.to_datetime(left[on], utc=True).astype(dim["valid_from"].dtype)
+    out = pd.merge_asof(
+        left.sort_values(on), dim.sort_values("valid_from")[["station_id", "valid_from", "stationcode"] + STATION_ATTRS],
+        left_on=on, right_on="valid_from", by="station_id", direction="backward",
+    )
+    # ligne antérieure à la 1re version connue → on prend la plus ancienne
+    first = dim.sort_values("valid_from").drop_duplicates("station_id").set_index("station_id")
+    miss = out["stationcode"].isna()
+    for c in ["stationcode"] + STATION_ATTRS:
+        out.loc[miss, c] = out.loc[miss, "station_id"].map(first[c])
+    return out.sort_values("_row").drop(columns=["_row", "valid_from"]).reset_index(drop=True)
+
+def snapshot_path(ts, root=HISTORY_DIR, delta=False):
+    """Chemin du fichier d'un snapshot (partition = date UTC)."""
+    ts = _utc(ts)
+    suffix = DELTA_SUFFIX if delta else FULL_SUFFIX
+    return os.path.join(root, f"date={ts:%Y-%m-%d}", f"{ts.strftime(TS_FMT)}{suffix}")
+
+def parse_snapshot_name(path):
+    """Nom de fichier → (ts, est_un_delta)."""
+    name = os.path.basename(path)
+    delta = name.endswith(DELTA_SUFFIX)
+    stem = name[:-len(DELTA_SUFFIX if delta else FULL_SUFFIX)]
+    return pd.Timestamp(pd.to_datetime(stem, format=TS_FMT), tz="UTC"), delta
+
+def write_snapshot(df, root=HISTORY_DIR, ts=None, delta=False, removed=()):
+    """Écrire un snapshot (lignes `to_rows`, un seul `ts`) → chemin écrit.
+
+    La dimension stations est mise à jour d'abord, puis seuls les statuts
+    (avec `station_id`) sont écrits dans la partition du jour. Avec
+    `delta=True`, `df` ne contient que les stations modifiées depuis le
+    snapshot précédent (éventuellement aucune : le fichier marque le tick).
+    `removed` : stationcodes disparus depuis le snapshot précédent — version
+    fermée dans la dimension et, dans un delta, pierre tombale.
+    """
+    ts = _utc(ts if ts is not None else df["ts"].iloc[0])
+    ids = upsert_stations(df, ts, root) if len(df) else {}
+    facts = df.assign(ts=ts, station_id=df["stationcode"].astype("string").map(ids))
+    gone = close_stations(removed, ts, root) if len(removed) else {}
+    if delta and gone:
+        tomb = pd.DataFrame({"ts": ts, "station_id": list(gone.values()), "bikes": TOMBSTONE})
+        facts = pd.concat([facts, tomb], ignore_index=True) if len(facts) else tomb
+    facts = normalize(facts)
+    path = snapshot_path(ts, root, delta)
+    _atomic_parquet(facts, path)
+    return path
+
+def _partitions(root):
+    for part in sorted(glob.glob(os.path.join(root, "date=*"))):
+        yield pd.Timestamp(os.path.basename(part)[len("date="):], tz="UTC"), part
+
+def list_snapshots(start=None, end=None, root=HISTORY_DIR):
+    """Fichiers de snapshots (keyframes et deltas) dont le ts est dans [start, end], triés."""
+    start, end = _utc(start), _utc(end)
+    files = []
+    for day, part in _partitions(root):
+        if start is not None and day < start.floor("D"):
+            continue
+        if end is not None and day > end:
+            continue
+        found = [(parse_snapshot_name(p)[0], p) for p in glob.glob(os.path.join(part, "*.parquet"))]
+        for ts, path in sorted(found):
+            if (start is None or ts >= start) and (end is None or ts <= end):
+                files.append(path)
+    return files
+
+def chain_to(t, root=HISTORY_DIR, inclusive=True):
+    """Dernière keyframe ≤ t puis les deltas qui la suivent jusqu'à t (ordre chronologique)."""
+    t = _utc(t)
+    chain = []
+    for day, part in reversed(list(_partitions(root))):
+        if day > t:
+            continue
+        found = sorted(((*parse_snapshot_name(p), p) for p in glob.glob(os.path.join(part, "*.parquet"))),
+                       reverse=True)
+        for ts, delta, path in found:
+            if ts > t or (ts == t and not inclusive):
+                continue
+            chain.append(path)
+            if not delta:
+                return chain[::-1]
+    return chain[::-1]
+
+def _iter_expand(files, columns, start=None):
+    """Rejouer keyframes + deltas → un état complet par snapshot (ts ≥ start), un à la fois."""
+    values = [c for c in COLUMNS if c not in ("ts", "station_id")]
+    state = pd.DataFrame(columns=values).astype({c: DTYPES[c] for c in values})
+    state.index = pd.Index([], dtype="int16", name="station_id")
+    for path in files:
+        ts, delta = parse_snapshot_name(path)
+        snap = pd.read_parquet(path).set_index("station_id")[values]
+        if delta:
+            alive = snap[snap["bikes"] != TOMBSTONE]
+            state = pd.concat([state.drop(snap.index, errors="ignore"), alive]).sort_index()
+        else:
+            state = snap
+        if start is None or ts >= start:
+            yield state.reset_index().assign(ts=ts)[columns]
+
+def _expand(files, columns, start=None):
+    """Rejouer keyframes + deltas → un état complet par snapshot (ts ≥ start)."""
+    out = list(_iter_expand(files, columns, start))
+    if not out:
+        return normalize(pd.DataFrame(columns=COLUMNS))[columns]
+    return pd.concat(out, ignore_index=True)
+
+def read_history(start=None, end=None, columns=None, root=HISTORY_DIR):
+    """Charger les statuts sur [start, end] (bornes incluses, UTC).
+
+    Retourne les faits (ts, station_id, ...) — un état complet par snapshot,
+    même quand le stockage ne contient que des deltas ; voir
+    `attach_stations` pour les noms/arrondissements/coordonnées.
+    """
+    files = list_snapshots(start, end, root)
+    cols = COLUMNS if columns is None else list(dict.fromkeys(["ts"] + list(columns)))
+    if not files:
+        return normalize(pd.DataFrame(columns=COLUMNS))[cols]
+    if not any(p.endswith(DELTA_SUFFIX) for p in files):
+        return pd.concat([pd.read_parquet(p, columns=cols) for p in files], ignore_index=True)
+
+    # deltas présents : partir de la keyframe qui précède la plage
+    if parse_snapshot_name(files[0])[1]:
+        files = chain_to(parse_snapshot_name(files[0])[0], root, inclusive=False) + files
+    return _expand(files, cols, _utc(start))
+
+def iter_history(start=None, end=None, columns=None, root=HISTORY_DIR, chunk_snapshots=60):
+    """Comme `read_history`, mais par blocs d'au plus `chunk_snapshots` snapshots.
+
+    Les blocs arrivent dans l'ordre chronologique ; avec des deltas, l'état
+    rejoué est porté d'un bloc au suivant. La mémoire est bornée par la
+    taille d'un bloc, quelle que soit la longueur de l'historique.
+    """
+    files = list_snapshots(start, end, root)
+    cols = COLUMNS if columns is None else list(dict.fromkeys(["ts"] + list(columns)))
+    if not any(p.endswith(DELTA_SUFFIX) for p in files):
+        for i in range(0, len(files), chunk_snapshots):
+            yield pd.concat([pd.read_parquet(p, columns=cols) for p in files[i:i + chunk_snapshots]],
+                            ignore_index=True)
+        return
+    if parse_snapshot_name(files[0])[1]:
+        files = chain_to(parse_snapshot_name(files[0])[0], root, inclusive=False) + files
+    block = []
+    for snap in _iter_expand(files, cols, _utc(start)):
+        block.append(snap)
+        if len(block) == chunk_snapshots:
+            yield pd.concat(block, ignore_index=True)
+            block = []
+    if block:
+        yield pd.concat(block, ignore_index=True)
+
+def state_at(t, root=HISTORY_DIR):
+    """État complet de toutes les stations au dernier snapshot ≤ t."""
+    chain = chain_to(t, root)
+    if not chain:
+        return normalize(pd.DataFrame(columns=COLUMNS))
+    return _expand(chain, COLUMNS, start=parse_snapshot_name(chain[-1])[0])
+
+def migrate_csv(csv_path, root=HISTORY_DIR):
+    """Migration unique : éclater l'ancien CSV en un fichier par snapshot."""
+    df = schemas.read_raw(csv_path)
+    df = df.dropna(subset=["lat", "lon"])
+    n = 0
+    for _, snap in df.groupby("ts", sort=True):
+        write_snapshot(snap, root)
+        n += 1
+    return n, len(df)
+
+def main():
+    ap = argparse.ArgumentParser(description="Stockage Parquet de l'historique Vélib")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    mig = sub.add_parser("migrate", help="importer un historique_velib.csv existant")
+    mig.add_argument("csv", nargs="?", default="historique_velib.csv")
+    args = ap.parse_args()
+
+    if args.cmd == "migrate":
+        if not os.path.exists(args.csv):
+            raise FileNotFoundError(f"❌ Introuvable : {args.csv}")
+        n_snap, n_rows = migrate_csv(args.csv)
+        print(f"✅ Migration : {n_rows} lignes | {n_snap} snapshots → {HISTORY_DIR}")
+
+if __name__ == "__main__":
+    main()
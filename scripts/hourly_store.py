@@ -0,0 +1,288 @@
+"""Stockage des agrégats horaires : Parquet partitionné par jour, avec upsert.
+
+    data/hourly/date=2025-08-24/part.parquet   ← (station_id, ts_hour, bikes_mean, ...)
+    data/hourly/_watermark.json                ← dernière heure entièrement close
+                                                 (+ nb de snapshots qu'elle couvre,
+                                                 repère de fin du CSV consolidé)
+
+Le mode incrémental de `aggregate_hourly.py` ne relit que les snapshots
+postérieurs au watermark et ne réécrit que les partitions des jours touchés ;
+si le nombre de snapshots antérieurs au watermark a changé (backfill), le
+stockage est vidé (`reset`) et reconstruit.
+
+Le Parquet consolidé `data/historique_hourly.parquet` (écrit par
+`prepare_data.py`, types de `schemas.HOURLY`) est trié par (ts_hour,
+stationcode), découpé en row groups d'environ une journée, avec statistiques
+de colonnes et stationcode/arrdt/name encodés en dictionnaire. `query_hourly`
+y pousse plage horaire, arrondissements et projection de colonnes ; seule la
+plage horaire élague des row groups (au jour près). Le filtre d'arrondissement
+est appliqué après décodage : pyarrow n'exploite pas les statistiques d'une
+colonne lue en dictionnaire. Un tri par arrdt dans chaque jour, avec des row
+groups plus petits, n'aide pas : lectures complètes et par plage horaire
+3 à 4 fois plus lentes pour un gain modeste sur le filtre d'arrondissement.
+
+Historique plus grand que la RAM : `HourlyAccumulator` agrège des blocs de
+snapshots arrivant dans l'ordre chronologique en ne gardant que les lignes
+brutes de l'heure encore ouverte (médiane exacte), et `HourlyParquetWriter`
+écrit le Parquet consolidé row group par row group.
+"""
+import glob
+import json
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import schemas
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOURLY_DIR = os.path.join(BASE_DIR, "data", "hourly")
+WATERMARK_FILE = "_watermark.json"
+HOURLY_PARQUET = os.path.join(BASE_DIR, "data", "historique_hourly.parquet")
+ROW_GROUP_SIZE = 24 * 1500  # ≈ une journée de toutes les stations par row group
+
+KEYS = ["station_id", "ts_hour"]
+VALUES = ["bikes_mean", "bikes_median", "docks_mean"]
+# moyennes en float64 : le CSV réécrit depuis le stockage garde les valeurs du mode complet
+DTYPES = {"station_id": "int16", "bikes_mean": "float64",
+          "bikes_median": "float64", "docks_mean": "float64"}
+STORE_VERSION = 2  # 2 : valeurs en float64 (les partitions float32 sont reconstruites)
+
+def _utc(t):
+    if t is None:
+        return None
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+def aggregate_snapshots(df):
+    """Agréger des snapshots bruts (ts, station_id, bikes, docks) par (station_id, heure)."""
+    df = df.assign(ts_hour=df["ts"].dt.floor("h"))
+    return (
+        df.groupby(["station_id", "ts_hour"], as_index=False)
+          .agg(
+              bikes_mean=("bikes", "mean"),
+              bikes_median=("bikes", "median"),
+              docks_mean=("docks", "mean"),
+          )
+    )
+
+class HourlyAccumulator:
+    """Agrégation horaire en flux de blocs (ts, station_id, bikes, docks) triés par temps.
+
+    Une heure est close dès qu'un bloc contient un snapshot d'une heure
+    postérieure : seules les lignes brutes de l'heure ouverte passent d'un
+    bloc au suivant — médiane exacte, mémoire bornée à un bloc + une heure.
+    """
+
+    def __init__(self):
+        self.pending = None
+        self.open_hour = None  # toutes les heures antérieures ont été émises
+
+    def add(self, chunk):
+        """Ajouter un bloc → agrégats des heures désormais closes (éventuellement vide)."""
+        if self.open_hour is not None and len(chunk) and chunk["ts"].min() < self.open_hour:
+            raise ValueError("Snapshots hors ordre chronologique : une heure déjà émise est revenue.")
+        rows = chunk if self.pending is None else pd.concat([self.pending, chunk], ignore_index=True)
+        if rows.empty:
+            return aggregate_snapshots(rows)
+        self.open_hour = rows["ts"].max().floor("h")
+        closed = (rows["ts"] < self.open_hour).to_numpy()
+        self.pending = rows[~closed]
+        return aggregate_snapshots(rows[closed])
+
+    def close(self):
+        """Fin du flux : émettre l'heure encore ouverte."""
+        rows, self.pending = self.pending, None
+        if rows is None:
+            rows = pd.DataFrame({"ts": pd.Series(dtype="datetime64[us, UTC]"), "station_id": pd.Series(dtype="int16"),
+                                 "bikes": pd.Series(dtype="int16"), "docks": pd.Series(dtype="int16")})
+        return aggregate_snapshots(rows)
+
+def _watermark_info(root=HOURLY_DIR):
+    path = os.path.join(root, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def load_watermark(root=HOURLY_DIR):
+    """Dernière heure close déjà agrégée (None si jamais lancé)."""
+    info = _watermark_info(root)
+    return None if info is None else _utc(info["last_closed_hour"])
+
+def store_version(root=HOURLY_DIR):
+    """Version du format des partitions (1 si le watermark ne la précise pas, None sans watermark)."""
+    info = _watermark_info(root)
+    return None if info is None else info.get("version", 1)
+
+def covered_snapshots(root=HOURLY_DIR):
+    """Nombre de snapshots d'historique couverts par le watermark (None si inconnu)."""
+    info = _watermark_info(root)
+    return None if info is None else info.get("n_snapshots")
+
+def csv_mark(root=HOURLY_DIR):
+    """Repère du CSV consolidé écrit avec ce watermark (voir `aggregate_hourly.write_from_store`)."""
+    info = _watermark_info(root)
+    return None if info is None else info.get("csv")
+
+def store_created(root=HOURLY_DIR):
+    """Date de création du stockage (change à chaque `reset` : les copies dérivées sont à refaire)."""
+    info = _watermark_info(root)
+    return None if info is None else info.get("created")
+
+def save_watermark(hour, root=HOURLY_DIR, n_snapshots=None, csv=None):
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, WATERMARK_FILE)
+    created = (_watermark_info(root) or {}).get("created") or pd.Timestamp.now(tz="UTC").isoformat()
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": STORE_VERSION, "created": created, "last_closed_hour": _utc(hour).isoformat(),
+                   "n_snapshots": n_snapshots, "csv": csv}, f)
+    os.replace(path + ".tmp", path)
+
+def reset(root=HOURLY_DIR):
+    """Vider le stockage horaire (partitions + watermark)."""
+    for part in glob.glob(os.path.join(root, "date=*")):
+        shutil.rmtree(part)
+    path = os.path.join(root, WATERMARK_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+def partition_path(day, root=HOURLY_DIR):
+    return os.path.join(root, f"date={pd.Timestamp(day):%Y-%m-%d}", "part.parquet")
+
+def upsert(agg, root=HOURLY_DIR):
+    """Remplacer/insérer les buckets (station_id, ts_hour) de `agg`.
+
+    Seules les partitions des jours présents dans `agg` sont relues et
+    réécrites (atomiquement). Retourne le nombre de partitions touchées.
+    """
+    agg = agg[KEYS + VALUES].astype(DTYPES)
+    days = agg["ts_hour"].dt.floor("D")
+    for day, new in agg.groupby(days):
+        path = partition_path(day, root)
+        if os.path.exists(path):
+            old = pd.read_parquet(path)
+            keep = old.merge(new[KEYS], on=KEYS, how="left", indicator=True)["_merge"].eq("left_only")
+            new = pd.concat([old[keep.values], new], ignore_index=True)
+        new = new.sort_values(["ts_hour", "station_id"]).reset_index(drop=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return days.nunique()
+
+def read_hourly(start=None, end=None, root=HOURLY_DIR):
+    """Agrégats horaires sur [start, end] (seules les partitions utiles sont lues)."""
+    start, end = _utc(start), _utc(end)
+    frames = []
+    for part in sorted(glob.glob(os.path.join(root, "date=*"))):
+        day = pd.Timestamp(os.path.basename(part)[len("date="):], tz="UTC")
+        if (start is not None and day < start.floor("D")) or (end is not None and day > end):
+            continue
+        frames.append(pd.read_parquet(os.path.join(part, "part.parquet")))
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=t) for c, t in DTYPES.items()}).assign(
+            ts_hour=pd.Series(dtype="datetime64[us, UTC]"))[KEYS + VALUES]
+    df = pd.concat(frames, ignore_index=True)
+    if start is not None:
+        df = df[df["ts_hour"] >= start]
+    if end is not None:
+        df = df[df["ts_hour"] <= end]
+    return df.reset_index(drop=True)
+
+def write_hourly_parquet(df, path=HOURLY_PARQUET):
+    """Écrire le Parquet horaire consolidé, optimisé pour les lectures filtrées."""
+    df = schemas.apply_schema(df, schemas.HOURLY)
+    df = df.sort_values(["ts_hour", "stationcode"], kind="stable").reset_index(drop=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(
+        table, path + ".tmp",
+        row_group_size=ROW_GROUP_SIZE,
+        write_statistics=True,
+        use_dictionary=["stationcode", "arrdt", "name"],
+        sorting_columns=[pq.SortingColumn(table.schema.get_field_index("ts_hour")),
+                         pq.SortingColumn(table.schema.get_field_index("stationcode"))],
+    )
+    os.replace(path + ".tmp", path)
+
+class HourlyParquetWriter:
+    """Version en flux de `write_hourly_parquet`, pour des blocs arrivant par heure croissante.
+
+    Les lignes sont tamponnées jusqu'à ROW_GROUP_SIZE puis écrites triées par
+    (ts_hour, stationcode) ; la dernière heure reçue reste en tampon (un bloc
+    suivant peut la compléter), d'où le même ordre global que l'écriture en
+    une fois. Le schéma est fixé par le premier bloc ; le fichier n'apparaît
+    (atomiquement) qu'à `close()`.
+    """
+
+    def __init__(self, path=HOURLY_PARQUET, row_group_size=ROW_GROUP_SIZE):
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.buffered = 0
+        self.rows = 0
+        self.last_hour = None
+        self.writer = None
+
+    def _flush(self, final=False):
+        if not self.buffered:
+            return
+        df = pd.concat(self.buffer, ignore_index=True)
+        keep = df["ts_hour"] >= self.last_hour if not final else pd.Series(False, index=df.index)
+        self.buffer = [df[keep]] if keep.any() else []
+        self.buffered = int(keep.sum())
+        df = df[~keep]
+        if df.empty:
+            return
+        df = schemas.apply_schema(df, schemas.HOURLY)
+        df = df.sort_values(["ts_hour", "stationcode"], kind="stable").reset_index(drop=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            # index de dictionnaire int32 : les blocs suivants peuvent avoir plus de modalités
+            schema = table.schema
+            for col in ("stationcode", "arrdt", "name"):
+                i = schema.get_field_index(col)
+                schema = schema.set(i, schema.field(i).with_type(pa.dictionary(pa.int32(), pa.string())))
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.writer = pq.ParquetWriter(
+                self.path + ".tmp", schema,
+                write_statistics=True,
+                use_dictionary=["stationcode", "arrdt", "name"],
+                sorting_columns=[pq.SortingColumn(table.schema.get_field_index("ts_hour")),
+                                 pq.SortingColumn(table.schema.get_field_index("stationcode"))],
+            )
+        self.writer.write_table(table.cast(self.writer.schema), row_group_size=self.row_group_size)
+        self.rows += len(df)
+
+    def write(self, df):
+        if df.empty:
+            return
+        if self.last_hour is not None and df["ts_hour"].min() < self.last_hour:
+            raise ValueError("Blocs hors ordre chronologique : l'entrée doit être triée par ts_hour.")
+        self.last_hour = df["ts_hour"].max()
+        self.buffer.append(df)
+        self.buffered += len(df)
+        if self.buffered >= self.row_group_size:
+            self._flush()
+
+    def close(self):
+        """Vider le tampon et publier le fichier → nombre de lignes écrites."""
+        self._flush(final=True)
+        if self.writer is None:
+            raise ValueError("Aucune ligne à écrire.")
+        self.writer.close()
+        os.replace(self.path + ".tmp", self.path)
+        return self.rows
+
+def query_hourly(start=None, end=None, arrdts=None, columns=None, path=HOURLY_PARQUET):
+    """Lire le Parquet horaire : plage horaire élaguée par row group, arrondissements filtrés au décodage."""
+    filters = []
+    if start is not None:
+        filters.append(("ts_hour", ">=", _utc(start)))
+    if end is not None:
+        filters.append(("ts_hour", "<=", _utc(end)))
+    if arrdts is not None:
+        filters.append(("arrdt", "in", list(arrdts)))
+    return schemas.apply_schema(pd.read_parquet(path, columns=columns, filters=filters or None), schemas.HOURLY)
@@ -0,0 +1,225 @@
+"""Instrumentation des étapes : temps, CPU, lignes, octets, mémoire → JSONL + Prometheus.
+
+    with instrument.stage("aggregate", rows_in=len(df)) as st:
+        agg = ...
+        st.rows_out = len(agg)
+
+Chaque étape enregistre : temps mur, temps CPU (processus), lignes en
+entrée/sortie, octets lus/écrits (delta de /proc/self/io — fichiers ET
+sockets — sauf valeur fixée par l'étape), pic RSS du processus, statut.
+
+Sorties (dossier `data/metrics`, ou $VELIB_METRICS_DIR) :
+    metrics.jsonl     ← une ligne JSON par exécution d'étape (historique)
+    velib.prom        ← textfile Prometheus (dernière exécution par étape,
+                        à exposer via node_exporter --collector.textfile)
+
+Réglages par variables d'environnement (aucune modification de code) :
+    VELIB_METRICS=0               désactiver
+    VELIB_PROFILE=aggregate,kpis  profiler ces étapes (`*` = toutes)
+    VELIB_PROFILER=cprofile       cProfile → profiles/<étape>-<ts>.prof (défaut)
+    VELIB_PROFILER=sample         échantillonneur (5 ms) → piles repliées
+                                  profiles/<étape>-<ts>.folded (flamegraph.pl / speedscope)
+"""
+import cProfile
+import fcntl
+import json
+import os
+import pstats
+import resource
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METRICS_DIR = os.environ.get("VELIB_METRICS_DIR", os.path.join(BASE_DIR, "data", "metrics"))
+JSONL_FILE = "metrics.jsonl"
+PROM_FILE = "velib.prom"
+LAST_FILE = "_last.json"
+SAMPLE_INTERVAL_S = 0.005
+
+PROM_METRICS = [
+    # (nom, champ du record, type, aide)
+    ("velib_stage_wall_seconds", "wall_s", "gauge", "Temps mur de la dernière exécution"),
+    ("velib_stage_cpu_seconds", "cpu_s", "gauge", "Temps CPU (processus) de la dernière exécution"),
+    ("velib_stage_rows_in", "rows_in", "gauge", "Lignes en entrée"),
+    ("velib_stage_rows_out", "rows_out", "gauge", "Lignes en sortie"),
+    ("velib_stage_bytes_read", "bytes_read", "gauge", "Octets lus"),
+    ("velib_stage_bytes_written", "bytes_written", "gauge", "Octets écrits"),
+    ("velib_stage_peak_rss_bytes", "peak_rss_bytes", "gauge", "Pic RSS du processus à la fin de l'étape"),
+    ("velib_stage_last_run_timestamp_seconds", "end_ts", "gauge", "Fin de la dernière exécution (epoch)"),
+    ("velib_stage_success", "success", "gauge", "1 si la dernière exécution a réussi"),
+    ("velib_stage_runs_total", "runs", "counter", "Nombre d'exécutions"),
+]
+
+def enabled():
+    return os.environ.get("VELIB_METRICS", "1") != "0"
+
+def _io():
+    """(octets lus, octets écrits) du processus (Linux), sinon None."""
+    try:
+        with open("/proc/self/io", "r", encoding="ascii") as f:
+            vals = dict(line.split(": ") for line in f.read().splitlines())
+        return int(vals["rchar"]), int(vals["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux : Ko
+
+class StageRecord:
+    """Mesures d'une étape ; `rows_in`, `rows_out`, `bytes_*` modifiables par l'étape."""
+
+    def __init__(self, name, rows_in=None, **labels):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.labels = labels
+
+    def as_dict(self):
+        return {k: v for k, v in self.__dict__.items() if not k.startswith("_")}
+
+# ---------- profilage optionnel ----------
+def _profile_wanted(name):
+    wanted = os.environ.get("VELIB_PROFILE", "")
+    names = {w.strip() for w in wanted.split(",") if w.strip()}
+    return "*" in names or name in names or name.split(".")[0] in names
+
+class _Sampler:
+    """Échantillonneur de piles du thread appelant (stdlib) → piles repliées."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.target = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+@contextmanager
+def _profiled(name, stamp):
+    mode = os.environ.get("VELIB_PROFILER", "cprofile")
+    out_dir = os.path.join(METRICS_DIR, "profiles")
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"{name}-{stamp}")
+    if mode == "sample":
+        sampler = _Sampler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            with open(base + ".folded", "w", encoding="utf-8") as f:
+                for stack, n in sampler.stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            print(f"🔬 Profil échantillonné ({sum(sampler.stacks.values())} échantillons) → {base}.folded")
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(base + ".prof")
+        print(f"🔬 Profil cProfile → {base}.prof (15 fonctions les plus coûteuses) :")
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(15)
+
+# ---------- export ----------
+def _write(record):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+    with open(os.path.join(METRICS_DIR, JSONL_FILE), "a", encoding="utf-8") as f:
+        f.write(line)  # une seule écriture en mode append : lignes jamais entremêlées
+
+    # dernier état par étape + textfile Prometheus, sous verrou (processus concurrents)
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        last_path = os.path.join(METRICS_DIR, LAST_FILE)
+        last = {}
+        if os.path.exists(last_path):
+            with open(last_path, "r", encoding="utf-8") as f:
+                last = json.load(f)
+        runs = last.get(record["name"], {}).get("runs", 0) + 1
+        last[record["name"]] = {**record, "runs": runs, "success": int(record["status"] == "ok")}
+        with open(last_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(last, f, default=str)
+        os.replace(last_path + ".tmp", last_path)
+        prom_path = os.path.join(METRICS_DIR, PROM_FILE)
+        with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(prometheus_text(last))
+        os.replace(prom_path + ".tmp", prom_path)
+
+def prometheus_text(last):
+    """Format d'exposition Prometheus des dernières mesures par étape."""
+    lines = []
+    for metric, field, kind, help_ in PROM_METRICS:
+        lines += [f"# HELP {metric} {help_}", f"# TYPE {metric} {kind}"]
+        for name, rec in sorted(last.items()):
+            value = rec.get(field)
+            if value is None:
+                continue
+            lines.append(f'{metric}{{stage="{name}",host="{rec.get("host", "")}"}} {float(value)}')
+    return "\n".join(lines) + "\n"
+
+@contextmanager
+def stage(name, rows_in=None, **labels):
+    """Mesurer une étape ; exporte même si l'étape lève une exception."""
+    rec = StageRecord(name, rows_in, **labels)
+    if not enabled():
+        yield rec
+        return
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    io0 = _io()
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        if _profile_wanted(name):
+            with _profiled(name, stamp):
+                yield rec
+        else:
+            yield rec
+    except SystemExit as exc:  # sortie normale d'un script (exit 0)
+        status = "ok" if exc.code in (0, None) else "error"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        wall = time.perf_counter() - t0
+        io1 = _io()
+        if io0 and io1:
+            rec.bytes_read = rec.bytes_read if rec.bytes_read is not None else io1[0] - io0[0]
+            rec.bytes_written = rec.bytes_written if rec.bytes_written is not None else io1[1] - io0[1]
+        out = rec.as_dict()
+        out.update({
+            "start": stamp, "end_ts": time.time(), "status": status,
+            "wall_s": round(wall, 6), "cpu_s": round(time.process_time() - cpu0, 6),
+            "peak_rss_bytes": _peak_rss_bytes(), "pid": os.getpid(), "host": socket.gethostname(),
+        })
+        try:
+            _write(out)
+        except OSError as exc:  # la mesure ne doit jamais casser le pipeline
+            print(f"⚠️ Métriques non écrites : {exc}")
@@ -0,0 +1,200 @@
+"""Moteur de KPIs incrémental pour `compute_kpis.py`.
+
+Les trois KPIs (heures de pointe, saturation par arrondissement, top stations
+vides) ne sont que des moyennes : on garde dans `data/kpi_state.json` des
+agrégats partiels fusionnables (sommes, comptes, nb de lignes vides par clé),
+calculés en une seule passe sur les lignes.
+
+À chaque lancement, seules les heures postérieures au watermark sont lues
+dans le Parquet (filtre poussé au lecteur). La dernière heure lue est
+considérée ouverte : ses partiels sont gardés à part et remplacés au
+lancement suivant, les heures précédentes sont ajoutées une fois pour toutes.
+
+`prepare_data.py` réécrit tout le Parquet : l'état garde donc la signature
+des lignes ≤ watermark (nb de lignes, première heure, empreinte) et tout est
+recalculé si elle change — heure tardive ou backfill — ou si `STATE_VERSION`
+(format de l'état, types des clés) ne correspond pas. L'empreinte ne relit
+pas les données : métadonnées (taille, statistiques) des row groups
+entièrement ≤ watermark, plus le contenu du seul row group à cheval.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import schemas
+from hourly_store import query_hourly
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_FILE = os.path.join(BASE_DIR, "data", "kpi_state.json")
+STATE_VERSION = 2  # 2 : stationcode en chaîne (schemas), signature de la source
+COLUMNS = ["ts_hour", "stationcode", "arrdt", "bikes_mean", "docks_mean"]
+
+def empty_partials():
+    # hour → [somme vélos, nb vélos, somme docks, nb docks, nb lignes]
+    # arrdt / station → [nb lignes vides, nb lignes]
+    return {"hour": {}, "arrdt": {}, "station": {}}
+
+def _count_by(keys, empty):
+    """Comptes (vides, total) par clé, via factorize + bincount."""
+    codes, uniques = pd.factorize(keys)
+    ok = codes >= 0  # clés manquantes ignorées, comme groupby
+    n = np.bincount(codes[ok], minlength=len(uniques))
+    e = np.bincount(codes[ok], weights=empty[ok], minlength=len(uniques))
+    return {k.item() if hasattr(k, "item") else k: [float(ei), int(ni)]
+            for k, ei, ni in zip(uniques, e, n)}
+
+def partials(df):
+    """Agrégats partiels des trois KPIs en une passe sur `df`."""
+    if df.empty:
+        return empty_partials()
+    hour = df["ts_hour"].dt.hour.to_numpy()
+    b = df["bikes_mean"].to_numpy(dtype=float)
+    d = df["docks_mean"].to_numpy(dtype=float)
+    empty = (b == 0).astype(float)
+
+    cols = [
+        np.bincount(hour, weights=np.nan_to_num(b), minlength=24),
+        np.bincount(hour, weights=~np.isnan(b), minlength=24),
+        np.bincount(hour, weights=np.nan_to_num(d), minlength=24),
+        np.bincount(hour, weights=~np.isnan(d), minlength=24),
+        np.bincount(hour, minlength=24),
+    ]
+    by_hour = {h: [float(c[h]) for c in cols] for h in range(24) if cols[4][h]}
+    return {
+        "hour": by_hour,
+        "arrdt": _count_by(df["arrdt"].to_numpy(dtype=object), empty),
+        "station": _count_by(df["stationcode"].astype(str).to_numpy(dtype=object), empty),
+    }
+
+def merge(a, b):
+    """Fusionner deux jeux de partiels (addition clé à clé)."""
+    out = empty_partials()
+    for part in out:
+        acc = {k: list(v) for k, v in a[part].items()}
+        for k, v in b[part].items():
+            acc[k] = [x + y for x, y in zip(acc[k], v)] if k in acc else list(v)
+        out[part] = acc
+    return out
+
+def new_state():
+    return {"version": STATE_VERSION, "watermark": None, "source": None,
+            "closed": empty_partials(), "open": empty_partials()}
+
+def load_state(path=STATE_FILE):
+    """État sauvegardé (état neuf s'il est absent ou d'une autre version)."""
+    if not os.path.exists(path):
+        return new_state()
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    if raw.get("version") != STATE_VERSION:
+        return new_state()
+
+    def decode(p):
+        return {"hour": {int(k): v for k, v in p["hour"].items()},
+                "arrdt": p["arrdt"],
+                "station": {str(k): v for k, *v in p["station"]}}
+
+    return {"version": STATE_VERSION, "watermark": raw["watermark"], "source": raw["source"],
+            "closed": decode(raw["closed"]), "open": decode(raw["open"])}
+
+def save_state(state, path=STATE_FILE):
+    def encode(p):
+        return {"hour": {str(k): v for k, v in p["hour"].items()},
+                "arrdt": p["arrdt"],
+                "station": [[k, *v] for k, v in p["station"].items()]}
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": STATE_VERSION, "watermark": state["watermark"], "source": state["source"],
+                   "closed": encode(state["closed"]), "open": encode(state["open"])}, f)
+    os.replace(path + ".tmp", path)
+
+def source_signature(parquet_path, watermark):
+    """Signature des lignes ≤ `watermark` du Parquet : {rows, min_hour, digest}."""
+    wm = pd.Timestamp(watermark)
+    f = pq.ParquetFile(parquet_path)
+    meta = f.metadata
+    i_ts = f.schema_arrow.get_field_index("ts_hour")
+    h = hashlib.sha256()
+    rows, min_hour = 0, None
+    for g in range(meta.num_row_groups):
+        rg = meta.row_group(g)
+        st = rg.column(i_ts).statistics
+        lo, hi = pd.Timestamp(st.min), pd.Timestamp(st.max)
+        if lo.tzinfo is None:
+            lo, hi = lo.tz_localize("UTC"), hi.tz_localize("UTC")
+        if lo > wm:
+            continue
+        min_hour = lo if min_hour is None else min(min_hour, lo)
+        if hi <= wm:  # row group entièrement clos : ses métadonnées suffisent
+            rows += rg.num_rows
+            h.update(f"{g}:{rg.num_rows}:{rg.total_byte_size}".encode())
+            for c in range(rg.num_columns):
+                col = rg.column(c)
+                s = col.statistics
+                h.update(f"{col.total_compressed_size}:{s.min if s else ''}:{s.max if s else ''}"
+                         f":{s.null_count if s else ''}".encode())
+        else:  # à cheval sur le watermark : contenu des lignes closes
+            part = f.read_row_group(g, columns=COLUMNS).to_pandas()
+            part = part[pd.to_datetime(part["ts_hour"], utc=True) <= wm]
+            rows += len(part)
+            h.update(f"{g}:".encode())
+            h.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+    return {"rows": rows, "min_hour": None if min_hour is None else min_hour.isoformat(),
+            "digest": h.hexdigest()}
+
+def update(parquet_path, state):
+    """Intégrer les heures > watermark du Parquet → (state, nb lignes lues).
+
+    Si les lignes déjà intégrées ont changé (signature), tout est relu.
+    """
+    if state["watermark"] is not None and state["source"] != source_signature(parquet_path, state["watermark"]):
+        print("ℹ️ Parquet modifié avant le watermark KPI (heures tardives/backfill) → recalcul complet")
+        state = new_state()
+    start = None
+    if state["watermark"] is not None:
+        start = pd.Timestamp(state["watermark"]) + pd.Timedelta(hours=1)
+    delta = query_hourly(start, columns=COLUMNS, path=parquet_path)
+    if delta.empty:
+        return state, 0
+
+    last = delta["ts_hour"].max()
+    closed = delta[delta["ts_hour"] < last]
+    watermark = closed["ts_hour"].max().isoformat() if len(closed) else state["watermark"]
+    state = {
+        "version": STATE_VERSION,
+        "watermark": watermark,
+        "source": None if watermark is None else source_signature(parquet_path, watermark),
+        "closed": merge(state["closed"], partials(closed)),
+        "open": partials(delta[delta["ts_hour"] == last]),  # remplace l'ancienne heure ouverte
+    }
+    return state, len(delta)
+
+def kpi_tables(state):
+    """Partiels → (heures, saturation, top stations), au format des anciens CSV."""
+    p = merge(state["closed"], state["open"])
+
+    h = pd.DataFrame.from_dict(p["hour"], orient="index",
+                               columns=["sb", "nb", "sd", "nd", "n"]).sort_index()
+    heures = pd.DataFrame({"bikes_mean": h["sb"] / h["nb"].where(h["nb"] > 0),
+                           "docks_mean": h["sd"] / h["nd"].where(h["nd"] > 0)})
+    heures.index.name = "hour"
+    heures["total_bikes"] = heures["bikes_mean"]
+
+    def pct_empty(part, name):
+        # clés dans l'ordre de l'ancien groupby (stationcode entier → tri numérique) :
+        # les ex æquo du top 20 sortent dans le même ordre
+        s = pd.DataFrame.from_dict(part, orient="index", columns=["e", "n"])
+        s = s.reindex(schemas.sort_codes(s.index))
+        out = s["e"] / s["n"] * 100
+        out.index.name = name
+        return out.rename("is_empty")
+
+    saturation = pct_empty(p["arrdt"], "arrdt")
+    station_sat = pct_empty(p["station"], "stationcode")
+    station_sat = station_sat.sort_values(ascending=False).head(20)
+    return heures, saturation, station_sat
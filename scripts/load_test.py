@@ -0,0 +1,100 @@
+"""Test de charge de l'API locale (asyncio, connexions keep-alive, stdlib seule).
+
+N connexions concurrentes envoient des GET en boucle sur un mélange
+d'endpoints pendant `--duration` secondes ; rapport : débit, latences
+(p50/p95/p99), codes HTTP.
+
+Usage :
+    python scripts/api_server.py &
+    python scripts/load_test.py --url http://127.0.0.1:8080 --connections 32 --duration 10
+    python scripts/load_test.py --gzip --etag          # clients qui revalident (304)
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+async def _get(reader, writer, host, path, extra):
+    writer.write((f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{extra}\r\n").encode("latin-1"))
+    await writer.drain()
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split(" ", 2)[1])
+    headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers, body
+
+async def worker(host, port, paths, deadline, use_gzip, use_etag, stats):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    rng = random.Random()
+    try:
+        while time.perf_counter() < deadline:
+            path = rng.choice(paths)
+            extra = "Accept-Encoding: gzip\r\n" if use_gzip else ""
+            if use_etag and path in etags:
+                extra += f"If-None-Match: {etags[path]}\r\n"
+            t0 = time.perf_counter()
+            status, headers, body = await _get(reader, writer, host, path, extra)
+            stats["lat"].append(time.perf_counter() - t0)
+            stats["codes"][status] += 1
+            stats["bytes"] += len(body)
+            if "etag" in headers:
+                etags[path] = headers["etag"]
+    finally:
+        writer.close()
+
+async def discover(host, port):
+    """Quelques stationcodes / arrondissements réels pour un mélange réaliste."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, _, body = await _get(reader, writer, host, "/stations", "")
+    finally:
+        writer.close()
+    stations = json.loads(body)
+    codes = [s["stationcode"] for s in stations[:200]]
+    arrdts = sorted({str(s["arrdt"]) for s in stations})[:20]
+    return codes, arrdts
+
+async def run(url, connections, duration, use_gzip, use_etag):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    codes, arrdts = await discover(host, port)
+    paths = ([f"/stations/{c}" for c in codes] * 4
+             + [f"/arrondissements/{quote(a)}" for a in arrdts]
+             + [f"/stations?arrdt={quote(a)}" for a in arrdts[:5]]
+             + ["/arrondissements", "/kpi/heures", "/kpi/top-vides?n=10", "/anomalies/latest", "/health"])
+    stats = {"lat": [], "codes": Counter(), "bytes": 0}
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+    await asyncio.gather(*(worker(host, port, paths, deadline, use_gzip, use_etag, stats)
+                           for _ in range(connections)))
+    elapsed = time.perf_counter() - t0
+    return stats, elapsed
+
+def main():
+    ap = argparse.ArgumentParser(description="Test de charge de l'API Vélib locale")
+    ap.add_argument("--url", default="http://127.0.0.1:8080")
+    ap.add_argument("--connections", type=int, default=32)
+    ap.add_argument("--duration", type=float, default=10.0)
+    ap.add_argument("--gzip", action="store_true", help="envoyer Accept-Encoding: gzip")
+    ap.add_argument("--etag", action="store_true", help="revalider avec If-None-Match (304)")
+    args = ap.parse_args()
+
+    stats, elapsed = asyncio.run(run(args.url, args.connections, args.duration, args.gzip, args.etag))
+    lat = np.array(stats["lat"]) * 1e3
+    n = len(lat)
+    print(f"📈 {n} requêtes en {elapsed:.1f} s → {n / elapsed:,.0f} req/s "
+          f"({stats['bytes'] / elapsed / 1e6:.1f} Mo/s, {args.connections} connexions)")
+    if n:
+        p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+        print(f"⏱️ latence p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms | max {lat.max():.2f} ms")
+    print(f"🔢 codes HTTP : {dict(stats['codes'])}")
+
+if __name__ == "__main__":
+    main()
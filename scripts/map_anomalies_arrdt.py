@@ -1,9 +1,11 @@
-import pandas as pd
 import folium
 import webbrowser
 
+import schemas
+from map_layers import color_by_flag, geojson_layer
+
 # 1) Charger les anomalies
-df = pd.read_csv("anomalies_velib.csv", parse_dates=["ts_hour"])
+df = schemas.read_anomalies("anomalies_velib.csv")
 
 # 2) Récupérer la dernière heure
 last_ts = df["ts_hour"].max()
@@ -20,25 +22,13 @@ df_filtre = df_last[df_last["arrdt"] == arrondissement_cible]
 m = folium.Map(location=[48.8566, 2.3522], zoom_start=13)
 
 # 5) Ajouter les stations filtrées
-for _, row in df_filtre.iterrows():
-    color = "red" if row["is_anomaly"] else "green"
-
-    popup = f"""
-    <b>{row['name']}</b><br>
-    Arrdt: {row['arrdt']}<br>
-    Vélos (médiane): {row['bikes_median']}<br>
-    Docks (moyenne): {row['docks_mean']}<br>
-    Anomalie: {row['is_anomaly']}
-    """
-
-    folium.CircleMarker(
-        location=[row["lat"], row["lon"]],
-        radius=6,
-        color=color,
-        fill=True,
-        fill_color=color,
-        popup=popup
-    ).add_to(m)
+geojson_layer(
+    df_filtre,
+    ["name", "arrdt", "bikes_median", "docks_mean", "is_anomaly"],
+    colors=color_by_flag(df_filtre["is_anomaly"], on="red", off="green"),
+    popup=("name", [("Arrdt", "arrdt"), ("Vélos (médiane)", "bikes_median"),
+                    ("Docks (moyenne)", "docks_mean"), ("Anomalie", "is_anomaly")]),
+).add_to(m)
 
 # 6) Légende
 legend_html = """
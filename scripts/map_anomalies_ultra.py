@@ -1,14 +1,27 @@
-import pandas as pd
 import folium
-from folium import FeatureGroup, Element, IFrame
+from folium import FeatureGroup, Element
 from folium.plugins import (
-    MarkerCluster, HeatMap, MiniMap, Fullscreen,
+    HeatMap, MiniMap, Fullscreen,
     MeasureControl, LocateControl, Search
 )
+import argparse
 import webbrowser
 
+import instrument
+import schemas
+from map_layers import StationTable, TableCluster, cluster_layer, color_by_flag, geojson_layer, heat_points
+
+ap = argparse.ArgumentParser(description="Carte avancée des anomalies Vélib")
+ap.add_argument("--mode", choices=["compact", "layers"], default="compact",
+                help="compact : stations émises une fois (table JSON) et référencées par indice ; "
+                     "layers : données recopiées dans chaque calque")
+ap.add_argument("--input", default="anomalies_velib.csv")
+ap.add_argument("--out", default="map_anomalies_ultra.html")
+ap.add_argument("--no-open", action="store_true", help="ne pas ouvrir le navigateur")
+args = ap.parse_args()
+
 # ---------- 1) Charger les anomalies ----------
-df = pd.read_csv("anomalies_velib.csv", parse_dates=["ts_hour"])
+df = schemas.read_anomalies(args.input)
 last_ts = df["ts_hour"].max()
 df_last = df[df["ts_hour"] == last_ts].copy()
 if df_last.empty:
@@ -40,10 +53,6 @@ fg_anom = FeatureGroup(name="Anomalies (rouge)", show=True)
 fg_norm = FeatureGroup(name="Normales (vert)", show=False)
 fg_heat = FeatureGroup(name="Heatmap anomalies", show=False)
 
-cluster_all  = MarkerCluster(name="Cluster (toutes)").add_to(fg_all)
-cluster_anom = MarkerCluster(name="Cluster (anomalies)").add_to(fg_anom)
-cluster_norm = MarkerCluster(name="Cluster (normales)").add_to(fg_norm)
-
 def icon_html(color, emoji):
     return f"""
     <div style="
@@ -51,78 +60,59 @@ def icon_html(color, emoji):
       width:28px; height:28px; line-height:28px; font-size:16px;
       box-shadow:0 0 6px rgba(0,0,0,.25);">{emoji}</div>"""
 
-def popup_for(row):
-    html = f"""
-    <div style="font-size:14px;line-height:1.4;">
-      <b>{row['name']}</b><br/>
-      Arrdt : {row['arrdt']}<br/>
-      Médiane vélos : <b>{row['bikes_median']}</b><br/>
-      Moyenne docks : <b>{row['docks_mean']}</b><br/>
-      Score anomalie : {round(float(row.get('anomaly_score', 0) or 0), 2)}<br/>
-      Anomalie : <b>{bool(row['is_anomaly'])}</b>
-    </div>
-    """
-    return folium.Popup(IFrame(html=html, width=260, height=140), max_width=280)
-
-# ---------- 4) Marqueurs + Heatmap ----------
-heat_points = []
-# On mémorise aussi des "anchors" pour la sidebar (pan/zoom)
-anchors_js = []  # [{name, arrdt, lat, lon, score}]
-
-for _, r in df_last.iterrows():
-    lat, lon = float(r["lat"]), float(r["lon"])
-    is_anom = bool(r["is_anomaly"])
-    score = float(r.get("anomaly_score", 0) or 0)
-
-    # Marqueurs spécifiques
-    if is_anom:
-        folium.Marker(
-            [lat, lon],
-            icon=folium.DivIcon(html=icon_html("#dc3545", "⚠")),
-            popup=popup_for(r),
-        ).add_to(cluster_anom)
-        heat_points.append([lat, lon, max(score, 1.0)])
-    else:
-        folium.Marker(
-            [lat, lon],
-            icon=folium.DivIcon(html=icon_html("#28a745", "✓")),
-            popup=popup_for(r),
-        ).add_to(cluster_norm)
-
-    # Calque "toutes"
-    folium.CircleMarker(
-        [lat, lon],
-        radius=6,
-        color="#dc3545" if is_anom else "#28a745",
-        fill=True, fill_color="#dc3545" if is_anom else "#28a745",
-        fill_opacity=0.9, popup=popup_for(r),
-    ).add_to(cluster_all)
+# Colonnes de popup (rendue au clic dans le navigateur)
+df_last["anomaly_score"] = df_last["anomaly_score"].fillna(0).astype(float).round(2)
+df_last["is_anomaly"] = df_last["is_anomaly"].astype(bool)
+POPUP_COLS = ["name", "arrdt", "bikes_median", "docks_mean", "anomaly_score", "is_anomaly"]
+POPUP = ("name", [("Arrdt", "arrdt"), ("Médiane vélos", "bikes_median"), ("Moyenne docks", "docks_mean"),
+                  ("Score anomalie", "anomaly_score"), ("Anomalie", "is_anomaly")])
+
+# ---------- 4) Marqueurs + Heatmap (un calque = un appel vectorisé) ----------
+anom = df_last[df_last["is_anomaly"]]
+norm = df_last[~df_last["is_anomaly"]]
+
+if args.mode == "compact":
+    # Table des stations émise une seule fois ; les calques ne portent que des indices
+    df_last = df_last.reset_index(drop=True)
+    df_last["color"] = color_by_flag(df_last["is_anomaly"])
+    table = StationTable(df_last, ["lat", "lon", "color"] + POPUP_COLS)
+    m.add_child(table)
+    pos_anom = df_last.index[df_last["is_anomaly"]]
+    pos_norm = df_last.index[~df_last["is_anomaly"]]
+    TableCluster(table, pos_anom, POPUP, name="Cluster (anomalies)",
+                 icon_html=icon_html("{color}", "⚠")).add_to(fg_anom)
+    TableCluster(table, pos_norm, POPUP, name="Cluster (normales)",
+                 icon_html=icon_html("{color}", "✓")).add_to(fg_norm)
+    cluster_all = TableCluster(table, df_last.index, POPUP, name="Cluster (toutes)").add_to(fg_all)
+else:
+    cluster_layer(anom, POPUP_COLS, ["#dc3545"] * len(anom), POPUP, name="Cluster (anomalies)",
+                  icon_html=icon_html("{color}", "⚠")).add_to(fg_anom)
+    cluster_layer(norm, POPUP_COLS, ["#28a745"] * len(norm), POPUP, name="Cluster (normales)",
+                  icon_html=icon_html("{color}", "✓")).add_to(fg_norm)
+    cluster_layer(df_last, POPUP_COLS, color_by_flag(df_last["is_anomaly"]), POPUP,
+                  name="Cluster (toutes)").add_to(fg_all)
 
 # Heatmap des anomalies
-if heat_points:
-    HeatMap(heat_points, radius=14, blur=20, max_zoom=15).add_to(fg_heat)
+heat = anom.assign(weight=anom["anomaly_score"].clip(lower=1.0))
+if len(heat):
+    HeatMap(heat_points(heat, "weight"), radius=14, blur=20, max_zoom=15).add_to(fg_heat)
 
 # Calques → carte
 fg_all.add_to(m); fg_anom.add_to(m); fg_norm.add_to(m); fg_heat.add_to(m)
 
 # ---------- 5) Recherche par nom (sur toutes) ----------
-# Construire un GeoJson minimal pour activer Search
-features = [{
-    "type": "Feature",
-    "properties": {"name": row["name"]},
-    "geometry": {"type": "Point", "coordinates": [float(row["lon"]), float(row["lat"])]}
-} for _, row in df_last.iterrows()]
+if args.mode == "compact":
+    # les marqueurs portent déjà `name` : pas de GeoJson supplémentaire
+    search_layer = cluster_all
+else:
+    # GeoJson minimal (une seule FeatureCollection) pour activer Search
+    search_layer = geojson_layer(df_last, ["name"], name="Recherche", show=False).add_to(m)
 
-geojson = folium.GeoJson(
-    {"type":"FeatureCollection","features":features},
-    name="Recherche",
-    show=False
-).add_to(m)
-
-Search(layer=geojson, search_label="name", placeholder="🔎 Rechercher une station…", collapsed=False).add_to(m)
+Search(layer=search_layer, search_label="name", placeholder="🔎 Rechercher une station…", collapsed=False).add_to(m)
 
 # ---------- 6) Sidebar (KPIs + Top anomalies cliquables) ----------
 # Préparer anchors pour JS
+anchors_js = []  # [{name, arrdt, lat, lon, score}]
 for _, r in top.iterrows():
     anchors_js.append({
         "name": str(r["name"]),
@@ -210,7 +200,10 @@ m.get_root().html.add_child(Element(legend_html))
 folium.LayerControl(collapsed=False).add_to(m)
 
 # ---------- 9) Export + ouverture ----------
-out = "map_anomalies_ultra.html"
-m.save(out)
-webbrowser.open(out)
+out = args.out
+with instrument.stage("map.anomalies_ultra", rows_in=len(df), mode=args.mode) as st:
+    m.save(out)  # rendu des gabarits + écriture du HTML
+    st.rows_out = n_total
+if not args.no_open:
+    webbrowser.open(out)
 print(f"✅ Carte avancée écrite : {out}")
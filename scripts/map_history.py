@@ -0,0 +1,102 @@
+"""Carte de relecture de l'historique horaire (curseur temporel).
+
+Les cartes map_* n'affichent que la dernière heure. Ici, toutes les heures de
+la fenêtre sont embarquées dans UN fichier HTML :
+
+- géométrie + noms des stations émis une seule fois (`StationTable`)
+- par heure, une trame binaire base64 : vélos (int16) + drapeaux (uint8)
+- le curseur décode la trame choisie et recolore les marqueurs dans le navigateur
+
+Une semaine (168 h × ~1 500 stations) tient en ~1 Mo de trames.
+
+Usage :
+    python scripts/map_history.py                      # 7 derniers jours
+    python scripts/map_history.py --hours 48 --out map_48h.html
+    python scripts/map_history.py --start 2025-08-20 --end 2025-08-27
+"""
+import argparse
+import webbrowser
+
+import numpy as np
+import pandas as pd
+import folium
+from folium.plugins import Fullscreen
+
+import instrument
+import schemas
+from map_layers import HourlyPlayback, StationTable, pack_hours
+
+INPUT = "anomalies_velib.csv"
+OUTPUT = "map_history.html"
+FLAG_ANOMALY, FLAG_BLOCKED = 1, 2
+
+def load_window(path=INPUT, hours=168, start=None, end=None):
+    """Lignes station × heure de la fenêtre demandée (défaut : `hours` dernières heures)."""
+    df = schemas.read_anomalies(path)
+    if start is not None:
+        df = df[df["ts_hour"] >= pd.Timestamp(start, tz="UTC")]
+    if end is not None:
+        df = df[df["ts_hour"] < pd.Timestamp(end, tz="UTC")]
+    if start is None and end is None and len(df):
+        df = df[df["ts_hour"] > df["ts_hour"].max() - pd.Timedelta(hours=hours)]
+    if df.empty:
+        raise ValueError("Aucune donnée dans la fenêtre demandée. Lance la collecte/agrégation/détection avant.")
+    return df
+
+def encode(df):
+    """(stations, heures, trames) : une ligne par station, une trame par heure.
+
+    La grille heures × stations est remplie par indexation numpy (pas de pivot
+    pandas) ; les cases sans mesure valent -1.
+    """
+    df = df.sort_values("ts_hour")
+    stations = (df.drop_duplicates("stationcode", keep="last")
+                  .sort_values("stationcode")[["stationcode", "name", "lat", "lon"]]
+                  .reset_index(drop=True))
+    hours = pd.DatetimeIndex(np.sort(df["ts_hour"].unique()))
+    si = pd.Index(stations["stationcode"]).get_indexer(df["stationcode"])
+    hi = hours.get_indexer(df["ts_hour"])
+
+    bikes = np.full((len(hours), len(stations)), -1, dtype=np.int16)
+    flags = np.zeros((len(hours), len(stations)), dtype=np.uint8)
+    b = df["bikes_mean"].to_numpy(dtype=float)
+    ok = np.isfinite(b)
+    bikes[hi[ok], si[ok]] = np.clip(np.rint(b[ok]), 0, np.iinfo(np.int16).max).astype(np.int16)
+    flags[hi, si] = (FLAG_ANOMALY * df["is_anomaly"].fillna(False).astype(bool).to_numpy()
+                     | FLAG_BLOCKED * df["is_blocked_3h"].fillna(False).astype(bool).to_numpy())
+
+    labels = hours.tz_convert("Europe/Paris").strftime("%a %d/%m %H:00").tolist()
+    return stations, labels, pack_hours(bikes, flags)
+
+def build_map(stations, labels, frames):
+    m = folium.Map(location=[48.8566, 2.3522], zoom_start=12, control_scale=True,
+                   tiles="OpenStreetMap", prefer_canvas=True)
+    Fullscreen().add_to(m)
+    table = StationTable(stations, ["name", "lat", "lon"])
+    m.add_child(table)
+    m.add_child(HourlyPlayback(table, labels, frames))
+    return m
+
+def main():
+    ap = argparse.ArgumentParser(description="Carte Vélib avec curseur temporel sur l'historique horaire")
+    ap.add_argument("--input", default=INPUT)
+    ap.add_argument("--hours", type=int, default=168, help="fenêtre glissante (heures) si ni --start ni --end")
+    ap.add_argument("--start", default=None, help="début inclus (UTC), ex. 2025-08-20")
+    ap.add_argument("--end", default=None, help="fin exclue (UTC)")
+    ap.add_argument("--out", default=OUTPUT)
+    ap.add_argument("--no-open", action="store_true", help="ne pas ouvrir le navigateur")
+    args = ap.parse_args()
+
+    with instrument.stage("map.history") as st:
+        df = load_window(args.input, args.hours, args.start, args.end)
+        st.rows_in = len(df)
+        stations, labels, frames = encode(df)
+        build_map(stations, labels, frames).save(args.out)
+        st.rows_out = len(stations)
+    print(f"✅ Carte historique écrite : {args.out} "
+          f"({len(stations)} stations × {len(labels)} h)")
+    if not args.no_open:
+        webbrowser.open(args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Construction vectorisée des calques de stations, partagée par les scripts map_*.
+
+Au lieu d'un objet folium (CircleMarker/Marker + Popup) par station créé dans
+une boucle `iterrows()`, chaque calque est produit en une fois depuis les
+colonnes du DataFrame :
+
+- `geojson_layer` : UNE FeatureCollection ; couleur et popup sont lus dans
+  `feature.properties` côté navigateur (popup rendue au clic depuis un gabarit)
+- `cluster_layer` : FastMarkerCluster, données en tableau compact + un seul
+  callback JS qui crée les marqueurs
+- la même FeatureCollection sert aussi au plugin Search (pas de 2e boucle)
+- mode compact : `StationTable` émet les stations UNE fois (JSON en colonnes) ;
+  les calques `TableCluster` ne portent que des indices vers cette table
+- historique : `HourlyPlayback` recolore ces mêmes stations heure par heure
+  à partir de trames binaires compactes (`pack_hours`)
+"""
+import base64
+import json
+
+import numpy as np
+import folium
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster, MarkerCluster
+from folium.template import Template
+from folium.utilities import JsCode
+
+GREEN, ORANGE, RED = "#28a745", "#fd7e14", "#dc3545"
+DECIMALS = 6  # float32 (coordonnées du store d'historique) : ~7 chiffres significatifs, inutile d'en écrire 17
+
+def _plain(s):
+    """Colonne → valeurs JSON (NaN → None, float32 arrondi sans faux chiffres)."""
+    if s.dtype == np.float32:
+        s = s.astype(float).round(DECIMALS)
+    return s.astype(object).where(s.notna(), None)
+
+def color_by_bikes(bikes):
+    """Couleurs vectorisées : 0 vélo → rouge, 1–4 → orange, ≥ 5 → vert."""
+    b = np.asarray(bikes, dtype=float)
+    return np.select([b == 0, b < 5], [RED, ORANGE], GREEN)
+
+def color_by_flag(flag, on=RED, off=GREEN):
+    """Couleur selon un booléen (ex. is_anomaly)."""
+    return np.where(np.asarray(flag, dtype=bool), on, off)
+
+def popup_template(title, lines):
+    """Fonction JS `function(p)` → HTML de popup à partir des propriétés.
+
+    `title` : propriété affichée en gras ; `lines` : [(libellé, propriété), ...].
+    """
+    parts = [f"'<b>' + p[{json.dumps(title)}] + '</b><br/>'"]
+    parts += [f"{json.dumps(label + ' : ')} + '<b>' + p[{json.dumps(key)}] + '</b><br/>'"
+              for label, key in lines]
+    return ("function(p){return '<div style=\"font-size:14px;line-height:1.4\">' + "
+            + " + ".join(parts) + " + '</div>';}")
+
+def station_features(df, props, lat="lat", lon="lon"):
+    """FeatureCollection (dict) des stations, construite colonne par colonne."""
+    records = [dict(zip(props, row)) for row in zip(*[_plain(df[c]).tolist() for c in props])]
+    coords = zip(_plain(df[lon]).tolist(), _plain(df[lat]).tolist())
+    return {"type": "FeatureCollection", "features": [
+        {"type": "Feature", "properties": p, "geometry": {"type": "Point", "coordinates": [x, y]}}
+        for p, (x, y) in zip(records, coords)
+    ]}
+
+def geojson_layer(df, props, colors=None, popup=None, name=None, show=True,
+                  radius=6, fill_opacity=0.9, tooltip=None):
+    """Calque GeoJson de CircleMarkers stylés par la propriété `color`.
+
+    `popup` : (title, lines) pour `popup_template` ; rendue au clic seulement.
+    """
+    df = df.assign(color=colors) if colors is not None else df
+    props = list(props) + (["color"] if colors is not None else [])
+    on_each = "function(f, l){ var p = f.properties;"
+    if colors is not None:
+        on_each += " l.setStyle({color: p.color, fillColor: p.color});"
+    if popup is not None:
+        on_each += f" var tpl = {popup_template(*popup)}; l.bindPopup(function(){{ return tpl(p); }}, {{maxWidth: 280}});"
+    on_each += " }"
+    return folium.GeoJson(
+        station_features(df, props),
+        name=name, show=show,
+        marker=folium.CircleMarker(radius=radius, fill=True, fill_opacity=fill_opacity, weight=2),
+        on_each_feature=JsCode(on_each),
+        tooltip=tooltip,
+    )
+
+def cluster_layer(df, popup_cols, colors, popup, name=None, icon_html=None, radius=6):
+    """FastMarkerCluster : lignes [lat, lon, couleur, *popup_cols] + un callback JS.
+
+    `icon_html` : gabarit HTML avec `{color}` pour un DivIcon (sinon CircleMarker).
+    """
+    data = np.column_stack([
+        _plain(df["lat"]).to_numpy(), _plain(df["lon"]).to_numpy(),
+        np.asarray(colors, dtype=object),
+        *[_plain(df[c]).to_numpy() for c in popup_cols],
+    ]).tolist()
+    keys = json.dumps(list(popup_cols))
+    if icon_html is not None:
+        make = ("L.marker(ll, {icon: L.divIcon({html: "
+                + json.dumps(icon_html).replace("{color}", '" + row[2] + "')
+                + ", className: '', iconSize: [28, 28]})})")
+    else:
+        make = (f"L.circleMarker(ll, {{radius: {radius}, color: row[2], fillColor: row[2], "
+                "fill: true, fillOpacity: 0.95})")
+    callback = f"""function (row) {{
+        var ll = new L.LatLng(row[0], row[1]);
+        var keys = {keys}, p = {{}};
+        for (var i = 0; i < keys.length; i++) {{ p[keys[i]] = row[3 + i]; }}
+        var tpl = {popup_template(*popup)};
+        var m = {make};
+        m.bindPopup(function(){{ return tpl(p); }}, {{maxWidth: 280}});
+        return m;
+    }}"""
+    return FastMarkerCluster(data, callback=callback, name=name)
+
+def heat_points(df, weight):
+    """Points [lat, lon, poids] pour HeatMap, sans boucle."""
+    pts = df[["lat", "lon", weight]].dropna()
+    return np.column_stack([_plain(pts[c]).to_numpy(dtype=float) for c in pts.columns]).tolist()
+
+class StationTable(MacroElement):
+    """Table des stations émise une seule fois dans la page, en colonnes.
+
+    `{name: [...], lat: [...], ...}` : les clés ne sont écrites qu'une fois et
+    chaque calque y fait référence par indice de ligne. À ajouter à la carte
+    AVANT les calques qui l'utilisent.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = {{ this.data|tojson }};
+        {% endmacro %}""")
+
+    def __init__(self, df, columns):
+        super().__init__()
+        self._name = "StationTable"
+        self.data = {c: _plain(df[c]).tolist() for c in columns}
+
+class TableCluster(MarkerCluster):
+    """Cluster de marqueurs créés dans le navigateur depuis une `StationTable`.
+
+    Seuls les indices des stations du calque sont écrits ; couleur (colonne
+    `color` de la table), popup (gabarit, rendue au clic) et propriété
+    `name` (pour Search) sont lus dans la table.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var T = {{ this.table.get_name() }};
+                var idx = {{ this.indices|tojson }};
+                var tpl = {{ this.popup_js }};
+                var row = function(i){ var p = {}; for (var k in T) { p[k] = T[k][i]; } return p; };
+                var callback = function(i){
+                    var ll = new L.LatLng(T.lat[i], T.lon[i]);
+                    var m = {{ this.make_js }};
+                    m.bindPopup(function(){ return tpl(row(i)); }, {maxWidth: 280});
+                    return m;
+                };
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+                for (var j = 0; j < idx.length; j++) { cluster.addLayer(callback(idx[j])); }
+                return cluster;
+            })();
+        {% endmacro %}""")
+
+    def __init__(self, table, indices, popup, name=None, icon_html=None, radius=6, **kwargs):
+        super().__init__(name=name, **kwargs)
+        self._name = "TableCluster"
+        self.table = table
+        self.indices = [int(i) for i in indices]
+        self.popup_js = popup_template(*popup)
+        if icon_html is not None:
+            self.make_js = ("L.marker(ll, {name: T.name[i], icon: L.divIcon({html: "
+                            + json.dumps(icon_html).replace("{color}", '" + T.color[i] + "')
+                            + ", className: '', iconSize: [28, 28]})})")
+        else:
+            self.make_js = (f"L.circleMarker(ll, {{name: T.name[i], radius: {radius}, color: T.color[i], "
+                            "fillColor: T.color[i], fill: true, fillOpacity: 0.9})")
+
+def pack_hours(bikes, flags):
+    """Encode une matrice heures × stations en une chaîne base64 par heure.
+
+    Trame d'une heure : `n` int16 little-endian (vélos, -1 = pas de donnée)
+    puis `n` uint8 (bit 0 : anomalie, bit 1 : bloquée ≥ 3 h).
+    """
+    b = np.asarray(bikes, dtype="<i2")
+    f = np.asarray(flags, dtype=np.uint8)
+    return [base64.b64encode(bh.tobytes() + fh.tobytes()).decode("ascii") for bh, fh in zip(b, f)]
+
+class HourlyPlayback(MacroElement):
+    """Lecture de l'historique horaire : géométrie émise une fois, valeurs par heure.
+
+    Les marqueurs (canvas) sont créés une seule fois depuis `table` ; un curseur
+    temporel décode la trame de l'heure choisie (typed arrays) et recolore les
+    marqueurs via `setStyle`, sans recréer de calque.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var map = {{ this._parent.get_name() }};
+                var T = {{ this.table.get_name() }};
+                var hours = {{ this.hours|tojson }};
+                var frames = {{ this.frames|tojson }};
+                var n = T.lat.length, cache = {}, cur = 0, timer = null;
+                var renderer = L.canvas({padding: 0.5});
+                var decode = function(h){
+                    if (!(h in cache)) {
+                        var s = atob(frames[h]), buf = new Uint8Array(s.length);
+                        for (var k = 0; k < s.length; k++) { buf[k] = s.charCodeAt(k); }
+                        cache[h] = {bikes: new Int16Array(buf.buffer, 0, n), flags: buf.subarray(2 * n)};
+                    }
+                    return cache[h];
+                };
+                var color = function(b, f){
+                    if (b < 0) { return "{{ this.missing }}"; }
+                    if (f & 1) { return "{{ this.red }}"; }
+                    if (f & 2) { return "{{ this.orange }}"; }
+                    return b === 0 ? "{{ this.red }}" : (b < 5 ? "{{ this.orange }}" : "{{ this.green }}");
+                };
+                var layer = L.layerGroup().addTo(map), markers = new Array(n);
+                for (var i = 0; i < n; i++) {
+                    markers[i] = L.circleMarker([T.lat[i], T.lon[i]],
+                        {renderer: renderer, radius: {{ this.radius }}, weight: 1, fillOpacity: 0.85}).addTo(layer);
+                    markers[i].bindPopup((function(i){ return function(){
+                        var fr = decode(cur), b = fr.bikes[i], f = fr.flags[i];
+                        return '<b>' + T.name[i] + '</b><br/>' + hours[cur] + '<br/>Vélos : <b>'
+                            + (b < 0 ? 'n/d' : b) + '</b>' + (f & 1 ? '<br/>⚠ anomalie' : '')
+                            + (f & 2 ? '<br/>⛔ bloquée ≥ 3 h' : '');
+                    }; })(i));
+                }
+                var ctl = L.control({position: "bottomleft"});
+                ctl.onAdd = function(){
+                    var d = L.DomUtil.create("div");
+                    d.style.cssText = "background:white;padding:8px 10px;border-radius:8px;"
+                        + "box-shadow:0 0 8px rgba(0,0,0,.25);font:13px sans-serif;min-width:320px";
+                    d.innerHTML = '<button type="button" style="margin-right:6px">▶</button>'
+                        + '<input type="range" min="0" max="' + (hours.length - 1) + '" step="1" style="width:220px;vertical-align:middle"/>'
+                        + '<div style="margin-top:4px"></div>';
+                    L.DomEvent.disableClickPropagation(d);
+                    L.DomEvent.disableScrollPropagation(d);
+                    return d;
+                };
+                ctl.addTo(map);
+                var box = ctl.getContainer(), btn = box.querySelector("button"),
+                    slider = box.querySelector("input"), label = box.querySelector("div");
+                var show = function(h){
+                    cur = h; slider.value = h;
+                    var fr = decode(h), nAnom = 0;
+                    for (var i = 0; i < n; i++) {
+                        var c = color(fr.bikes[i], fr.flags[i]);
+                        if (fr.flags[i] & 1) { nAnom++; }
+                        markers[i].setStyle({color: c, fillColor: c});
+                    }
+                    label.innerHTML = '<b>' + hours[h] + '</b> — ' + nAnom + ' anomalies';
+                };
+                slider.addEventListener("input", function(){ show(parseInt(slider.value, 10)); });
+                btn.addEventListener("click", function(){
+                    if (timer) { clearInterval(timer); timer = null; btn.textContent = "▶"; return; }
+                    btn.textContent = "⏸";
+                    timer = setInterval(function(){ show((cur + 1) % hours.length); }, {{ this.interval }});
+                });
+                show(hours.length - 1);
+                return layer;
+            })();
+        {% endmacro %}""")
+
+    def __init__(self, table, hours, frames, radius=5, interval=500, missing="#adb5bd"):
+        super().__init__()
+        self._name = "HourlyPlayback"
+        self.table = table
+        self.hours = list(hours)
+        self.frames = list(frames)
+        self.radius = radius
+        self.interval = interval
+        self.missing = missing
+        self.green, self.orange, self.red = GREEN, ORANGE, RED
@@ -3,11 +3,14 @@ import pandas as pd
 import folium
 from folium import FeatureGroup, Element
 from folium.plugins import (
-    MarkerCluster, HeatMap, MiniMap, Fullscreen,
+    HeatMap, MiniMap, Fullscreen,
     MeasureControl, LocateControl, Search
 )
 import webbrowser
 
+from map_layers import cluster_layer, color_by_bikes, geojson_layer, heat_points
+from schemas import parse_coords
+
 # ========= 1) Récupération en temps réel =========
 url = "https://opendata.paris.fr/api/records/1.0/search/"
 params = {
@@ -21,13 +24,8 @@ data = response.json()
 records = [r["fields"] for r in data.get("records", []) if "fields" in r]
 df = pd.DataFrame(records)
 
-# Nettoyer les coordonnées
-def parse_coords(coords):
-    if isinstance(coords, list) and len(coords) == 2:
-        return coords[0], coords[1]  # lat, lon
-    return None, None
-
-df["lat"], df["lon"] = zip(*df["coordonnees_geo"].apply(parse_coords))
+# Nettoyer les coordonnées ([lat, lon] → deux colonnes float64, vectorisé)
+df["lat"], df["lon"] = parse_coords(df["coordonnees_geo"])
 df = df.dropna(subset=["lat", "lon"])  # supprimer stations sans coord
 
 # ========= 2) Créer la carte =========
@@ -40,66 +38,27 @@ MiniMap(toggle_display=True).add_to(m)
 MeasureControl(primary_length_unit="meters").add_to(m)
 LocateControl().add_to(m)
 
-# ========= 3) Fonctions utiles =========
-def color_for(bikes: int) -> str:
-    if bikes == 0:
-        return "red"
-    elif bikes < 5:
-        return "orange"
-    return "green"
+# ========= 3) Colonnes d'affichage (vectorisé) =========
+df["name"] = df["name"].fillna("Inconnu")
+df["arrdt"] = df["nom_arrondissement_communes"].fillna("Inconnu")
+df["bikes"] = df["numbikesavailable"].fillna(0).astype(int)
+df["docks"] = df["numdocksavailable"].fillna(0).astype(int)
+POPUP = ("name", [("Arrondissement", "arrdt"), ("🚲 Vélos dispo", "bikes"), ("🅿️ Places libres", "docks")])
 
 # ========= 4) Calque Stations (clusters) =========
 fg_stations = FeatureGroup(name="Stations Vélib", show=True)
-cluster = MarkerCluster().add_to(fg_stations)
-
-for _, r in df.iterrows():
-    bikes = int(r.get("numbikesavailable", 0))
-    docks = int(r.get("numdocksavailable", 0))
-    name  = r.get("name", "Inconnu")
-    arrdt = r.get("nom_arrondissement_communes", "Inconnu")
-
-    popup_html = f"""
-    <div style="font-size:14px;line-height:1.4">
-      <b>{name}</b><br/>
-      Arrondissement: {arrdt}<br/>
-      🚲 Vélos dispo: <b>{bikes}</b><br/>
-      🅿️ Places libres: <b>{docks}</b>
-    </div>
-    """
-    folium.CircleMarker(
-        location=[r["lat"], r["lon"]],
-        radius=6,
-        color=color_for(bikes),
-        fill=True,
-        fill_color=color_for(bikes),
-        fill_opacity=0.95,
-        popup=folium.Popup(popup_html, max_width=260),
-    ).add_to(cluster)
-
+cluster_layer(df, ["name", "arrdt", "bikes", "docks"], color_by_bikes(df["bikes"]), POPUP).add_to(fg_stations)
 fg_stations.add_to(m)
 
 # ========= 5) Calque Heatmap =========
 fg_heat = FeatureGroup(name="Heatmap vélos", show=False)
-heat_pts = df[["lat", "lon", "numbikesavailable"]].dropna().values.tolist()
+heat_pts = heat_points(df, "bikes")
 HeatMap(heat_pts, radius=12, blur=18, max_zoom=15).add_to(fg_heat)
 fg_heat.add_to(m)
 
 # ========= 6) Recherche (GeoJson) =========
-features = []
-for _, r in df.iterrows():
-    features.append({
-        "type": "Feature",
-        "properties": {
-            "name": r.get("name", "Inconnu"),
-            "arrdt": r.get("nom_arrondissement_communes", "Inconnu"),
-            "bikes": int(r.get("numbikesavailable", 0)),
-            "docks": int(r.get("numdocksavailable", 0)),
-        },
-        "geometry": {"type": "Point", "coordinates": [float(r["lon"]), float(r["lat"])]}
-    })
-
-geojson = folium.GeoJson(
-    {"type": "FeatureCollection", "features": features},
+geojson = geojson_layer(
+    df, ["name", "arrdt", "bikes", "docks"],
     name="Recherche (GeoJson)",
     show=False,
     tooltip=folium.GeoJsonTooltip(
@@ -1,20 +1,14 @@
-import pandas as pd
 import folium
 from folium import FeatureGroup, Element
-from folium.plugins import MarkerCluster, HeatMap, MiniMap, Fullscreen, MeasureControl, LocateControl, Search
+from folium.plugins import HeatMap, MiniMap, Fullscreen, MeasureControl, LocateControl, Search
 import webbrowser
 
-# ========= 1) Charger les données (CSV filtré) =========
-df = pd.read_csv("velib_filtre.csv")
-
-# Parse coordonnées "[lat, lon]" -> (lat, lon)
-def parse_coords(s):
-    s = str(s).strip().replace("[", "").replace("]", "")
-    lat_str, lon_str = [x.strip() for x in s.split(",")]
-    return float(lat_str), float(lon_str)
+from map_layers import cluster_layer, color_by_bikes, geojson_layer, heat_points
+from schemas import read_stations
 
-df = df.dropna(subset=["coordonnees_geo"]).copy()
-df[["lat", "lon"]] = df["coordonnees_geo"].apply(lambda x: pd.Series(parse_coords(x)))
+# ========= 1) Charger les données (CSV filtré) =========
+# types de schemas.STATIONS ; coordonnées "[lat, lon]" -> (lat, lon), vectorisé
+df = read_stations("velib_filtre.csv").dropna(subset=["lat", "lon"])
 
 # ========= 2) Carte de base + plugins =========
 m = folium.Map(location=[48.8566, 2.3522], zoom_start=12, tiles="cartodbpositron", control_scale=True)
@@ -23,49 +17,21 @@ MiniMap(toggle_display=True).add_to(m)
 MeasureControl(primary_length_unit="meters").add_to(m)
 LocateControl().add_to(m)
 
-# ========= 3) Couleur selon nb vélos =========
-def color_for(bikes: int) -> str:
-    if bikes == 0:
-        return "red"
-    elif bikes < 5:
-        return "orange"
-    return "green"
+# ========= 3) Colonnes d'affichage (vectorisé) =========
+df["name"] = df["name"].fillna("Inconnu")
+df["arrdt"] = df["nom_arrondissement_communes"].fillna("Inconnu")
+df["bikes"] = df["numbikesavailable"].fillna(0).astype(int)
+df["docks"] = df["numdocksavailable"].fillna(0).astype(int)
+POPUP = ("name", [("Arrondissement", "arrdt"), ("🚲 Vélos dispo", "bikes"), ("🅿️ Places libres", "docks")])
 
 # ========= 4) CLUSTERS de stations =========
 fg_stations = FeatureGroup(name="Stations (clusters)", show=True)
-cluster = MarkerCluster().add_to(fg_stations)
-
-for _, r in df.iterrows():
-    bikes = int(r.get("numbikesavailable", 0))
-    docks = int(r.get("numdocksavailable", 0))
-    name  = r.get("name", "Inconnu")
-    arrdt = r.get("nom_arrondissement_communes", "Inconnu")
-    lat, lon = r["lat"], r["lon"]
-
-    popup_html = f"""
-    <div style="font-size:14px;line-height:1.4">
-      <b>{name}</b><br/>
-      Arrondissement: {arrdt}<br/>
-      🚲 Vélos dispo: <b>{bikes}</b><br/>
-      🅿️ Places libres: <b>{docks}</b>
-    </div>
-    """
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=6,
-        color=color_for(bikes),
-        fill=True,
-        fill_color=color_for(bikes),
-        fill_opacity=0.95,
-        popup=folium.Popup(popup_html, max_width=260),
-        # 👉 astuce: on stocke le nom pour la recherche (via GeoJson plus bas)
-    ).add_to(cluster)
-
+cluster_layer(df, ["name", "arrdt", "bikes", "docks"], color_by_bikes(df["bikes"]), POPUP).add_to(fg_stations)
 fg_stations.add_to(m)
 
 # ========= 5) HEATMAP (intensité vélos) =========
 fg_heat = FeatureGroup(name="Heatmap vélos", show=False)
-heat_pts = df[["lat", "lon", "numbikesavailable"]].dropna().values.tolist()
+heat_pts = heat_points(df, "bikes")
 HeatMap(heat_pts, radius=12, blur=18, max_zoom=15).add_to(fg_heat)
 fg_heat.add_to(m)
 
@@ -73,26 +39,9 @@ fg_heat.add_to(m)
 folium.LayerControl(collapsed=False).add_to(m)
 
 # ========= 7) RECHERCHE (par nom de station) =========
-# Pour la recherche, on crée une couche GeoJson avec une propriété "name".
-import json
-features = []
-for _, r in df.iterrows():
-    features.append({
-        "type": "Feature",
-        "properties": {
-            "name": r.get("name", "Inconnu"),
-            "arrdt": r.get("nom_arrondissement_communes", "Inconnu"),
-            "bikes": int(r.get("numbikesavailable", 0)),
-            "docks": int(r.get("numdocksavailable", 0)),
-        },
-        "geometry": {
-            "type": "Point",
-            "coordinates": [float(r["lon"]), float(r["lat"])]
-        }
-    })
-
-geojson = folium.GeoJson(
-    {"type": "FeatureCollection", "features": features},
+# Pour la recherche, on réutilise une couche GeoJson avec une propriété "name".
+geojson = geojson_layer(
+    df, ["name", "arrdt", "bikes", "docks"],
     name="Recherche (GeoJson caché)",
     show=False,  # on n'affiche pas cette couche, on l'utilise pour Search
     tooltip=folium.GeoJsonTooltip(fields=["name", "arrdt", "bikes", "docks"],
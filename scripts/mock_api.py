@@ -0,0 +1,89 @@
+"""Serveur local imitant l'API records 1.0 d'opendata.paris.fr (tests hors-ligne).
+
+Usage (dump .json ou .json.gz) :
+    python mock_api.py ../raw/data_velib_20250817_174812.json --port 8765
+    VELIB_API_URL=http://127.0.0.1:8765/api/records/1.0/search/ python collect_historique.py
+
+Ou depuis Python (fixture) :
+    server, url = serve_in_thread("../raw/data_velib_20250817_174812.json")
+    fields = collect_historique.fetch_all(rows=100, url=url)
+    server.shutdown()
+"""
+import argparse
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from backfill import load_dump
+
+SEARCH_PATH = "/api/records/1.0/search/"
+
+def load_records(dump_path):
+    """Charger les enregistrements d'un dump brut (data_velib_*.json[.gz])."""
+    return load_dump(dump_path).get("records", [])
+
+def make_handler(records):
+    """Handler HTTP paginant `records` comme l'API (rows/start, nhits, gzip)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+        hits = []  # (start, rows) de chaque requête, pour les vérifications
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != SEARCH_PATH:
+                self.send_error(404)
+                return
+            q = parse_qs(url.query)
+            start = int(q.get("start", ["0"])[0])
+            rows = int(q.get("rows", ["10"])[0])
+            Handler.hits.append((start, rows))
+
+            payload = {
+                "nhits": len(records),
+                "parameters": {"dataset": q.get("dataset", [""])[0], "rows": rows,
+                               "start": start, "format": "json", "timezone": "UTC"},
+                "records": records[start:start + rows],
+            }
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            gz = "gzip" in self.headers.get("Accept-Encoding", "")
+            if gz:
+                body = gzip.compress(body)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            if gz:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):  # silencieux
+            pass
+
+    return Handler
+
+def serve_in_thread(dump_path, host="127.0.0.1", port=0):
+    """Démarrer le serveur dans un thread → (server, url de l'API)."""
+    server = ThreadingHTTPServer((host, port), make_handler(load_records(dump_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{SEARCH_PATH}"
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock local de l'API Vélib")
+    ap.add_argument("dump", help="fichier data_velib_*.json servi par le mock")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(load_records(args.dump)))
+    print(f"🧪 Mock API : http://{args.host}:{args.port}{SEARCH_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
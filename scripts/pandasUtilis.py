@@ -1,15 +1,16 @@
-import json, glob, os
+import glob, os
 import pandas as pd
 
+from backfill import load_dump
+
 # Prendre le dernier fichier data_velib_*.json trouvé
-files = glob.glob("data_velib_*.json")
+files = glob.glob("data_velib_*.json") + glob.glob("data_velib_*.json.gz")
 if not files:
     raise FileNotFoundError("Aucun JSON trouvé. Lance d’abord le script de récupération.")
 latest = max(files, key=os.path.getmtime)
 print("Lecture :", latest)
 
-with open(latest, "r", encoding="utf-8") as f:
-    data = json.load(f)
+data = load_dump(latest)  # .json ou .json.gz
 
 records = data.get("records", [])
 rows = []
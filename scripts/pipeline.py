@@ -0,0 +1,285 @@
+"""Orchestrateur du pipeline : étapes déclarées en DAG, saut par empreinte, branches parallèles.
+
+Chaque étape déclare ses entrées et ses sorties (chemins absolus sous
+BASE_DIR, passés explicitement aux scripts) ; les dépendances s'en déduisent
+(une étape dépend de celle qui produit l'une de ses entrées) :
+
+    collect ─▶ aggregate ─▶ prepare ─▶ kpis ─▶ dashboard
+                   │                            ▲
+                   ├──────▶ anomalies ─▶ maps   │ (kpis + parquet)
+                   └──────▶ cube
+
+- saut : empreinte SHA-256 du contenu des entrées + du code de l'étape + de
+  sa commande ; inchangée (et sorties présentes) → l'étape n'est pas relancée.
+  Le code d'une étape = ses scripts + les modules de scripts/ qu'ils importent
+  (fermeture calculée par analyse des imports, jamais une liste à tenir à jour).
+  Les empreintes de fichiers sont mises en cache par (taille, mtime) : un
+  fichier non modifié n'est jamais relu, un second passage ne coûte que des
+  `stat` ; le cache ne garde que les fichiers encore lus et l'état est écrit
+  une fois, en fin de lancement
+- parallélisme : toute étape dont les dépendances sont terminées est lancée
+  (anomalies, KPIs et cartes tournent en même temps)
+- échec : les étapes en aval sont annulées, code de sortie 1
+
+État : `data/pipeline_state.json`.
+
+Usage :
+    python scripts/pipeline.py                    # tout (sauf collect), en sautant l'inchangé
+    python scripts/pipeline.py --with-collect     # avec une collecte API en tête
+    python scripts/pipeline.py --stages anomalies maps --force
+    python scripts/pipeline.py --dry-run          # ce qui serait lancé / sauté
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BASE_DIR, "scripts")
+DATA_DIR = os.path.join(BASE_DIR, "data")
+OUTPUT_DIR = os.path.join(BASE_DIR, "outputs")
+STATE_FILE = os.path.join(DATA_DIR, "pipeline_state.json")
+
+HISTORY = os.path.join(DATA_DIR, "history")
+HOURLY_DIR = os.path.join(DATA_DIR, "hourly")
+HOURLY_CSV = os.path.join(DATA_DIR, "historique_hourly.csv")
+HOURLY_PARQUET = os.path.join(DATA_DIR, "historique_hourly.parquet")
+KPI_STATE = os.path.join(DATA_DIR, "kpi_state.json")
+CUBE_DIR = os.path.join(DATA_DIR, "cube")
+ANOMALIES_CSV = os.path.join(BASE_DIR, "anomalies_velib.csv")
+KPI_CSVS = [os.path.join(OUTPUT_DIR, f) for f in
+            ("kpi_heures_de_pointe.csv", "kpi_saturation_arrondissement.csv", "kpi_top_stations_vides.csv")]
+MAPS_DIR = os.path.join(OUTPUT_DIR, "maps")
+
+class Stage:
+    """Une étape : commande (scripts/…) + entrées/sorties déclarées."""
+
+    def __init__(self, name, scripts, commands, inputs, outputs, always=False, force_args=()):
+        self.name = name
+        self.scripts = scripts          # scripts de l'étape (+ imports locaux, voir code_closure)
+        self.commands = commands        # [[script, *args], ...] exécutées en séquence
+        self.inputs = inputs
+        self.outputs = outputs
+        self.always = always            # pas d'entrée locale (ex. API) → toujours relancée
+        self.force_args = list(force_args)  # ajoutés à la 1re commande avec --force (état interne à vider)
+
+def stages():
+    py = lambda name: os.path.join(SCRIPTS_DIR, name)
+    return [
+        Stage("collect", [py("collect_historique.py")], [[py("collect_historique.py")]],
+              [], [HISTORY], always=True),
+        # backfill.py écrit le même store : un changement de son format doit ré-agréger
+        Stage("aggregate", [py("aggregate_hourly.py"), py("backfill.py")],
+              [[py("aggregate_hourly.py"), "--incremental", "--out", HOURLY_CSV]], [HISTORY],
+              [HOURLY_CSV, HOURLY_DIR], force_args=["--rebuild"]),
+        # cube station × heure (lu par forecast.py), tenu à jour depuis le stockage horaire
+        Stage("cube", [py("cube.py")], [[py("cube.py"), "update"]], [HOURLY_DIR], [CUBE_DIR],
+              force_args=["--rebuild"]),
+        Stage("prepare", [py("prepare_data.py")],
+              [[py("prepare_data.py"), "--input", HOURLY_CSV, "--output", HOURLY_PARQUET]],
+              [HOURLY_CSV], [HOURLY_PARQUET]),
+        Stage("anomalies", [py("detect_anomalies.py")],
+              [[py("detect_anomalies.py"), "--input", HOURLY_CSV, "--output", ANOMALIES_CSV]],
+              [HOURLY_CSV], [ANOMALIES_CSV]),
+        Stage("kpis", [py("compute_kpis.py")],
+              [[py("compute_kpis.py"), "--input", HOURLY_PARQUET]], [HOURLY_PARQUET],
+              KPI_CSVS + [KPI_STATE], force_args=["--rebuild"]),
+        Stage("dashboard", [py("dashboard_artifacts.py")], [[py("dashboard_artifacts.py")]],
+              [HOURLY_PARQUET] + KPI_CSVS[:2], [os.path.join(OUTPUT_DIR, "dashboard", "CURRENT")]),
+        Stage("maps", [py("map_anomalies_ultra.py"), py("map_history.py")],
+              [[py("map_anomalies_ultra.py"), "--input", ANOMALIES_CSV,
+                "--out", os.path.join(MAPS_DIR, "map_anomalies_ultra.html"), "--no-open"],
+               [py("map_history.py"), "--input", ANOMALIES_CSV,
+                "--out", os.path.join(MAPS_DIR, "map_history.html"), "--no-open"]],
+              [ANOMALIES_CSV], [os.path.join(MAPS_DIR, "map_anomalies_ultra.html"),
+                                os.path.join(MAPS_DIR, "map_history.html")]),
+    ]
+
+def code_closure(scripts):
+    """Scripts + modules de scripts/ importés, directement ou non (imports paresseux compris)."""
+    seen, todo = [], list(scripts)
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.append(path)
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            todo += [os.path.join(SCRIPTS_DIR, n.split(".")[0] + ".py") for n in names]
+    return sorted(seen)
+
+def dependencies(dag):
+    """{étape: {étapes dont elle consomme une sortie}} (préfixe de chemin pour les dossiers)."""
+    producers = {out: s.name for s in dag for out in s.outputs}
+    deps = {}
+    for s in dag:
+        deps[s.name] = {p for out, p in producers.items() for inp in s.inputs
+                        if p != s.name and (inp == out or inp.startswith(out + os.sep))}
+    return deps
+
+# ---------- empreintes ----------
+class Hasher:
+    """SHA-256 de fichiers/dossiers, avec cache (taille, mtime_ns) → empreinte."""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.used = set()  # fichiers lus pendant ce lancement
+
+    def file(self, path):
+        self.used.add(path)
+        st = os.stat(path)
+        key = f"{st.st_size}:{st.st_mtime_ns}"
+        hit = self.cache.get(path)
+        if hit and hit[0] == key:
+            return hit[1]
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        self.cache[path] = [key, h.hexdigest()]
+        return h.hexdigest()
+
+    def prune(self, keep_existing=False):
+        """Oublier les fichiers non lus pendant ce lancement (ou, avec `keep_existing`, disparus)."""
+        for path in list(self.cache):
+            if path not in self.used and not (keep_existing and os.path.exists(path)):
+                del self.cache[path]
+
+    def path(self, path):
+        if not os.path.exists(path):
+            return "absent"
+        if os.path.isfile(path):
+            return self.file(path)
+        h = hashlib.sha256()
+        for d, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".tmp"):
+                    continue
+                full = os.path.join(d, name)
+                h.update(os.path.relpath(full, path).encode())
+                h.update(self.file(full).encode())
+        return h.hexdigest()
+
+    def stage(self, s):
+        h = hashlib.sha256()
+        for part in [json.dumps(s.commands)] + [self.path(p) for p in code_closure(s.scripts) + s.inputs]:
+            h.update(part.encode())
+        return h.hexdigest()
+
+def load_state(path=STATE_FILE):
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, separators=(",", ":"), sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+# ---------- exécution ----------
+def run_stage(s, force=False):
+    """Lancer les commandes de l'étape (cwd = BASE_DIR) → (ok, secondes, sortie)."""
+    for out in s.outputs:
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    t0 = time.perf_counter()
+    logs = []
+    commands = [s.commands[0] + s.force_args] + s.commands[1:] if force else s.commands
+    for cmd in commands:
+        proc = subprocess.run([sys.executable] + cmd, cwd=BASE_DIR, capture_output=True, text=True)
+        logs.append(proc.stdout + proc.stderr)
+        if proc.returncode != 0:
+            return False, time.perf_counter() - t0, "".join(logs)
+    return True, time.perf_counter() - t0, "".join(logs)
+
+def run(selected=None, force=False, workers=3, dry_run=False, with_collect=False):
+    dag = [s for s in stages() if with_collect or s.name != "collect"]
+    by_name = {s.name: s for s in dag}
+    deps = dependencies(dag)
+    wanted = set(selected or by_name)
+    state = load_state()
+    hasher = Hasher(state["files"])
+
+    done, failed, pending = set(), set(), [s.name for s in dag if s.name in wanted]
+    # dépendances hors sélection : considérées à jour
+    done |= set(by_name) - wanted
+    status = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while pending or running:
+                for name in list(pending):
+                    if deps[name] & failed:
+                        pending.remove(name)
+                        failed.add(name)
+                        status[name] = "annulée (amont en échec)"
+                        continue
+                    if not deps[name] <= done:
+                        continue
+                    pending.remove(name)
+                    s = by_name[name]
+                    digest = hasher.stage(s)
+                    prev = state["stages"].get(name, {})
+                    fresh = (not force and not s.always and prev.get("digest") == digest
+                             and all(os.path.exists(o) for o in s.outputs))
+                    if fresh or dry_run:
+                        status[name] = "à jour (sautée)" if fresh else "à lancer"
+                        done.add(name)
+                        print(f"⏭️  {name:<10} {status[name]}")
+                        continue
+                    print(f"▶️  {name:<10} lancée")
+                    running[pool.submit(run_stage, s, force)] = (name, digest)
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name, digest = running.pop(fut)
+                    ok, seconds, log = fut.result()
+                    if ok:
+                        done.add(name)
+                        state["stages"][name] = {"digest": digest, "seconds": round(seconds, 3),
+                                                 "finished": time.strftime("%Y-%m-%dT%H:%M:%S")}
+                        status[name] = f"ok ({seconds:.1f} s)"
+                        print(f"✅ {name:<10} {status[name]}")
+                    else:
+                        failed.add(name)
+                        status[name] = "échec"
+                        print(f"❌ {name:<10} échec ({seconds:.1f} s)\n{log.strip()[-2000:]}")
+    finally:
+        # une seule écriture, même après une interruption ; cache réduit aux
+        # fichiers encore lus (ceux des étapes hors sélection sont gardés)
+        if not dry_run:
+            hasher.prune(keep_existing=selected is not None)
+            save_state(state)
+    return status, not failed
+
+def main():
+    ap = argparse.ArgumentParser(description="Orchestrateur du pipeline Vélib (DAG, saut par empreinte)")
+    ap.add_argument("--stages", nargs="*", default=None, help="sous-ensemble d'étapes (défaut : toutes)")
+    ap.add_argument("--force", action="store_true", help="relancer même si les entrées n'ont pas changé")
+    ap.add_argument("--workers", type=int, default=3, help="étapes indépendantes en parallèle")
+    ap.add_argument("--with-collect", action="store_true", help="inclure la collecte API (toujours relancée)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    t0 = time.perf_counter()
+    _, ok = run(args.stages, args.force, args.workers, args.dry_run, args.with_collect)
+    print(f"{'🎉' if ok else '⚠️'} Pipeline terminé en {time.perf_counter() - t0:.2f} s")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
+import argparse
 import os
-import pandas as pd
+
+import schemas
+from hourly_store import HourlyParquetWriter, write_hourly_parquet
 
 # 🔧 Chemins absolus automatiques
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -8,14 +11,70 @@ DATA_DIR = os.path.join(BASE_DIR, "data")
 IN_CSV      = os.path.join(DATA_DIR, "historique_hourly.csv")
 OUT_PARQUET = os.path.join(DATA_DIR, "historique_hourly.parquet")
 
+ap = argparse.ArgumentParser(description="CSV horaire → Parquet horaire optimisé")
+ap.add_argument("--input", default=IN_CSV)
+ap.add_argument("--output", default=OUT_PARQUET)
+ap.add_argument("--chunked", action="store_true",
+                help="lecture par blocs, mémoire bornée (CSV trié par heure : aggregate_hourly.py --chunked)")
+ap.add_argument("--chunksize", type=int, default=200_000, help="lignes CSV par bloc (--chunked)")
+args = ap.parse_args()
+IN_CSV, OUT_PARQUET = args.input, args.output
+
 print("📍 Dossier base :", BASE_DIR)
 print("📍 Recherche CSV ici :", IN_CSV)
 
 if not os.path.exists(IN_CSV):
     raise FileNotFoundError(f"❌ Introuvable : {IN_CSV}. Lance l’agrégation d’abord.")
 
-# 1) Charger CSV
-df = pd.read_csv(IN_CSV, parse_dates=["ts_hour"])
+def prepare_chunked(path, out, chunksize):
+    """Vérifs qualité + dédoublonnage + Parquet, un bloc de lignes à la fois.
+
+    L'entrée doit être triée par heure : seules les clés de la dernière heure
+    vue sont gardées d'un bloc au suivant (un doublon ne peut pas être plus
+    loin), une heure antérieure qui réapparaît lève une erreur.
+    """
+    stations, n_rows, n_invalid, n_dup = set(), 0, 0, 0
+    last_hour, last_keys = None, set()
+    writer = HourlyParquetWriter(out)
+    for chunk in schemas.read_hourly(path, chunksize=chunksize):
+        if last_hour is not None and chunk["ts_hour"].min() < last_hour:
+            raise ValueError(f"❌ {path} n'est pas trié par heure (relancer sans --chunked, "
+                             "ou produire le CSV avec aggregate_hourly.py --chunked).")
+        n_rows += len(chunk)
+        stations.update(chunk["stationcode"].unique())
+        n_invalid += int((chunk["lat"].isna() | chunk["lon"].isna()).sum())
+
+        dup = chunk.duplicated(subset=["stationcode", "ts_hour"])
+        if last_keys:
+            carried = chunk["ts_hour"] == last_hour
+            dup |= carried & chunk["stationcode"].isin(last_keys)
+        n_dup += int(dup.sum())
+        chunk = chunk[~dup]
+        if chunk.empty:
+            continue
+        writer.write(chunk)
+
+        hour = chunk["ts_hour"].max()
+        keys = set(chunk.loc[chunk["ts_hour"] == hour, "stationcode"])
+        last_keys = last_keys | keys if hour == last_hour else keys
+        last_hour = hour
+    n_written = writer.close()
+    print(f"📥 Lu par blocs de {chunksize:,} : {path} | {n_rows:,} lignes")
+    print("\n🔎 Vérifications qualité :")
+    print(f"  • Stations uniques : {len(stations)}")
+    print(f"  • Coordonnées invalides : {n_invalid}")
+    print(f"  • Doublons trouvés : {n_dup}")
+    if n_dup:
+        print(f"    ✅ Doublons supprimés → {n_written:,} lignes restantes")
+    print(f"\n✅ Fichier Parquet écrit : {out}")
+
+if args.chunked:
+    os.makedirs(os.path.dirname(os.path.abspath(OUT_PARQUET)), exist_ok=True)
+    prepare_chunked(IN_CSV, OUT_PARQUET, args.chunksize)
+    raise SystemExit(0)
+
+# 1) Charger CSV (types de schemas.HOURLY)
+df = schemas.read_hourly(IN_CSV)
 print(f"📥 Chargé : {IN_CSV} | {len(df):,} lignes")
 
 # 2) Quality checks
@@ -38,7 +97,7 @@ if dup.any():
     df = df[~dup]
     print(f"    ✅ Doublons supprimés → {len(df):,} lignes restantes")
 
-# 3) Sauvegarde en Parquet
+# 3) Sauvegarde en Parquet (trié, row groups ≈ 1 jour, stats + dictionnaires)
 os.makedirs(DATA_DIR, exist_ok=True)  # crée le dossier data s’il manque
-df.to_parquet(OUT_PARQUET, index=False)
+write_hourly_parquet(df, OUT_PARQUET)
 print(f"\n✅ Fichier Parquet écrit : {OUT_PARQUET}")
\ No newline at end of file
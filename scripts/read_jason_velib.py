@@ -1,15 +1,15 @@
-import json, glob, os
+import glob, os
+from backfill import load_dump
 
 # 1. Trouver le dernier fichier JSON généré
-files = glob.glob("data_velib_*.json")
+files = glob.glob("data_velib_*.json") + glob.glob("data_velib_*.json.gz")
 if not files:
     raise FileNotFoundError("❌ Aucun fichier data_velib_*.json trouvé. Lance d’abord recuperationDonnes.py")
 latest = max(files, key=os.path.getmtime)
 print("📂 Lecture du fichier :", latest)
 
 # 2. Charger le fichier JSON
-with open(latest, "r", encoding="utf-8") as f:
-    data = json.load(f)
+data = load_dump(latest)  # .json ou .json.gz
 
 # 3. Récupérer la liste des enregistrements (stations)
 records = data.get("records", [])
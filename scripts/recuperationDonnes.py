@@ -1,4 +1,5 @@
 import requests
+import gzip
 import json
 from datetime import datetime
 
@@ -12,9 +13,10 @@ resp = requests.get(BASE_URL, params=params, timeout=20)
 resp.raise_for_status()  # lève une erreur si l’API répond 4xx/5xx
 data = resp.json()
 
-filename = f"data_velib_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-with open(filename, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+# JSON compact + gzip (≈10x plus petit que l'ancien indent=2)
+filename = f"data_velib_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json.gz"
+with gzip.open(filename, "wt", encoding="utf-8") as f:
+    json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
 
 print(f"✅ Données Vélib sauvegardées dans {filename}")
 print("📊 Nb d'enregistrements reçus :", len(data.get("records", [])))
@@ -0,0 +1,182 @@
+"""Schémas typés des jeux de données + chargeurs/écrivains communs à tous les scripts.
+
+Quatre jeux de données circulent entre les scripts :
+
+    RAW        snapshots bruts        (historique_velib.csv, collecte)
+    HOURLY     agrégats horaires      (historique_hourly.csv / .parquet)
+    ANOMALIES  sortie de la détection (anomalies_velib.csv, anomalies_live.csv)
+    STATIONS   relevé brut de l'API   (velib_propre.csv / velib_filtre.csv)
+
+Un seul jeu de types pour tous :
+
+- chaînes répétées (stationcode, name, arrdt) → `category` ; stationcode est
+  TOUJOURS une chaîne. Les catégories sont dans l'ordre de `sort_codes` (codes
+  numériques par valeur) : trier ou grouper sur la colonne donne le même ordre
+  qu'avec les anciens stationcode entiers
+- compteurs → int16 (Int16 nullable s'il manque des valeurs)
+- coordonnées et mesures → float64 : les valeurs relues puis réécrites (Parquet,
+  anomalies) restent celles du CSV, au chiffre près
+- horodatages → datetime64 UTC natif, parsés en une passe vectorisée (ISO 8601)
+
+`read_csv` / `read_hourly` / `read_anomalies` / `read_raw` / `read_stations`
+lisent directement dans ces types (catégories et flottants dès le parseur CSV, pas de colonne
+`object` intermédiaire) ; `apply_schema` remet un DataFrame quelconque au
+schéma (Parquet ancien, sortie d'un calcul) ; `write_csv` écrit atomiquement.
+`parse_coords` découpe les coordonnées « [lat, lon] » de l'API sans boucle.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+TS = "datetime64[us, UTC]"
+CSV_ENCODING = "utf-8-sig"
+FLOAT32_DECIMALS = 6  # float32 → float64 : ~7 chiffres significatifs, 6 décimales (≈ 0,1 m en degrés)
+
+RAW = {
+    "ts": TS,
+    "stationcode": "category",
+    "name": "category",
+    "arrdt": "category",
+    "lat": "float64",
+    "lon": "float64",
+    "bikes": "int16",
+    "docks": "int16",
+    "mechanical": "int16",
+    "ebikes": "int16",
+}
+
+HOURLY = {
+    "stationcode": "category",
+    "name": "category",
+    "arrdt": "category",
+    "lat": "float64",
+    "lon": "float64",
+    "ts_hour": TS,
+    "bikes_mean": "float64",
+    "bikes_median": "float64",
+    "docks_mean": "float64",
+}
+
+ANOMALIES = {
+    "ts_hour": TS,
+    **{c: t for c, t in HOURLY.items() if c != "ts_hour"},
+    "roll_med": "float64",
+    "roll_iqr": "float64",
+    "anomaly_score": "float64",
+    "is_anomaly": "bool",
+    "is_blocked_now": "bool",
+    "blocked_run_len": "int16",
+    "is_blocked_3h": "bool",
+    "neigh_dev": "float64",
+    "spatial_score": "float64",
+    "is_spatial_anomaly": "bool",
+}
+
+# Champs de l'API tels quels ; lat/lon sont tirés de `coordonnees_geo` à la lecture
+STATIONS = {
+    "stationcode": "category",
+    "numbikesavailable": "int16",
+    "numdocksavailable": "int16",
+    "lat": "float64",
+    "lon": "float64",
+}
+
+SCHEMAS = {"raw": RAW, "hourly": HOURLY, "anomalies": ANOMALIES, "stations": STATIONS}
+
+def sort_codes(values):
+    """Valeurs triées, les chaînes numériques par valeur (« 9020 » avant « 10001 »), les autres ensuite."""
+    idx = pd.Index(values)
+    keys = pd.DataFrame({"num": np.asarray(pd.to_numeric(idx, errors="coerce"), dtype=float),
+                         "txt": np.asarray(idx.astype(str), dtype=object)})
+    return idx[keys.sort_values(["num", "txt"], kind="stable").index.to_numpy()]
+
+def _as_category(s):
+    """Chaîne catégorielle, catégories dans l'ordre de `sort_codes` (codes numériques → chaînes)."""
+    if not isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.where(s.isna(), s.astype(str)).astype("category")
+    elif not pd.api.types.is_string_dtype(s.cat.categories):
+        s = s.cat.rename_categories(s.cat.categories.astype(str))
+    cats = s.cat.categories
+    order = sort_codes(cats)
+    if not order.equals(cats):
+        s = s.cat.reorder_categories(order)
+    return s
+
+def _as_ts(s):
+    if not isinstance(s.dtype, pd.DatetimeTZDtype):
+        s = pd.to_datetime(s, utc=True, format="ISO8601")
+    return s.astype(TS)
+
+def apply_schema(df, schema):
+    """Convertir les colonnes présentes de `df` aux types de `schema` (les autres sont laissées)."""
+    out = df.copy()
+    for col, dtype in schema.items():
+        if col not in out.columns:
+            continue
+        s = out[col]
+        if dtype == TS:
+            out[col] = _as_ts(s)
+        elif dtype == "category":
+            out[col] = _as_category(s)
+        elif dtype == "bool":
+            out[col] = s.fillna(False).astype(bool) if s.dtype != bool else s
+        elif s.dtype == np.float32 and dtype == "float64":
+            # float32 (coordonnées du store d'historique) : arrondi explicite,
+            # 48.870773 et non ses faux chiffres 48.87077331542969
+            out[col] = np.round(s.astype(dtype), FLOAT32_DECIMALS)
+        elif dtype.startswith("int"):
+            out[col] = s.astype(dtype) if not s.isna().any() else s.astype(dtype.capitalize())
+        else:
+            out[col] = s.astype(dtype)
+    return out
+
+def _csv_dtypes(schema, columns=None):
+    """Types passés au parseur CSV : catégories et flottants directement, le reste après."""
+    return {c: t for c, t in schema.items()
+            if (columns is None or c in columns) and (t == "category" or t.startswith("float"))}
+
+def read_csv(path, schema, columns=None, chunksize=None):
+    """Lire un CSV dans les types de `schema` (itérateur de blocs si `chunksize`)."""
+    reader = pd.read_csv(path, usecols=columns, dtype=_csv_dtypes(schema, columns),
+                         chunksize=chunksize, encoding=CSV_ENCODING)
+    if chunksize is None:
+        return apply_schema(reader, schema)
+    return (apply_schema(chunk, schema) for chunk in reader)
+
+def read_raw(path, columns=None, chunksize=None):
+    return read_csv(path, RAW, columns, chunksize)
+
+def read_hourly(path, columns=None, chunksize=None):
+    """Agrégats horaires depuis le CSV ou le Parquet consolidé (selon l'extension)."""
+    if path.endswith(".parquet"):
+        return apply_schema(pd.read_parquet(path, columns=columns), HOURLY)
+    return read_csv(path, HOURLY, columns, chunksize)
+
+def read_anomalies(path, columns=None):
+    return read_csv(path, ANOMALIES, columns)
+
+def read_stations(path):
+    """Relevé de l'API (velib_propre.csv / velib_filtre.csv), avec colonnes lat/lon."""
+    df = read_csv(path, STATIONS)
+    if "coordonnees_geo" in df.columns:
+        df["lat"], df["lon"] = parse_coords(df["coordonnees_geo"])
+    return df
+
+def write_csv(df, path, schema=None):
+    """Écrire un CSV (colonnes du schéma, dans son ordre, si fourni) de façon atomique."""
+    if schema is not None:
+        df = df[[c for c in schema if c in df.columns]]
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    df.to_csv(path + ".tmp", index=False, encoding=CSV_ENCODING)
+    os.replace(path + ".tmp", path)
+
+def parse_coords(coords):
+    """Coordonnées de l'API (liste [lat, lon] ou chaîne "[lat, lon]") → (lat, lon) float64.
+
+    Vectorisé : une seule passe regex sur la colonne ; entrée invalide → NaN.
+    """
+    parts = coords.astype(str).str.extract(r"^\s*\[?\s*(-?[\d.eE+-]+)\s*,\s*(-?[\d.eE+-]+)\s*\]?\s*$")
+    lat = pd.to_numeric(parts[0], errors="coerce").astype(np.float64).rename("lat")
+    lon = pd.to_numeric(parts[1], errors="coerce").astype(np.float64).rename("lon")
+    return lat, lon
@@ -0,0 +1,105 @@
+"""Exécution multi-cœurs des étapes « par station » (anomalies, agrégation horaire).
+
+Les stations sont réparties en shards contigus (données triées par station,
+shards équilibrés en nombre de lignes). L'entrée est écrite UNE fois en
+Arrow IPC non compressé ; chaque worker l'ouvre en memory-map et découpe sa
+tranche sans copie, au lieu de recevoir un DataFrame picklé. Les résultats
+sont concaténés dans l'ordre des shards → sortie déterministe.
+
+Mesure du passage à l'échelle :
+    python sharding.py anomalies historique_hourly.csv --max-workers 8
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+def shard_bounds(keys, n_shards):
+    """Découper des clés triées en ≤ n_shards plages [début, fin) alignées sur les stations."""
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return []
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])  # début de chaque station
+    targets = np.linspace(0, len(keys), n_shards + 1)[1:-1]
+    cuts = np.unique(starts[np.searchsorted(starts, targets)].clip(0, len(keys))) if len(targets) else []
+    edges = [0] + [int(c) for c in cuts if 0 < c < len(keys)] + [len(keys)]
+    return list(zip(edges[:-1], edges[1:]))
+
+def _run_shard(args):
+    """(worker) Lire sa tranche en memory-map et appliquer `func`."""
+    path, start, stop, func, kwargs = args
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all().slice(start, stop - start)
+        df = table.to_pandas()
+    return func(df, **kwargs)
+
+def run_sharded(df, key, func, workers=None, **kwargs):
+    """Appliquer `func(df_shard, **kwargs)` par groupes de stations, en parallèle.
+
+    `df` est trié par `key` ; `func` doit être une fonction de module
+    (picklable) et traiter chaque station indépendamment des autres.
+    """
+    workers = workers or os.cpu_count() or 1
+    df = df.sort_values(key, kind="stable").reset_index(drop=True)
+    if workers == 1:
+        return func(df, **kwargs)
+
+    bounds = shard_bounds(df[key].to_numpy(), workers)
+    tmp = tempfile.mkdtemp(prefix="velib_shards_")
+    try:
+        path = os.path.join(tmp, "input.arrow")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_run_shard, [(path, a, b, func, kwargs) for a, b in bounds]))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return pd.concat(parts, ignore_index=True)
+
+def scaling_report(df, key, func, max_workers, **kwargs):
+    """Temps de `run_sharded` pour 1, 2, 4, … workers → liste de dicts."""
+    counts = sorted({1, *[2 ** i for i in range(1, max_workers.bit_length())], max_workers})
+    rows, base = [], None
+    for w in counts:
+        t = time.perf_counter()
+        run_sharded(df, key, func, workers=w, **kwargs)
+        dt = time.perf_counter() - t
+        base = base or dt
+        rows.append({"workers": w, "seconds": round(dt, 3), "speedup": round(base / dt, 2),
+                     "rows_per_s": int(len(df) / dt) if dt else None})
+    return rows
+
+def main():
+    from anomaly_engine import compute_anomalies
+    import hourly_store
+    import history_store
+    import schemas
+
+    ap = argparse.ArgumentParser(description="Passage à l'échelle des étapes par station")
+    ap.add_argument("stage", choices=["anomalies", "hourly"])
+    ap.add_argument("input", nargs="?", default="historique_hourly.csv",
+                    help="CSV horaire (anomalies) ; ignoré pour hourly (historique Parquet)")
+    ap.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = ap.parse_args()
+
+    if args.stage == "anomalies":
+        df = schemas.read_hourly(args.input).sort_values(["stationcode", "ts_hour"])
+        report = scaling_report(df, "stationcode", compute_anomalies, args.max_workers)
+    else:
+        df = history_store.read_history()
+        report = scaling_report(df, "station_id", hourly_store.aggregate_snapshots, args.max_workers)
+
+    print(f"📊 {args.stage} | {len(df):,} lignes")
+    for r in report:
+        print(f"  • {r['workers']:>2} worker(s) : {r['seconds']:>7.3f} s | x{r['speedup']} | {r['rows_per_s']:,} lignes/s")
+
+if __name__ == "__main__":
+    main()
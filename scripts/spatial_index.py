@@ -0,0 +1,162 @@
+"""Index spatial des stations Vélib (KD-tree en mètres projetés).
+
+Jusqu'ici les stations n'étaient filtrées que par égalité sur `arrdt`. Ce
+module construit un `cKDTree` sur les coordonnées projetées en mètres
+(équirectangulaire local centré sur Paris : erreur < 0,1 % à l'échelle de
+l'agglomération) et répond à :
+
+- `nearest` : k stations les plus proches d'un point (ou d'un lot de points),
+  avec au moins N vélos ou N places libres dans le dernier snapshot
+- `within` : stations dans un rayon (mètres) autour de points
+- `radius_graph` : matrice creuse CSR station × station des voisins à moins de
+  `radius_m`, réutilisable par d'autres analyses
+
+Les filtres (≥ N vélos / places) sont servis par un sous-arbre construit une
+fois par (colonne, seuil) puis mis en cache : une requête reste un simple
+parcours de KD-tree (quelques µs), sans filtrage a posteriori.
+
+Usage :
+    python scripts/spatial_index.py --lat 48.8566 --lon 2.3522 --k 3 --min-bikes 2
+    python scripts/spatial_index.py --csv anomalies_velib.csv --bench 10000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.spatial import cKDTree
+
+import history_store
+import schemas
+
+LAT0, LON0 = 48.8566, 2.3522  # origine de la projection (Paris)
+EARTH_RADIUS_M = 6_371_008.8
+
+def to_metres(lat, lon, lat0=LAT0, lon0=LON0):
+    """(x, y) en mètres, projection équirectangulaire locale (vectorisée)."""
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    k = np.pi / 180 * EARTH_RADIUS_M
+    return np.column_stack([(lon - lon0) * k * np.cos(np.radians(lat0)), (lat - lat0) * k])
+
+class StationIndex:
+    """KD-tree des stations d'un snapshot ; lignes = positions dans `stations`."""
+
+    def __init__(self, stations):
+        df = stations.dropna(subset=["lat", "lon"]).reset_index(drop=True)
+        self.stations = df
+        self.xy = to_metres(df["lat"], df["lon"])
+        self.tree = cKDTree(self.xy)
+        self._subsets = {}
+
+    def __len__(self):
+        return len(self.stations)
+
+    @classmethod
+    def from_latest(cls, root=history_store.HISTORY_DIR, as_of=None):
+        """Index sur le dernier état connu du store (`history_store.state_at`)."""
+        t = pd.Timestamp.now(tz="UTC") if as_of is None else as_of
+        state = history_store.state_at(t, root)
+        if state.empty:
+            raise ValueError("Aucun snapshot dans le store. Lance la collecte avant.")
+        return cls(history_store.attach_stations(state, root))
+
+    @classmethod
+    def from_hourly_csv(cls, path):
+        """Index sur la dernière heure d'un CSV horaire (bikes_mean / docks_mean)."""
+        df = schemas.read_hourly(path)
+        last = df[df["ts_hour"] == df["ts_hour"].max()]
+        return cls(last.rename(columns={"bikes_mean": "bikes", "docks_mean": "docks"}))
+
+    def _subset(self, min_bikes=0, min_docks=0):
+        """(arbre, positions) des stations satisfaisant les seuils (mis en cache)."""
+        key = (min_bikes, min_docks)
+        if key not in self._subsets:
+            if key == (0, 0):
+                self._subsets[key] = (self.tree, np.arange(len(self)))
+            else:
+                mask = np.ones(len(self), dtype=bool)
+                if min_bikes:
+                    mask &= self.stations["bikes"].fillna(0).to_numpy() >= min_bikes
+                if min_docks:
+                    mask &= self.stations["docks"].fillna(0).to_numpy() >= min_docks
+                pos = np.flatnonzero(mask)
+                self._subsets[key] = (cKDTree(self.xy[pos]) if len(pos) else None, pos)
+        return self._subsets[key]
+
+    def nearest(self, lat, lon, k=1, min_bikes=0, min_docks=0):
+        """(distances_m, positions) de forme (n_points, k) ; -1 / inf si moins de k candidats.
+
+        `lat` / `lon` : scalaires ou tableaux (requête par lot en un appel).
+        """
+        q = to_metres(np.atleast_1d(lat), np.atleast_1d(lon))
+        tree, pos = self._subset(min_bikes, min_docks)
+        dist = np.full((len(q), k), np.inf)
+        idx = np.full((len(q), k), -1, dtype=np.int64)
+        if tree is None:
+            return dist, idx
+        kk = min(k, len(pos))
+        d, i = tree.query(q, k=kk)
+        d, i = d.reshape(len(q), kk), i.reshape(len(q), kk)
+        dist[:, :kk] = d
+        idx[:, :kk] = pos[i]
+        return dist, idx
+
+    def nearest_frame(self, lat, lon, k=1, min_bikes=0, min_docks=0):
+        """Version lisible de `nearest` pour UN point : stations + distance_m."""
+        dist, idx = self.nearest(lat, lon, k, min_bikes, min_docks)
+        ok = idx[0] >= 0
+        out = self.stations.iloc[idx[0][ok]].copy()
+        out["distance_m"] = dist[0][ok].round(1)
+        return out.reset_index(drop=True)
+
+    def within(self, lat, lon, radius_m):
+        """Positions des stations à moins de `radius_m` ; une liste par point."""
+        q = to_metres(np.atleast_1d(lat), np.atleast_1d(lon))
+        return [np.asarray(r, dtype=np.int64) for r in self.tree.query_ball_point(q, radius_m)]
+
+    def radius_graph(self, radius_m, include_self=False):
+        """Matrice CSR (n × n) : 1 si deux stations sont à moins de `radius_m`."""
+        pairs = self.tree.query_pairs(radius_m, output_type="ndarray")
+        n = len(self)
+        rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        if include_self:
+            rows = np.concatenate([rows, np.arange(n)])
+            cols = np.concatenate([cols, np.arange(n)])
+        return csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n))
+
+def main():
+    ap = argparse.ArgumentParser(description="Stations les plus proches avec vélos / places disponibles")
+    ap.add_argument("--csv", default=None, help="CSV horaire (dernière heure) au lieu du store")
+    ap.add_argument("--lat", type=float, default=LAT0)
+    ap.add_argument("--lon", type=float, default=LON0)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--min-bikes", type=int, default=0)
+    ap.add_argument("--min-docks", type=int, default=0)
+    ap.add_argument("--bench", type=int, default=0, help="chronométrer N requêtes aléatoires")
+    args = ap.parse_args()
+
+    index = StationIndex.from_hourly_csv(args.csv) if args.csv else StationIndex.from_latest()
+    print(f"📍 Index : {len(index)} stations")
+    res = index.nearest_frame(args.lat, args.lon, args.k, args.min_bikes, args.min_docks)
+    cols = [c for c in ["stationcode", "name", "bikes", "docks", "distance_m"] if c in res.columns]
+    print(res[cols].to_string(index=False))
+
+    if args.bench:
+        rng = np.random.default_rng(0)
+        lat = rng.uniform(48.80, 48.92, args.bench)
+        lon = rng.uniform(2.25, 2.42, args.bench)
+        index.nearest(lat[:1], lon[:1], args.k, args.min_bikes, args.min_docks)  # construit le sous-arbre
+        t0 = time.perf_counter()
+        for a, b in zip(lat[:1000], lon[:1000]):
+            index.nearest(a, b, args.k, args.min_bikes, args.min_docks)
+        single = (time.perf_counter() - t0) / min(1000, args.bench)
+        t0 = time.perf_counter()
+        index.nearest(lat, lon, args.k, args.min_bikes, args.min_docks)
+        batch = time.perf_counter() - t0
+        print(f"⏱️ requête unitaire : {single * 1e6:.1f} µs | lot de {args.bench} : {batch * 1e3:.1f} ms")
+
+if __name__ == "__main__":
+    main()
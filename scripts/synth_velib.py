@@ -0,0 +1,158 @@
+"""Générateur déterministe d'historiques Vélib synthétiques (schéma exact du projet).
+
+Produit des snapshots au format de `historique_velib.csv`
+(ts, stationcode, name, arrdt, lat, lon, bikes, docks, mechanical, ebikes)
+à l'échelle voulue (stations × snapshots), pour mesurer le pipeline au-delà
+de l'échantillon d'une heure fourni :
+
+- stations : celles de l'échantillon réel (noms, arrondissements, coordonnées),
+  clonées avec un léger décalage au-delà de 1 467
+- cycle journalier par station (stations « résidentielles » pleines la nuit,
+  « bureaux » pleines en journée), creux le week-end, bruit lent par jour
+- stations vides / pleines : le remplissage sature naturellement à 0 ou à la
+  capacité sur des plages de plusieurs heures
+- pannes : chaque jour quelques stations bloquées (0 vélo ET 0 borne) pendant
+  1 à 6 heures
+
+Génération jour par jour (tableaux numpy snapshot × station) : même graine →
+mêmes données, quel que soit le découpage ; la mémoire reste bornée à un jour.
+
+Usage :
+    python scripts/synth_velib.py --stations 1500 --days 7 --period 1 --out synth/historique_velib.csv
+    python scripts/synth_velib.py --stations 300 --days 2 --period 5 --store synth/history
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_CSV = os.path.join(BASE_DIR, "historique_velib.csv")
+COLUMNS = ["ts", "stationcode", "name", "arrdt", "lat", "lon", "bikes", "docks", "mechanical", "ebikes"]
+START = "2025-01-06"  # un lundi
+BLOCKED_PER_DAY = 0.01  # part des stations en panne un jour donné
+
+def make_stations(n, seed=0, template=TEMPLATE_CSV):
+    """Table des stations (attributs + paramètres de dynamique), déterministe."""
+    rng = np.random.default_rng([seed, 0])
+    if os.path.exists(template):
+        base = (pd.read_csv(template, dtype={"stationcode": str})
+                  .drop_duplicates("stationcode")[["stationcode", "name", "arrdt", "lat", "lon"]]
+                  .sort_values("stationcode").reset_index(drop=True))
+    else:
+        k = min(n, 1500)
+        base = pd.DataFrame({
+            "stationcode": [str(1001 + i) for i in range(k)],
+            "name": [f"Station {1001 + i}" for i in range(k)],
+            "arrdt": "Paris",
+            "lat": 48.8566 + rng.normal(0, 0.03, k),
+            "lon": 2.3522 + rng.normal(0, 0.045, k),
+        })
+    reps = -(-n // len(base))
+    st = pd.concat([base] * reps, ignore_index=True).iloc[:n].copy()
+    clone = np.arange(n) // len(base)  # 0 = station réelle, 1.. = clones
+    st["stationcode"] = np.where(clone == 0, st["stationcode"],
+                                 (clone * 100000 + np.arange(n) % len(base)).astype(str))
+    st["name"] = np.where(clone == 0, st["name"], st["name"] + " (" + clone.astype(str) + ")")
+    st["lat"] = st["lat"] + np.where(clone == 0, 0.0, rng.normal(0, 0.002, n))
+    st["lon"] = st["lon"] + np.where(clone == 0, 0.0, rng.normal(0, 0.003, n))
+
+    st["capacity"] = rng.integers(15, 61, n)
+    st["phase"] = np.where(rng.random(n) < 0.5, 8.5, 19.0) + rng.normal(0, 1.0, n)  # pic de remplissage (h)
+    st["amplitude"] = rng.uniform(0.2, 0.75, n)
+    st["level"] = rng.uniform(0.25, 0.75, n)
+    st["ebike_share"] = rng.uniform(0.2, 0.6, n)
+    return st.reset_index(drop=True)
+
+def generate_day(stations, day, period_min=1, seed=0, start=START):
+    """Snapshots d'une journée (`day` = rang du jour depuis `start`) → DataFrame brut."""
+    rng = np.random.default_rng([seed, 1, day])
+    n = len(stations)
+    t0 = pd.Timestamp(start, tz="UTC") + pd.Timedelta(days=day)
+    ts = pd.date_range(t0, periods=24 * 60 // period_min, freq=f"{period_min}min")
+    hod = ((ts - t0) / pd.Timedelta(hours=1)).to_numpy()[:, None]          # (T, 1)
+    weekend = t0.dayofweek >= 5
+
+    cap = stations["capacity"].to_numpy()[None, :]
+    amp = stations["amplitude"].to_numpy()[None, :] * (0.4 if weekend else 1.0)
+    cycle = np.cos(2 * np.pi * (hod - stations["phase"].to_numpy()[None, :]) / 24)
+    drift = rng.normal(0, 0.12, n)[None, :]                                  # niveau du jour
+    slow = np.cumsum(rng.normal(0, 0.01, (len(ts), n)), axis=0)              # marche lente
+    fill = stations["level"].to_numpy()[None, :] + amp * cycle + drift + slow
+    bikes = np.clip(np.rint(fill * cap), 0, cap).astype(np.int16)            # saturation → vide / plein
+    docks = (cap - bikes).astype(np.int16)
+
+    # pannes : 0 vélo ET 0 borne sur une plage de 1 à 6 h
+    broken = np.flatnonzero(rng.random(n) < BLOCKED_PER_DAY)
+    b_start = rng.uniform(0, 20, len(broken))
+    b_len = rng.uniform(1, 6, len(broken))
+    for s, a, d in zip(broken, b_start, b_len):
+        rows = (hod[:, 0] >= a) & (hod[:, 0] < a + d)
+        bikes[rows, s] = 0
+        docks[rows, s] = 0
+
+    ebikes = np.rint(bikes * stations["ebike_share"].to_numpy()[None, :]).astype(np.int16)
+    T = len(ts)
+    return pd.DataFrame({
+        "ts": np.repeat(ts.strftime("%Y-%m-%dT%H:%M:%SZ").to_numpy(), n),
+        "stationcode": np.tile(stations["stationcode"].to_numpy(), T),
+        "name": np.tile(stations["name"].to_numpy(), T),
+        "arrdt": np.tile(stations["arrdt"].to_numpy(), T),
+        "lat": np.tile(stations["lat"].to_numpy(), T),
+        "lon": np.tile(stations["lon"].to_numpy(), T),
+        "bikes": bikes.ravel(),
+        "docks": docks.ravel(),
+        "mechanical": (bikes - ebikes).ravel(),
+        "ebikes": ebikes.ravel(),
+    })[COLUMNS]
+
+def iter_days(n_stations, days, period_min=1, seed=0, start=START):
+    """Jours successifs de snapshots (un DataFrame par jour)."""
+    stations = make_stations(n_stations, seed)
+    for day in range(days):
+        yield generate_day(stations, day, period_min, seed, start)
+
+def generate(n_stations, days, period_min=1, seed=0, start=START):
+    """Tout l'historique en un DataFrame (petites échelles)."""
+    return pd.concat(iter_days(n_stations, days, period_min, seed, start), ignore_index=True)
+
+def to_hourly(raw):
+    """Agrégat horaire au format `historique_hourly.csv` (sans passer par le store)."""
+    df = raw.assign(ts_hour=pd.to_datetime(raw["ts"], utc=True).dt.floor("h"))
+    return (df.groupby(["stationcode", "name", "arrdt", "lat", "lon", "ts_hour"], as_index=False, sort=False)
+              .agg(bikes_mean=("bikes", "mean"), bikes_median=("bikes", "median"), docks_mean=("docks", "mean")))
+
+def main():
+    ap = argparse.ArgumentParser(description="Historique Vélib synthétique (déterministe)")
+    ap.add_argument("--stations", type=int, default=1467)
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--period", type=int, default=1, help="minutes entre deux snapshots")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--start", default=START)
+    ap.add_argument("--out", default=None, help="CSV brut (format historique_velib.csv)")
+    ap.add_argument("--hourly", default=None, help="CSV horaire (format historique_hourly.csv)")
+    ap.add_argument("--store", default=None, help="racine d'un store Parquet (history_store)")
+    args = ap.parse_args()
+    if not (args.out or args.hourly or args.store):
+        ap.error("préciser au moins --out, --hourly ou --store")
+
+    n_rows = 0
+    for i, day in enumerate(iter_days(args.stations, args.days, args.period, args.seed, args.start)):
+        n_rows += len(day)
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            day.to_csv(args.out, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        if args.hourly:
+            os.makedirs(os.path.dirname(os.path.abspath(args.hourly)), exist_ok=True)
+            to_hourly(day).to_csv(args.hourly, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        if args.store:
+            import history_store
+
+            for _, snap in day.groupby("ts", sort=True):
+                history_store.write_snapshot(snap, args.store)
+    print(f"✅ Synthétique : {args.stations} stations × {args.days} j "
+          f"(pas {args.period} min) → {n_rows:,} lignes")
+
+if __name__ == "__main__":
+    main()
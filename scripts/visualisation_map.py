@@ -1,42 +1,22 @@
-import pandas as pd
 import folium
 import webbrowser
-# 1) Charger le CSV filtré
-df = pd.read_csv("velib_filtre.csv")
+
+import schemas
+from map_layers import color_by_bikes, geojson_layer
+# 1) Charger le CSV filtré (types + lat/lon depuis coordonnees_geo : schemas.STATIONS)
+df = schemas.read_stations("velib_filtre.csv").dropna(subset=["lat", "lon"])
 
 # 2) Créer une carte centrée sur Paris
 carte = folium.Map(location=[48.8566, 2.3522], zoom_start=12)
 
-# 3) Ajouter les stations une par une
-for _, row in df.iterrows():
-    lat, lon = row["coordonnees_geo"].strip("[]").split(",")  # extraire latitude/longitude
-    lat, lon = float(lat), float(lon)
-
-    # Couleur en fonction du nombre de vélos dispo
-    if row["numbikesavailable"] == 0:
-        couleur = "red"
-    elif row["numbikesavailable"] < 5:
-        couleur = "orange"
-    else:
-        couleur = "green"
-
-    # Popup avec détails
-    popup = f"""
-    <b>{row['name']}</b><br>
-    Arrondissement: {row['nom_arrondissement_communes']}<br>
-    🚲 Vélos dispo: {row['numbikesavailable']}<br>
-    🅿️ Places libres: {row['numdocksavailable']}
-    """
-
-    # Ajouter un marqueur
-    folium.CircleMarker(
-        location=[lat, lon],
-        radius=6,
-        color=couleur,
-        fill=True,
-        fill_color=couleur,
-        popup=popup
-    ).add_to(carte)
+# 3) Ajouter toutes les stations en un seul calque (couleur selon vélos dispo)
+geojson_layer(
+    df,
+    ["name", "nom_arrondissement_communes", "numbikesavailable", "numdocksavailable"],
+    colors=color_by_bikes(df["numbikesavailable"]),
+    popup=("name", [("Arrondissement", "nom_arrondissement_communes"),
+                    ("🚲 Vélos dispo", "numbikesavailable"), ("🅿️ Places libres", "numdocksavailable")]),
+).add_to(carte)
 
 # 4) Sauvegarder la carte
 carte.save("velib_map.html")
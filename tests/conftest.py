@@ -0,0 +1,29 @@
+"""Configuration commune des tests : `scripts/` importable comme dans le pipeline."""
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+# les tests ne doivent pas écrire dans data/metrics
+os.environ.setdefault("VELIB_METRICS", "0")
+
+@pytest.fixture(scope="module")
+def repo(tmp_path_factory):
+    """Copie de scripts/ avec un petit store synthétique → fonction `run(script, *args)`."""
+    base = str(tmp_path_factory.mktemp("repo"))
+    shutil.copytree(os.path.join(ROOT, "scripts"), os.path.join(base, "scripts"),
+                    ignore=shutil.ignore_patterns("__pycache__"))
+
+    def run(script, *args):
+        subprocess.run([sys.executable, os.path.join("scripts", script), *map(str, args)],
+                       cwd=base, check=True, capture_output=True)
+
+    run("synth_velib.py", "--stations", 40, "--days", 2, "--period", 20,
+        "--store", os.path.join("data", "history"))
+    run.path = lambda name: os.path.join(base, name)
+    return run
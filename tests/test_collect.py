@@ -0,0 +1,52 @@
+"""Collecte paginée contre le mock local de l'API (hors-ligne)."""
+import gzip
+import os
+import shutil
+
+import pytest
+
+import collect_historique
+import mock_api
+from backfill import load_dump
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP = os.path.join(ROOT, "raw", "data_velib_20250817_174812.json")
+
+@pytest.fixture
+def api():
+    """Démarre un mock sur un port libre → (server, url) ; arrêté après le test."""
+    servers = []
+
+    def start(dump=DUMP):
+        server, url = mock_api.serve_in_thread(dump)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_fetch_all_pages_in_order(api):
+    server, url = api()
+    fields = collect_historique.fetch_all(rows=200, max_parallel=3, url=url)
+
+    records = load_dump(DUMP)["records"]
+    assert fields == [r["fields"] for r in records if "fields" in r]
+    # une requête par page, aucune requête vide finale
+    assert sorted(server.RequestHandlerClass.hits) == [(s, 200) for s in range(0, len(records), 200)]
+
+def test_single_page_when_rows_cover_all(api):
+    server, url = api()
+    fields = collect_historique.fetch_all(rows=5000, url=url)
+    assert len(fields) == len(load_dump(DUMP)["records"])
+    assert server.RequestHandlerClass.hits == [(0, 5000)]
+
+def test_mock_serves_gzipped_dump(api, tmp_path):
+    gz = tmp_path / "data_velib_test.json.gz"
+    with open(DUMP, "rb") as src, gzip.open(gz, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    _, url = api(str(gz))
+    rows = collect_historique.to_rows(collect_historique.fetch_all(rows=500, url=url), "2025-08-17T17:48:12Z")
+    assert len(rows) == len(load_dump(DUMP)["records"])
+    assert {"stationcode", "lat", "lon", "bikes", "docks"} <= set(rows[0])
@@ -0,0 +1,24 @@
+"""Mode `--incremental` : le CSV tenu à jour depuis data/hourly/ a les valeurs du mode complet."""
+import schemas
+
+def by_key(df):
+    return df.sort_values(["stationcode", "ts_hour"], ignore_index=True)
+
+def test_aggregate_incremental_matches_full(repo):
+    full, inc = repo.path("full_ref.csv"), repo.path("incremental.csv")
+    chunked = repo.path("chunked_ref.csv")
+    repo("aggregate_hourly.py", "--out", full)
+    repo("aggregate_hourly.py", "--chunked", "--out", chunked)
+    # premier jour, puis la suite (seule la fin du CSV est réécrite), puis rien de nouveau
+    repo("aggregate_hourly.py", "--incremental", "--end", "2025-01-06 23:59:59", "--out", inc)
+    assert len(schemas.read_hourly(inc)) == 40 * 24
+    repo("aggregate_hourly.py", "--incremental", "--out", inc)
+    repo("aggregate_hourly.py", "--incremental", "--out", inc)
+
+    a, b = schemas.read_hourly(full), schemas.read_hourly(inc)
+    assert len(a) == 40 * 48
+    # valeurs au bit près : pas de passage par float32 dans le stockage horaire
+    assert by_key(a).equals(by_key(b))
+    # même ordre (heure, station) que --chunked, au octet près
+    with open(inc, "rb") as f, open(chunked, "rb") as g:
+        assert f.read() == g.read()